@@ -0,0 +1,76 @@
+"""
+Compara el formato binario compacto con el JSON actual de los tags.
+
+Mide los bytes por reporte y el coste de decodificar + validar (hasta obtener las
+lecturas en cm que usa procesar_lote). No necesita base de datos.
+
+Uso:
+    cd Api_Atopcar
+    python benchmarks/bench_formato.py [--reportes 100000] [--anchors 3]
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services import formato_binario
+from services.ingesta import validar_reporte
+import argparse
+import json
+import random
+import time
+
+
+def generar_reportes(total, num_anchors):
+    direcciones = [0x5BA3, 0x2219, 0x234B, 0xAAAA, 0x1786, 0x0C21, 0x9F10, 0x4E5D][:num_anchors]
+    reportes = []
+    for i in range(total):
+        distancias = [round(random.uniform(0.5, 30.0), 2) for _ in direcciones]
+        reportes.append((f"T{i % 500:04d}", list(zip(direcciones, distancias)), i))
+    return reportes
+
+
+def como_json(tag, anchors):
+    # Mismo texto que genera make_link_json en el firmware
+    return json.dumps({
+        "tag": tag,
+        "anchors": [{"shortAddres": "%X" % direccion, "distancia": "%.2f" % distancia}
+                    for direccion, distancia in anchors]
+    }).encode()
+
+
+def medir(nombre, mensajes, decodificar):
+    inicio = time.perf_counter()
+    for mensaje in mensajes:
+        lecturas, error = validar_reporte(decodificar(mensaje))
+        if error:
+            raise RuntimeError(error)
+    duracion = time.perf_counter() - inicio
+
+    total_bytes = sum(len(mensaje) for mensaje in mensajes)
+    print(f"{nombre:<8} {total_bytes / len(mensajes):>8.1f} B/reporte "
+          f"{duracion * 1e6 / len(mensajes):>8.2f} us/reporte "
+          f"{len(mensajes) / duracion:>12,.0f} reportes/s")
+    return duracion
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark JSON frente a formato binario')
+    parser.add_argument('--reportes', type=int, default=100000)
+    parser.add_argument('--anchors', type=int, default=3, choices=range(3, 9))
+    args = parser.parse_args()
+
+    reportes = generar_reportes(args.reportes, args.anchors)
+    mensajes_json = [como_json(tag, anchors) for tag, anchors, _ in reportes]
+    mensajes_bin = [formato_binario.codificar(tag, anchors, secuencia)
+                    for tag, anchors, secuencia in reportes]
+
+    print(f"{args.reportes} reportes con {args.anchors} anchors")
+    t_json = medir('JSON', mensajes_json, json.loads)
+    t_bin = medir('binario', mensajes_bin, formato_binario.decodificar)
+    print(f"Binario: {sum(map(len, mensajes_json)) / sum(map(len, mensajes_bin)):.1f}x menos bytes, "
+          f"{t_json / t_bin:.1f}x más rápido")
+
+
+if __name__ == '__main__':
+    main()
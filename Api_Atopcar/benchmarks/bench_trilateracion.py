@@ -0,0 +1,72 @@
+"""
+Compara el cálculo de posiciones reporte a reporte (multilaterar), reporte a reporte con
+la geometría cacheada de cada trío (geometria_anchors.resolver) y el cálculo vectorizado
+de muchos reportes de 3 anchors a la vez (trilaterar_lote).
+
+Uso:
+    cd Api_Atopcar
+    python benchmarks/bench_trilateracion.py [--reportes 100 1000 10000]
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services import geometria_anchors
+from services.trilateracion import multilaterar, trilaterar_lote
+from collections import namedtuple
+import argparse
+import numpy as np
+import time
+
+
+AnchorPrueba = namedtuple('AnchorPrueba', ['id', 'x', 'y'])
+
+
+def generar(total, rng):
+    # Taller de 20 x 20 m, ruido de 10 cm en las distancias
+    coordenadas = rng.uniform(0, 2000, (total, 3, 2))
+    tags = rng.uniform(0, 2000, (total, 2))
+    distancias = np.linalg.norm(coordenadas - tags[:, None, :], axis=2) + rng.normal(0, 10, (total, 3))
+    return coordenadas, np.abs(distancias)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark de trilateración escalar frente a vectorizada')
+    parser.add_argument('--reportes', type=int, nargs='+', default=[100, 1000, 10000])
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    print(f"{'reportes':>9} {'escalar us/rep':>15} {'caché us/rep':>13} {'lote us/rep':>12} {'aceleración':>12}")
+    for total in args.reportes:
+        coordenadas, distancias = generar(total, rng)
+        filas = [(c.tolist(), d.tolist()) for c, d in zip(coordenadas, distancias)]
+
+        inicio = time.perf_counter()
+        escalar = [multilaterar(c, d) for c, d in filas]
+        t_escalar = time.perf_counter() - inicio
+
+        # Un trío distinto por reporte; la geometría se precalcula antes de medir, como en régimen estable
+        trios = [[AnchorPrueba(3 * i + j, x, y) for j, (x, y) in enumerate(c)] for i, (c, _) in enumerate(filas)]
+        geometria_anchors.invalidar()
+        for trio in trios:
+            geometria_anchors.obtener(trio)
+        inicio = time.perf_counter()
+        cacheadas = [geometria_anchors.resolver(trio, d) for trio, (_, d) in zip(trios, filas)]
+        t_cache = time.perf_counter() - inicio
+
+        inicio = time.perf_counter()
+        posiciones, _ = trilaterar_lote(coordenadas, distancias)
+        t_lote = time.perf_counter() - inicio
+
+        # Los tres caminos deben dar las mismas posiciones
+        esperadas = np.array([(x, y) for x, y, _ in escalar])
+        assert np.abs(np.round(posiciones) - esperadas).max() <= 1
+        assert np.abs(np.array([(x, y) for x, y, _ in cacheadas]) - esperadas).max() <= 1
+
+        print(f"{total:>9} {t_escalar * 1e6 / total:>15.2f} {t_cache * 1e6 / total:>13.2f} {t_lote * 1e6 / total:>12.3f} "
+              f"{t_escalar / t_lote:>11.0f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,119 @@
+"""
+Comprueba con EXPLAIN que las rutas más consultadas usan índices y no recorren la tabla.
+
+Llama a cada ruta con el cliente de pruebas de Flask contra la base de datos configurada en
+app.py, captura las sentencias SELECT que lanza sobre la tabla indicada y pide al motor su
+plan (EXPLAIN en MySQL y PostgreSQL, EXPLAIN QUERY PLAN en SQLite). Solo lee datos.
+
+Los índices se crean con la migración de migrations/versions (flask db upgrade) o con el
+script SQL. Termina con código 1 si alguna consulta hace un recorrido completo.
+
+Uso:
+    cd Api_Atopcar
+    python benchmarks/comprobar_indices.py
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import app
+from extensions import db
+from models.tag import Tag
+from models.zona import Zona
+from sqlalchemy import event
+import re
+
+
+def _comprobaciones(tag_id, zona_id):
+    """(descripción, url, tabla que debe leerse por índice)"""
+    comprobaciones = [
+        ('get_no_leidas', '/api/alertas/no-leidas', 'alertas'),
+        ('get_all_alertas?leido', '/api/alertas/?leido=false', 'alertas'),
+        ('get_all_alertas', '/api/alertas/', 'alertas'),
+        ('get_all_posiciones', '/api/posiciones/', 'posiciones'),
+    ]
+    if tag_id is not None:
+        comprobaciones += [
+            ('get_all_posiciones?tag_id', f'/api/posiciones/?tag_id={tag_id}', 'posiciones'),
+            ('get_ultima_posicion', f'/api/posiciones/tag/{tag_id}/ultima', 'posiciones'),
+        ]
+    if zona_id is not None:
+        comprobaciones += [
+            ('get_all_posiciones?zona_id', f'/api/posiciones/?zona_id={zona_id}&hours=24', 'posiciones'),
+            ('get_zona_stats', f'/api/zonas/{zona_id}/stats', 'posiciones'),
+        ]
+    return comprobaciones
+
+
+def _lee_tabla(sentencia, tabla):
+    return sentencia.lstrip().upper().startswith('SELECT') and re.search(rf'\bFROM\s+[`"]?{tabla}\b', sentencia)
+
+
+def _usa_indice(conexion, dialecto, sentencia, parametros, tabla):
+    """Devuelve (usa índice, resumen del plan)."""
+    if dialecto == 'sqlite':
+        filas = conexion.exec_driver_sql('EXPLAIN QUERY PLAN ' + sentencia, parametros).fetchall()
+        detalles = [fila[-1] for fila in filas if re.search(rf'\b{tabla}\b', fila[-1])]
+        completo = any(d.startswith('SCAN') and 'INDEX' not in d for d in detalles)
+        return not completo, '; '.join(detalles)
+
+    if dialecto == 'mysql':
+        filas = conexion.exec_driver_sql('EXPLAIN ' + sentencia, parametros).mappings().fetchall()
+        detalles = [fila for fila in filas if fila['table'] == tabla]
+        completo = any(fila['type'] == 'ALL' for fila in detalles)
+        return not completo, '; '.join(f"type={fila['type']} key={fila['key']}" for fila in detalles)
+
+    if dialecto == 'postgresql':
+        # Con tablas pequeñas el planificador prefiere el recorrido secuencial aunque haya índice
+        conexion.exec_driver_sql('SET LOCAL enable_seqscan = off')
+        lineas = [fila[0] for fila in conexion.exec_driver_sql('EXPLAIN ' + sentencia, parametros)]
+        completo = any(f'Seq Scan on {tabla}' in linea for linea in lineas)
+        return not completo, lineas[0].strip() if lineas else ''
+
+    raise SystemExit(f"Motor no soportado: {dialecto}")
+
+
+def main():
+    capturadas = []
+
+    def capturar(conn, cursor, sentencia, parametros, context, executemany):
+        capturadas.append((sentencia, parametros))
+
+    with app.app_context():
+        tag = Tag.query.order_by(Tag.id).first()
+        zona = Zona.query.order_by(Zona.id).first()
+        comprobaciones = _comprobaciones(tag.id if tag else None, zona.id if zona else None)
+        if tag is None or zona is None:
+            print("Aviso: sin tags o sin zonas en la base de datos se omiten algunas comprobaciones")
+
+        motor = db.engine
+        dialecto = motor.dialect.name
+        event.listen(motor, 'before_cursor_execute', capturar)
+        cliente = app.test_client()
+
+        fallos = 0
+        for descripcion, url, tabla in comprobaciones:
+            capturadas.clear()
+            respuesta = cliente.get(url)
+            consultas = [(s, p) for s, p in capturadas if _lee_tabla(s, tabla)]
+
+            if not consultas:
+                print(f"OK     {descripcion:<28} {respuesta.status_code}  sin consultas a {tabla}")
+                continue
+
+            with motor.connect() as conexion:
+                for sentencia, parametros in consultas:
+                    usa_indice, plan = _usa_indice(conexion, dialecto, sentencia, parametros, tabla)
+                    fallos += not usa_indice
+                    print(f"{'OK' if usa_indice else 'FALLO':<6} {descripcion:<28} {respuesta.status_code}  {plan}")
+
+        event.remove(motor, 'before_cursor_execute', capturar)
+
+    if fallos:
+        print(f"{fallos} consultas recorren la tabla completa")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,35 @@
+"""Zonas permitidas de cada vehículo (geocercas)
+
+Revision ID: 2c6a8d3f9b71
+Revises: e1b94f0c7a52
+Create Date: 2026-10-18 13:20:00
+
+vehiculos.zonas_permitidas guarda la lista de ids de zona en las que puede estar el vehículo;
+al entrar en otra se genera una alerta de geocerca. Se omite si la columna ya existe (bases
+creadas con el script SQL o con db.create_all()).
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '2c6a8d3f9b71'
+down_revision = 'e1b94f0c7a52'
+branch_labels = None
+depends_on = None
+
+
+def _columnas(tabla):
+    return {columna['name'] for columna in sa.inspect(op.get_bind()).get_columns(tabla)}
+
+
+def upgrade():
+    if 'zonas_permitidas' not in _columnas('vehiculos'):
+        op.add_column('vehiculos', sa.Column('zonas_permitidas', sa.JSON(), nullable=True))
+
+
+def downgrade():
+    if 'zonas_permitidas' in _columnas('vehiculos'):
+        # batch: SQLite no permite DROP COLUMN en todas las versiones
+        with op.batch_alter_table('vehiculos') as batch:
+            batch.drop_column('zonas_permitidas')
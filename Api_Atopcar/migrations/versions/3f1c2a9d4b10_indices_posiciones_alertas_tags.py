@@ -0,0 +1,47 @@
+"""Índices compuestos para las consultas de posiciones, alertas y tags
+
+Revision ID: 3f1c2a9d4b10
+Revises: 2c6a8d3f9b71
+Create Date: 2026-10-18 13:40:00
+
+Bases de datos creadas con el script SQL o con db.create_all() antes de existir estos índices.
+Los índices que ya existen (por ejemplo, en una base creada después con db.create_all()) se
+omiten.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3f1c2a9d4b10'
+down_revision = '2c6a8d3f9b71'
+branch_labels = None
+depends_on = None
+
+
+INDICES = [
+    # get_all_posiciones, historial y última posición de un tag
+    ('ix_posiciones_tag_timestamp', 'posiciones', ['tag_id', 'timestamp']),
+    # get_zona_stats (posiciones de una zona en las últimas 24 h) y filtro por zona
+    ('ix_posiciones_zona_timestamp', 'posiciones', ['zona_id', 'timestamp']),
+    # get_no_leidas y filtro por leido en get_all_alertas
+    ('ix_alertas_leido_timestamp', 'alertas', ['leido', 'timestamp']),
+    # Detector de desconexiones y consultas por última comunicación
+    ('ix_tags_ultima_comunicacion', 'tags', ['ultima_comunicacion']),
+]
+
+
+def _existentes(tabla):
+    return {indice['name'] for indice in sa.inspect(op.get_bind()).get_indexes(tabla)}
+
+
+def upgrade():
+    for nombre, tabla, columnas in INDICES:
+        if nombre not in _existentes(tabla):
+            op.create_index(nombre, tabla, columnas)
+
+
+def downgrade():
+    for nombre, tabla, _ in reversed(INDICES):
+        if nombre in _existentes(tabla):
+            op.drop_index(nombre, table_name=tabla)
@@ -0,0 +1,35 @@
+"""Residuo de la multilateración en posiciones
+
+Revision ID: 5d2e9b7a1c40
+Revises:
+Create Date: 2026-10-18 12:20:00
+
+posiciones.residuo guarda el error cuadrático medio (cm) de la multilateración por mínimos
+cuadrados. Se omite si la columna ya existe (bases creadas con el script SQL o con
+db.create_all()).
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5d2e9b7a1c40'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def _columnas(tabla):
+    return {columna['name'] for columna in sa.inspect(op.get_bind()).get_columns(tabla)}
+
+
+def upgrade():
+    if 'residuo' not in _columnas('posiciones'):
+        op.add_column('posiciones', sa.Column('residuo', sa.Float(), nullable=True))
+
+
+def downgrade():
+    if 'residuo' in _columnas('posiciones'):
+        # batch: SQLite no permite DROP COLUMN en todas las versiones
+        with op.batch_alter_table('posiciones') as batch:
+            batch.drop_column('residuo')
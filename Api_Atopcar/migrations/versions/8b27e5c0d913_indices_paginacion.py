@@ -0,0 +1,43 @@
+"""Índices (timestamp, id) para la paginación de posiciones y alertas
+
+Revision ID: 8b27e5c0d913
+Revises: 3f1c2a9d4b10
+Create Date: 2026-10-18 16:10:00
+
+Los listados de posiciones y alertas se recorren de la más reciente a la más antigua con un
+cursor sobre (timestamp, id). Los índices que ya existen se omiten, como en la revisión
+anterior.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8b27e5c0d913'
+down_revision = '3f1c2a9d4b10'
+branch_labels = None
+depends_on = None
+
+
+INDICES = [
+    # get_all_posiciones sin filtro de tag ni de zona
+    ('ix_posiciones_timestamp_id', 'posiciones', ['timestamp', 'id']),
+    # get_all_alertas sin filtro de leido
+    ('ix_alertas_timestamp_id', 'alertas', ['timestamp', 'id']),
+]
+
+
+def _existentes(tabla):
+    return {indice['name'] for indice in sa.inspect(op.get_bind()).get_indexes(tabla)}
+
+
+def upgrade():
+    for nombre, tabla, columnas in INDICES:
+        if nombre not in _existentes(tabla):
+            op.create_index(nombre, tabla, columnas)
+
+
+def downgrade():
+    for nombre, tabla, _ in reversed(INDICES):
+        if nombre in _existentes(tabla):
+            op.drop_index(nombre, table_name=tabla)
@@ -0,0 +1,60 @@
+"""Tabla posiciones_ultimas
+
+Revision ID: 9e4d1a6b3f05
+Revises: 8b27e5c0d913
+Create Date: 2026-10-18 18:30:00
+
+Una fila por tag con su última posición. La tabla se crea si no existe (bases creadas con el
+script SQL o con db.create_all()) y se rellena con la última posición del histórico de cada
+tag sin fila, para que las consultas de la última posición no tengan que recorrerlo.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9e4d1a6b3f05'
+down_revision = '8b27e5c0d913'
+branch_labels = None
+depends_on = None
+
+
+# Última posición del histórico de cada tag sin fila, con una subconsulta por tag sobre el
+# índice (tag_id, timestamp) de la revisión 3f1c2a9d4b10 (por eso esta revisión va después)
+RELLENAR_POSICIONES_ULTIMAS = """
+INSERT INTO posiciones_ultimas (tag_id, posicion_id, x, y, zona_id, taller_id, residuo, vx, vy, timestamp)
+SELECT p.tag_id, p.id, p.x, p.y, p.zona_id, z.taller_id, p.residuo, p.vx, p.vy, p.timestamp
+FROM tags t
+JOIN posiciones p ON p.id = (
+    SELECT p2.id FROM posiciones p2
+    WHERE p2.tag_id = t.id
+    ORDER BY p2.timestamp DESC, p2.id DESC
+    LIMIT 1
+)
+LEFT JOIN zonas z ON z.id = p.zona_id
+WHERE NOT EXISTS (SELECT 1 FROM posiciones_ultimas u WHERE u.tag_id = t.id)
+"""
+
+
+def upgrade():
+    if not sa.inspect(op.get_bind()).has_table('posiciones_ultimas'):
+        op.create_table(
+            'posiciones_ultimas',
+            sa.Column('tag_id', sa.Integer(), sa.ForeignKey('tags.id'), primary_key=True, autoincrement=False),
+            sa.Column('posicion_id', sa.Integer(), nullable=True),
+            sa.Column('x', sa.Integer(), nullable=False),
+            sa.Column('y', sa.Integer(), nullable=False),
+            sa.Column('zona_id', sa.Integer(), sa.ForeignKey('zonas.id'), nullable=True),
+            sa.Column('taller_id', sa.Integer(), sa.ForeignKey('talleres.id'), nullable=True),
+            sa.Column('residuo', sa.Float(), nullable=True),
+            sa.Column('vx', sa.Float(), nullable=True),
+            sa.Column('vy', sa.Float(), nullable=True),
+            sa.Column('timestamp', sa.TIMESTAMP(), nullable=True),
+        )
+
+    op.execute(sa.text(RELLENAR_POSICIONES_ULTIMAS))
+
+
+def downgrade():
+    if sa.inspect(op.get_bind()).has_table('posiciones_ultimas'):
+        op.drop_table('posiciones_ultimas')
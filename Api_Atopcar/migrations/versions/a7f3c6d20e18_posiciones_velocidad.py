@@ -0,0 +1,42 @@
+"""Velocidad estimada por el filtro de Kalman en posiciones
+
+Revision ID: a7f3c6d20e18
+Revises: 5d2e9b7a1c40
+Create Date: 2026-10-18 12:50:00
+
+posiciones.vx y posiciones.vy guardan la velocidad (cm/s) estimada por el filtro de Kalman
+cuando está activado. Se omiten las columnas que ya existen (bases creadas con el script SQL
+o con db.create_all()).
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a7f3c6d20e18'
+down_revision = '5d2e9b7a1c40'
+branch_labels = None
+depends_on = None
+
+
+COLUMNAS = ('vx', 'vy')
+
+
+def _columnas(tabla):
+    return {columna['name'] for columna in sa.inspect(op.get_bind()).get_columns(tabla)}
+
+
+def upgrade():
+    existentes = _columnas('posiciones')
+    for nombre in COLUMNAS:
+        if nombre not in existentes:
+            op.add_column('posiciones', sa.Column(nombre, sa.Float(), nullable=True))
+
+
+def downgrade():
+    existentes = _columnas('posiciones')
+    # batch: SQLite no permite DROP COLUMN en todas las versiones
+    with op.batch_alter_table('posiciones') as batch:
+        for nombre in reversed(COLUMNAS):
+            if nombre in existentes:
+                batch.drop_column(nombre)
@@ -0,0 +1,35 @@
+"""Polígono de cada zona
+
+Revision ID: e1b94f0c7a52
+Revises: a7f3c6d20e18
+Create Date: 2026-10-18 13:05:00
+
+zonas.poligono guarda los vértices [[x, y], ...] en cm de la zona; las posiciones se
+clasifican por polígono en lugar de por el anchor más cercano. Se omite si la columna ya
+existe (bases creadas con el script SQL o con db.create_all()).
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e1b94f0c7a52'
+down_revision = 'a7f3c6d20e18'
+branch_labels = None
+depends_on = None
+
+
+def _columnas(tabla):
+    return {columna['name'] for columna in sa.inspect(op.get_bind()).get_columns(tabla)}
+
+
+def upgrade():
+    if 'poligono' not in _columnas('zonas'):
+        op.add_column('zonas', sa.Column('poligono', sa.JSON(), nullable=True))
+
+
+def downgrade():
+    if 'poligono' in _columnas('zonas'):
+        # batch: SQLite no permite DROP COLUMN en todas las versiones
+        with op.batch_alter_table('zonas') as batch:
+            batch.drop_column('poligono')
@@ -18,7 +18,7 @@ class Alerta(db.Model):
       tipo:
         type: string
         description: Categoría de la alerta (batería baja, fuera de zona, etc.)
-        enum: [bateria_baja, fuera_de_zona, movimiento_no_autorizado, averia, otros]
+        enum: [desconexion, bateria_baja, fuera_de_area, otros]
       descripcion:
         type: string
         description: Detalles adicionales sobre la alerta
@@ -31,6 +31,10 @@ class Alerta(db.Model):
         description: Indica si la alerta ha sido revisada por un usuario
     """
     __tablename__ = 'alertas'
+    __table_args__ = (
+        db.Index('ix_alertas_leido_timestamp', 'leido', 'timestamp'),
+        db.Index('ix_alertas_timestamp_id', 'timestamp', 'id'),
+    )
     
     id = db.Column(db.Integer, primary_key=True, autoincrement=True)
     tag_id = db.Column(db.Integer, db.ForeignKey('tags.id'))
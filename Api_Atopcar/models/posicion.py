@@ -21,29 +21,52 @@ class Posicion(db.Model):
     zona_id:
         type: integer
         description: ID de la zona donde se encuentra el tag
+    residuo:
+        type: number
+        format: float
+        description: Error cuadrático medio (cm) entre las distancias medidas y las de la posición calculada
+    vx:
+        type: number
+        format: float
+        description: Velocidad estimada en el eje X (cm/s), si la posición viene del filtro de seguimiento
+    vy:
+        type: number
+        format: float
+        description: Velocidad estimada en el eje Y (cm/s), si la posición viene del filtro de seguimiento
     timestamp:
         type: string
         format: date-time
         description: Fecha y hora en que se registró la posición
     """
     __tablename__ = 'posiciones'
+    __table_args__ = (
+        db.Index('ix_posiciones_tag_timestamp', 'tag_id', 'timestamp'),
+        db.Index('ix_posiciones_zona_timestamp', 'zona_id', 'timestamp'),
+        db.Index('ix_posiciones_timestamp_id', 'timestamp', 'id'),
+    )
     
     id = db.Column(db.Integer, primary_key=True, autoincrement=True)
     tag_id = db.Column(db.Integer, db.ForeignKey('tags.id'))
     x = db.Column(db.Integer, nullable=False)
     y = db.Column(db.Integer, nullable=False)
     zona_id = db.Column(db.Integer, db.ForeignKey('zonas.id'))
+    residuo = db.Column(db.Float)
+    vx = db.Column(db.Float)
+    vy = db.Column(db.Float)
     timestamp = db.Column(db.TIMESTAMP, default=datetime.utcnow)
     
     # Relaciones
     tag = db.relationship('Tag', backref=db.backref('posiciones', lazy=True))
     zona = db.relationship('Zona', backref=db.backref('posiciones', lazy=True))
     
-    def __init__(self, tag_id=None, x=0, y=0, zona_id=None):
+    def __init__(self, tag_id=None, x=0, y=0, zona_id=None, residuo=None, vx=None, vy=None):
         self.tag_id = tag_id
         self.x = x
         self.y = y
         self.zona_id = zona_id
+        self.residuo = residuo
+        self.vx = vx
+        self.vy = vy
     
     def to_dict(self):
         return {
@@ -52,6 +75,9 @@ class Posicion(db.Model):
             'x': self.x,
             'y': self.y,
             'zona_id': self.zona_id,
+            'residuo': self.residuo,
+            'vx': self.vx,
+            'vy': self.vy,
             'timestamp': self.timestamp.isoformat() if self.timestamp else None
         }
     
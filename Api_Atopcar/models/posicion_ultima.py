@@ -0,0 +1,85 @@
+from extensions import db
+
+class PosicionUltima(db.Model):
+    """
+    Modelo PosicionUltima: copia de la última posición de cada tag (una fila por tag)
+    ---
+    properties:
+    id:
+        type: integer
+        description: ID de la posición en el histórico (tabla posiciones)
+    tag_id:
+        type: integer
+        description: ID del tag UWB
+    x:
+        type: integer
+        description: Coordenada X en el plano del taller (en centímetros)
+    y:
+        type: integer
+        description: Coordenada Y en el plano del taller (en centímetros)
+    zona_id:
+        type: integer
+        description: ID de la zona donde se encuentra el tag
+    taller_id:
+        type: integer
+        description: ID del taller donde se encuentra el tag
+    residuo:
+        type: number
+        format: float
+        description: Error cuadrático medio (cm) de la trilateración
+    vx:
+        type: number
+        format: float
+        description: Velocidad estimada en el eje X (cm/s)
+    vy:
+        type: number
+        format: float
+        description: Velocidad estimada en el eje Y (cm/s)
+    timestamp:
+        type: string
+        format: date-time
+        description: Fecha y hora de la posición
+    """
+    __tablename__ = 'posiciones_ultimas'
+
+    tag_id = db.Column(db.Integer, db.ForeignKey('tags.id'), primary_key=True, autoincrement=False)
+    # Sin clave foránea: las posiciones del histórico se pueden borrar sin tocar esta tabla
+    posicion_id = db.Column(db.Integer)
+    x = db.Column(db.Integer, nullable=False)
+    y = db.Column(db.Integer, nullable=False)
+    zona_id = db.Column(db.Integer, db.ForeignKey('zonas.id'))
+    taller_id = db.Column(db.Integer, db.ForeignKey('talleres.id'))
+    residuo = db.Column(db.Float)
+    vx = db.Column(db.Float)
+    vy = db.Column(db.Float)
+    timestamp = db.Column(db.TIMESTAMP)
+
+    def __init__(self, tag_id=None, posicion_id=None, x=0, y=0, zona_id=None, taller_id=None,
+                 residuo=None, vx=None, vy=None, timestamp=None):
+        self.tag_id = tag_id
+        self.posicion_id = posicion_id
+        self.x = x
+        self.y = y
+        self.zona_id = zona_id
+        self.taller_id = taller_id
+        self.residuo = residuo
+        self.vx = vx
+        self.vy = vy
+        self.timestamp = timestamp
+
+    def to_dict(self):
+        return {
+            'id': self.posicion_id,
+            'tag_id': self.tag_id,
+            'x': self.x,
+            'y': self.y,
+            'zona_id': self.zona_id,
+            'taller_id': self.taller_id,
+            'residuo': self.residuo,
+            'vx': self.vx,
+            'vy': self.vy,
+            'timestamp': self.timestamp.isoformat() if self.timestamp else None
+        }
+
+    def __repr__(self):
+        return f'<PosicionUltima Tag {self.tag_id} en ({self.x},{self.y})>'
@@ -40,7 +40,7 @@ class Tag(db.Model):
     mac = db.Column(db.String(50), unique=True, nullable=False)
     estado = db.Column(db.String(20), nullable=False)
     bateria = db.Column(db.Integer)
-    ultima_comunicacion = db.Column(db.TIMESTAMP)
+    ultima_comunicacion = db.Column(db.TIMESTAMP, index=True)
     observaciones = db.Column(db.Text)
     
     vehiculo = db.relationship('Vehiculo', back_populates='tag', uselist=False)
@@ -24,6 +24,11 @@ class Vehiculo(db.Model):
       tag_id:
         type: integer
         description: ID del tag UWB asociado al vehículo para su localización
+      zonas_permitidas:
+        type: array
+        items:
+          type: integer
+        description: IDs de las zonas en las que puede estar el vehículo (null = cualquier zona del taller)
     """
     __tablename__ = 'vehiculos'
     
@@ -35,13 +40,18 @@ class Vehiculo(db.Model):
     
     tag_id = db.Column(db.Integer, db.ForeignKey('tags.id'), unique=True)
     tag = db.relationship('Tag', back_populates='vehiculo', uselist=False)
+
+    # Lista de ids de zona; fuera de ellas se genera una alerta fuera_de_area (services/geocercas.py)
+    zonas_permitidas = db.Column(db.JSON(none_as_null=True))
     
-    def __init__(self, matricula=None, bastidor=None, referencia=None, estado='activo', tag_id=None):
+    def __init__(self, matricula=None, bastidor=None, referencia=None, estado='activo', tag_id=None,
+                 zonas_permitidas=None):
         self.matricula = matricula
         self.bastidor = bastidor
         self.referencia = referencia
         self.estado = estado
         self.tag_id = tag_id
+        self.zonas_permitidas = zonas_permitidas
     
     def to_dict(self):
         return {
@@ -50,7 +60,8 @@ class Vehiculo(db.Model):
             'bastidor': self.bastidor,
             'referencia': self.referencia,
             'estado': self.estado,
-            'tag_id': self.tag_id
+            'tag_id': self.tag_id,
+            'zonas_permitidas': self.zonas_permitidas
         }
     
     def __repr__(self):
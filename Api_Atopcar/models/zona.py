@@ -20,6 +20,13 @@ class Zona(db.Model):
       taller_id:
         type: integer
         description: ID del taller al que pertenece esta zona
+      poligono:
+        type: array
+        description: Vértices [x, y] del contorno de la zona en coordenadas del taller (cm)
+        items:
+          type: array
+          items:
+            type: number
     """
     __tablename__ = 'zonas'
     
@@ -28,15 +35,17 @@ class Zona(db.Model):
     tipo = db.Column(db.String(20))
     color_hex = db.Column(db.String(7))
     taller_id = db.Column(db.Integer, db.ForeignKey('talleres.id'))
+    poligono = db.Column(db.JSON(none_as_null=True))
     
     # Relación
     taller = db.relationship('Taller', backref=db.backref('zonas', lazy=True))
     
-    def __init__(self, nombre=None, tipo=None, color_hex=None, taller_id=None):
+    def __init__(self, nombre=None, tipo=None, color_hex=None, taller_id=None, poligono=None):
         self.nombre = nombre
         self.tipo = tipo
         self.color_hex = color_hex
         self.taller_id = taller_id
+        self.poligono = poligono
     
     def to_dict(self):
         return {
@@ -44,7 +53,8 @@ class Zona(db.Model):
             'nombre': self.nombre,
             'tipo': self.tipo,
             'color_hex': self.color_hex,
-            'taller_id': self.taller_id
+            'taller_id': self.taller_id,
+            'poligono': self.poligono
         }
     
     def __repr__(self):
@@ -3,6 +3,7 @@ from extensions import db
 from models.alerta import Alerta
 from models.tag import Tag
 from models.vehiculo import Vehiculo
+from services import paginacion
 from flasgger import swag_from
 
 # Crear el blueprint para las alertas
@@ -21,28 +22,34 @@ alerta_bp = Blueprint('alertas', __name__, url_prefix='/api/alertas')
             'type': 'boolean',
             'required': False,
             'description': 'Filtrar por estado de lectura (true/false)'
-        }
+        },
+        *paginacion.PARAMETROS
     ],
     'responses': {
         200: {
-            'description': 'Lista de alertas',
-            'schema': {
-                'type': 'array',
-                'items': {'$ref': '#/definitions/Alerta'}
-            }
+            'description': 'Página de alertas, de la más reciente a la más antigua',
+            'schema': paginacion.esquema('Alerta')
+        },
+        400: {
+            'description': 'Parámetros de paginación no válidos'
         }
     }
 })
 def get_all_alertas():
     # Opcionalmente filtrar por leídas/no leídas
     leido = request.args.get('leido')
+    query = Alerta.query
     if leido is not None:
         leido_bool = leido.lower() == 'true'
-        alertas = Alerta.query.filter_by(leido=leido_bool).all()
-    else:
-        alertas = Alerta.query.all()
+        query = query.filter_by(leido=leido_bool)
+    
+    # Más recientes primero; se recorre el índice (leido, timestamp) o el de timestamp
+    try:
+        alertas, next_cursor = paginacion.paginar(query, [Alerta.timestamp, Alerta.id], descendente=True)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     
-    return jsonify([alerta.to_dict() for alerta in alertas])
+    return jsonify(paginacion.pagina([alerta.to_dict() for alerta in alertas], next_cursor))
 
 # Obtener una alerta específica
 @alerta_bp.route('/<int:id>', methods=['GET'])
@@ -89,7 +96,7 @@ def get_alerta(id):
                 'properties': {
                     'tag_id': {'type': 'integer', 'description': 'ID del tag asociado'},
                     'vehiculo_id': {'type': 'integer', 'description': 'ID del vehículo asociado'},
-                    'tipo': {'type': 'string', 'enum': ['bateria_baja', 'fuera_de_zona', 'movimiento_no_autorizado', 'averia', 'otros']},
+                    'tipo': {'type': 'string', 'enum': ['desconexion', 'bateria_baja', 'fuera_de_area', 'otros']},
                     'descripcion': {'type': 'string', 'description': 'Detalle de la alerta'},
                     'leido': {'type': 'boolean', 'default': False}
                 }
@@ -152,7 +159,7 @@ def create_alerta():
                 'properties': {
                     'tag_id': {'type': 'integer', 'description': 'ID del tag asociado'},
                     'vehiculo_id': {'type': 'integer', 'description': 'ID del vehículo asociado'},
-                    'tipo': {'type': 'string', 'enum': ['bateria_baja', 'fuera_de_zona', 'movimiento_no_autorizado', 'averia', 'otros']},
+                    'tipo': {'type': 'string', 'enum': ['desconexion', 'bateria_baja', 'fuera_de_area', 'otros']},
                     'descripcion': {'type': 'string', 'description': 'Detalle de la alerta'},
                     'leido': {'type': 'boolean'}
                 }
@@ -279,5 +286,5 @@ def marcar_leida(id):
     }
 })
 def get_no_leidas():
-    alertas_no_leidas = Alerta.query.filter_by(leido=False).all()
+    alertas_no_leidas = Alerta.query.filter_by(leido=False).order_by(Alerta.timestamp.desc()).all()
     return jsonify([alerta.to_dict() for alerta in alertas_no_leidas])
\ No newline at end of file
@@ -3,6 +3,7 @@ from extensions import db
 from models.anchor import Anchor
 from models.taller import Taller
 from models.zona import Zona
+from services import geometria_anchors, paginacion, registro_anchors
 from flasgger import swag_from
 
 # Crear el blueprint para los anchors
@@ -35,15 +36,16 @@ anchor_bp = Blueprint('anchors', __name__, url_prefix='/api/anchors')
             'type': 'boolean',
             'required': False,
             'description': 'Filtrar por estado activo/inactivo (true/false)'
-        }
+        },
+        *paginacion.PARAMETROS
     ],
     'responses': {
         200: {
-            'description': 'Lista de anchors',
-            'schema': {
-                'type': 'array',
-                'items': {'$ref': '#/definitions/Anchor'}
-            }
+            'description': 'Página de anchors ordenada por ID',
+            'schema': paginacion.esquema('Anchor')
+        },
+        400: {
+            'description': 'Parámetros de paginación no válidos'
         }
     }
 })
@@ -65,8 +67,12 @@ def get_all_anchors():
         activo_bool = activo.lower() == 'true'
         query = query.filter_by(activo=activo_bool)
     
-    anchors = query.all()
-    return jsonify([anchor.to_dict() for anchor in anchors])
+    try:
+        anchors, next_cursor = paginacion.paginar(query, [Anchor.id])
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    
+    return jsonify(paginacion.pagina([anchor.to_dict() for anchor in anchors], next_cursor))
 
 # Obtener un anchor específico
 @anchor_bp.route('/<int:id>', methods=['GET'])
@@ -161,6 +167,7 @@ def create_anchor():
     
     db.session.add(nuevo_anchor)
     db.session.commit()
+    registro_anchors.invalidar()
     
     return jsonify(nuevo_anchor.to_dict()), 201
 
@@ -245,6 +252,8 @@ def update_anchor(id):
         anchor.activo = data['activo']
     
     db.session.commit()
+    registro_anchors.invalidar()
+    geometria_anchors.invalidar(id)
     
     return jsonify(anchor.to_dict())
 
@@ -276,6 +285,8 @@ def delete_anchor(id):
     anchor = Anchor.query.get_or_404(id)
     db.session.delete(anchor)
     db.session.commit()
+    registro_anchors.invalidar()
+    geometria_anchors.invalidar(id)
     
     return '', 204
 
@@ -308,5 +319,6 @@ def toggle_activo(id):
     anchor = Anchor.query.get_or_404(id)
     anchor.activo = not anchor.activo
     db.session.commit()
+    registro_anchors.invalidar()
     
     return jsonify(anchor.to_dict())
\ No newline at end of file
@@ -1,10 +1,12 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, current_app
 from extensions import db
 from models.distancia import Distancia
 from models.tag import Tag
 from models.anchor import Anchor
-from datetime import datetime
 from routes.posiciones import triangular_posicion 
+from services.upsert import upsert_distancia
+from services import cadencia, cola_ingesta, formato_binario, paginacion
+from services.ingesta import comprobar_reporte, procesar_lote, procesar_reporte, MAX_REPORTES_LOTE
 from flasgger import swag_from
 
 # Crear el blueprint para las distancias
@@ -23,15 +25,16 @@ distancia_bp = Blueprint('distancias', __name__, url_prefix='/api/distancias')
             'type': 'integer',
             'required': False,
             'description': 'Filtrar por ID del tag'
-        }
+        },
+        *paginacion.PARAMETROS
     ],
     'responses': {
         200: {
-            'description': 'Lista de mediciones de distancia',
-            'schema': {
-                'type': 'array',
-                'items': {'$ref': '#/definitions/Distancia'}
-            }
+            'description': 'Página de mediciones de distancia ordenada por ID',
+            'schema': paginacion.esquema('Distancia')
+        },
+        400: {
+            'description': 'Parámetros de paginación no válidos'
         }
     }
 })
@@ -44,8 +47,12 @@ def get_all_distancias():
     if tag_id:
         query = query.filter_by(tag_id=tag_id)
     
-    distancias = query.all()
-    return jsonify([distancia.to_dict() for distancia in distancias])
+    try:
+        distancias, next_cursor = paginacion.paginar(query, [Distancia.id])
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    
+    return jsonify(paginacion.pagina([distancia.to_dict() for distancia in distancias], next_cursor))
 
 # Obtener una distancia específica
 @distancia_bp.route('/<int:id>', methods=['GET'])
@@ -133,53 +140,42 @@ def create_distancia():
     if data.get('anchor3_id') and not Anchor.query.get(data['anchor3_id']):
         return jsonify({"error": "El anchor3 especificado no existe"}), 400
     
-    # Verificar si ya existe una entrada para este tag
-    existing = Distancia.query.filter_by(tag_id=data.get('tag_id')).first()
-    if existing:
-        # Si existe, actualizar en lugar de crear
-        if data.get('anchor1_id'):
-            existing.anchor1_id = data.get('anchor1_id')
-        if 'anchor1_dist' in data:
-            existing.anchor1_dist = data.get('anchor1_dist')
-        if data.get('anchor2_id'):
-            existing.anchor2_id = data.get('anchor2_id')
-        if 'anchor2_dist' in data:
-            existing.anchor2_dist = data.get('anchor2_dist')
-        if data.get('anchor3_id'):
-            existing.anchor3_id = data.get('anchor3_id')
-        if 'anchor3_dist' in data:
-            existing.anchor3_dist = data.get('anchor3_dist')
-        
-        db.session.commit()
-        return jsonify(existing.to_dict()), 200
+    # Fila a guardar. Si el tag ya tiene fila, los ids de anchor solo se sobrescriben
+    # si vienen informados y las distancias si vienen en el cuerpo
+    fila = {'tag_id': data.get('tag_id')}
+    columnas_actualizar = []
+    for n in (1, 2, 3):
+        campo_id, campo_dist = f'anchor{n}_id', f'anchor{n}_dist'
+        fila[campo_id] = data.get(campo_id)
+        fila[campo_dist] = data.get(campo_dist)
+        if data.get(campo_id):
+            columnas_actualizar.append(campo_id)
+        if campo_dist in data:
+            columnas_actualizar.append(campo_dist)
     
-    # Si no existe, crear nueva distancia
-    nueva_distancia = Distancia(
-        tag_id=data.get('tag_id'),
-        anchor1_id=data.get('anchor1_id'),
-        anchor1_dist=data.get('anchor1_dist'),
-        anchor2_id=data.get('anchor2_id'),
-        anchor2_dist=data.get('anchor2_dist'),
-        anchor3_id=data.get('anchor3_id'),
-        anchor3_dist=data.get('anchor3_dist')
-    )
-    
-    db.session.add(nueva_distancia)
+    # Inserción o actualización en una sola sentencia
+    creada = upsert_distancia(fila, columnas_actualizar)
+    distancia = Distancia.query.filter_by(tag_id=fila['tag_id']).one()
+    respuesta = distancia.to_dict()
     db.session.commit()
     
+    # Si el tag ya tenía fila solo se actualiza, como antes del upsert
+    if not creada:
+        return jsonify(respuesta), 200
+    
     # Calcular y guardar la posición mediante triangulación
-    if (nueva_distancia.anchor1_id and nueva_distancia.anchor1_dist and
-        nueva_distancia.anchor2_id and nueva_distancia.anchor2_dist and
-        nueva_distancia.anchor3_id and nueva_distancia.anchor3_dist):
+    if (respuesta['anchor1_id'] and respuesta['anchor1_dist'] and
+        respuesta['anchor2_id'] and respuesta['anchor2_dist'] and
+        respuesta['anchor3_id'] and respuesta['anchor3_dist']):
         
         triangular_posicion(
-            nueva_distancia.tag_id,
-            nueva_distancia.anchor1_id, nueva_distancia.anchor1_dist,
-            nueva_distancia.anchor2_id, nueva_distancia.anchor2_dist,
-            nueva_distancia.anchor3_id, nueva_distancia.anchor3_dist
+            respuesta['tag_id'],
+            respuesta['anchor1_id'], respuesta['anchor1_dist'],
+            respuesta['anchor2_id'], respuesta['anchor2_dist'],
+            respuesta['anchor3_id'], respuesta['anchor3_dist']
         )
     
-    return jsonify(nueva_distancia.to_dict()), 201
+    return jsonify(respuesta), 201
 
 # Actualizar una distancia
 @distancia_bp.route('/<int:id>', methods=['PUT'])
@@ -343,7 +339,10 @@ def get_by_tag(tag_id):
 @swag_from({
     'tags': ['distancias'],
     'summary': 'Registrar distancias desde dispositivo',
-    'description': 'Endpoint para recibir mediciones directamente desde dispositivos UWB',
+    'description': 'Endpoint para recibir mediciones directamente desde dispositivos UWB. '
+                   'Acepta JSON o el formato binario compacto (Content-Type: application/vnd.atopcar.uwb, '
+                   'ver services/formato_binario.py)',
+    'consumes': ['application/json', 'application/vnd.atopcar.uwb', 'application/octet-stream'],
     'parameters': [
         {
             'name': 'datos',
@@ -355,7 +354,7 @@ def get_by_tag(tag_id):
                     'tag': {'type': 'string', 'description': 'Código del tag UWB'},
                     'anchors': {
                         'type': 'array',
-                        'description': 'Lista de anchors con sus distancias',
+                        'description': 'Lista de anchors (3 o más) con sus distancias',
                         'items': {
                             'type': 'object',
                             'properties': {
@@ -363,7 +362,9 @@ def get_by_tag(tag_id):
                                 'distancia': {'type': 'string', 'description': 'Distancia en metros'}
                             }
                         }
-                    }
+                    },
+                    'bateria': {'type': 'integer', 'description': 'Nivel de batería del tag en porcentaje (opcional)'},
+                    'offset_ms': {'type': 'integer', 'description': 'Milisegundos transcurridos desde la medida hasta el envío, si el tag la envía con retraso (opcional)'}
                 },
                 'required': ['tag', 'anchors']
             }
@@ -376,7 +377,9 @@ def get_by_tag(tag_id):
                 'type': 'object',
                 'properties': {
                     'mensaje': {'type': 'string'},
-                    'data': {'$ref': '#/definitions/Distancia'}
+                    'data': {'$ref': '#/definitions/Distancia'},
+                    'posicion': {'$ref': '#/definitions/Posicion'},
+                    'next_report_ms': {'type': 'integer', 'description': 'Espera recomendada hasta el siguiente reporte'}
                 }
             }
         },
@@ -386,128 +389,204 @@ def get_by_tag(tag_id):
                 'type': 'object',
                 'properties': {
                     'mensaje': {'type': 'string'},
-                    'data': {'$ref': '#/definitions/Distancia'}
+                    'data': {'$ref': '#/definitions/Distancia'},
+                    'posicion': {'$ref': '#/definitions/Posicion'},
+                    'next_report_ms': {'type': 'integer', 'description': 'Espera recomendada hasta el siguiente reporte'}
                 }
             }
         },
+        202: {
+            'description': 'Reporte validado y encolado (modo write-behind)'
+        },
         400: {
             'description': 'Error en el formato de datos'
         },
         404: {
             'description': 'Tag o anchor no encontrado'
+        },
+        503: {
+            'description': 'Cola de ingesta llena (modo write-behind)'
         }
     }
 })
 def registrar_distancias():
-    data = request.json
+    try:
+        data = _leer_cuerpo(formato_binario.decodificar)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     
-    # Verificar formato del JSON
-    if not data.get('tag') or not data.get('anchors') or not isinstance(data.get('anchors'), list) or len(data.get('anchors')) != 3:
-        return jsonify({"error": "Formato inválido. Se requiere un tag y exactamente 3 anchors"}), 400
+    # Cada respuesta indica al tag cuánto esperar hasta el siguiente reporte
+    codigo = data.get('tag') if isinstance(data, dict) else None
     
-    # Buscar el tag por su código
-    tag = Tag.query.filter_by(codigo=data['tag']).first()
-    if not tag:
-        return jsonify({"error": f"El tag {data['tag']} no existe en la base de datos"}), 404
+    # Modo write-behind: se valida contra las cachés, se encola y se responde sin esperar a la base de datos
+    if cola_ingesta.activa():
+        error = comprobar_reporte(data)
+        if error:
+            return jsonify({"error": error[1], "next_report_ms": cadencia.siguiente_reporte_ms(codigo)}), error[0]
+        if not cola_ingesta.encolar(data):
+            return jsonify({
+                "error": "La cola de ingesta está llena, reintente más tarde",
+                "next_report_ms": current_app.config.get('CADENCIA_MAX_MS', 30000)
+            }), 503
+        return jsonify({"mensaje": "Reporte aceptado", "next_report_ms": cadencia.siguiente_reporte_ms(codigo)}), 202
     
-    # Buscar los anchors y guardar sus IDs
-    anchors_data = []
-    for i, anchor_data in enumerate(data['anchors']):
-        if not anchor_data.get('shortAddres') or 'distancia' not in anchor_data:
-            return jsonify({"error": f"Formato inválido para el anchor #{i+1}"}), 400
-        
-        # Buscar anchor por nombre
-        anchor = Anchor.query.filter_by(nombre=anchor_data['shortAddres']).first()
-        if not anchor:
-            return jsonify({"error": f"El anchor {anchor_data['shortAddres']} no existe en la base de datos"}), 404
-        
-        # Convertir distancia a número
-        try:
-            distancia = float(anchor_data['distancia']) * 100  # Convertir a cm
-        except ValueError:
-            return jsonify({"error": f"La distancia debe ser un número válido para el anchor {anchor_data['shortAddres']}"}), 400
-        
-        anchors_data.append({
-            'id': anchor.id,
-            'distancia': distancia
-        })
+    # Validación, resolución, trilateración y escritura en una sola unidad de trabajo
+    resultado = procesar_reporte(data)
     
-    # Verificar si ya existe una entrada de distancia para este tag
-    distancia_existente = Distancia.query.filter_by(tag_id=tag.id).first()
+    if 'error' in resultado:
+        return jsonify({"error": resultado['error'], "next_report_ms": cadencia.siguiente_reporte_ms(codigo)}), resultado['estado']
     
-    # Verificar cambios significativos en distancias (50 cm de diferencia)
-    cambio_significativo = False
-    if distancia_existente:
-        distancias_anteriores = [
-            distancia_existente.anchor1_dist if distancia_existente.anchor1_dist else 0,
-            distancia_existente.anchor2_dist if distancia_existente.anchor2_dist else 0,
-            distancia_existente.anchor3_dist if distancia_existente.anchor3_dist else 0
-        ]
-        
-        for i, anchor_data in enumerate(anchors_data):
-            if i < len(distancias_anteriores) and abs(anchor_data['distancia'] - distancias_anteriores[i]) >= 50.0:
-                cambio_significativo = True
-                break
-    else:
-        cambio_significativo = True  # Si no hay entrada previa, siempre es un cambio significativo
+    return jsonify({
+        "mensaje": resultado['mensaje'],
+        "data": resultado['distancia'],
+        "posicion": resultado['posicion'],
+        "next_report_ms": cadencia.siguiente_reporte_ms(codigo)
+    }), resultado['estado']
+
+# Registrar en lote los reportes de varios tags (o varias épocas de un mismo tag)
+@distancia_bp.route('/registrar-lote', methods=['POST'])
+@swag_from({
+    'tags': ['distancias'],
+    'summary': 'Registrar distancias en lote',
+    'description': 'Recibe varios reportes de ranging en una sola petición y los guarda en una única transacción. '
+                   'Devuelve el resultado de cada reporte por separado. En formato binario el cuerpo son '
+                   'varias tramas consecutivas.',
+    'consumes': ['application/json', 'application/vnd.atopcar.uwb', 'application/octet-stream'],
+    'parameters': [
+        {
+            'name': 'reportes',
+            'in': 'body',
+            'required': True,
+            'schema': {
+                'type': 'array',
+                'items': {
+                    'type': 'object',
+                    'properties': {
+                        'tag': {'type': 'string', 'description': 'Código del tag UWB'},
+                        'anchors': {
+                            'type': 'array',
+                            'description': 'Lista de anchors (3 o más) con sus distancias',
+                            'items': {
+                                'type': 'object',
+                                'properties': {
+                                    'shortAddres': {'type': 'string', 'description': 'Nombre del anchor'},
+                                    'distancia': {'type': 'string', 'description': 'Distancia en metros'}
+                                }
+                            }
+                        },
+                        'bateria': {'type': 'integer', 'description': 'Nivel de batería del tag en porcentaje (opcional)'},
+                        'offset_ms': {'type': 'integer', 'description': 'Milisegundos transcurridos desde la medida hasta el envío, si el tag la envía con retraso (opcional)'}
+                    },
+                    'required': ['tag', 'anchors']
+                }
+            }
+        }
+    ],
+    'responses': {
+        200: {
+            'description': 'Lote procesado. Cada reporte incluye su propio estado (200, 201, 202, 400, 404 o 503)',
+            'schema': {
+                'type': 'object',
+                'properties': {
+                    'mensaje': {'type': 'string'},
+                    'procesados': {'type': 'integer'},
+                    'errores': {'type': 'integer'},
+                    'resultados': {
+                        'type': 'array',
+                        'items': {
+                            'type': 'object',
+                            'properties': {
+                                'indice': {'type': 'integer'},
+                                'tag': {'type': 'string'},
+                                'estado': {'type': 'integer'},
+                                'mensaje': {'type': 'string'},
+                                'error': {'type': 'string'},
+                                'posicion': {'$ref': '#/definitions/Posicion'},
+                                'next_report_ms': {'type': 'integer'}
+                            }
+                        }
+                    }
+                }
+            }
+        },
+        400: {
+            'description': 'El cuerpo no es una lista de reportes o supera el tamaño máximo del lote'
+        }
+    }
+})
+def registrar_distancias_lote():
+    try:
+        data = _leer_cuerpo(formato_binario.decodificar_varios)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     
-    # Actualizar o crear la entrada de distancias
-    if distancia_existente:
-        # Actualizar solo si hay cambios significativos
-        if cambio_significativo:
-            distancia_existente.anchor1_id = anchors_data[0]['id']
-            distancia_existente.anchor1_dist = anchors_data[0]['distancia']
-            distancia_existente.anchor2_id = anchors_data[1]['id']
-            distancia_existente.anchor2_dist = anchors_data[1]['distancia']
-            distancia_existente.anchor3_id = anchors_data[2]['id']
-            distancia_existente.anchor3_dist = anchors_data[2]['distancia']
-            db.session.commit()
-            
-            #Triangular posición después de actualizar distancias
-            triangular_posicion(
-                tag.id,
-                distancia_existente.anchor1_id, distancia_existente.anchor1_dist,
-                distancia_existente.anchor2_id, distancia_existente.anchor2_dist,
-                distancia_existente.anchor3_id, distancia_existente.anchor3_dist
-            )
-            
-            return jsonify({
-                "mensaje": "Distancias actualizadas correctamente",
-                "data": distancia_existente.to_dict()
-            })
-        else:
-            return jsonify({
-                "mensaje": "No hay cambios significativos en las distancias",
-                "data": distancia_existente.to_dict()
-            })
+    # Se admite la lista directamente o envuelta en {"reportes": [...]}
+    reportes = data.get('reportes') if isinstance(data, dict) else data
+    if not isinstance(reportes, list) or not reportes:
+        return jsonify({"error": "Formato inválido. Se requiere una lista de reportes"}), 400
+    
+    if len(reportes) > MAX_REPORTES_LOTE:
+        return jsonify({"error": f"El lote no puede superar {MAX_REPORTES_LOTE} reportes"}), 400
+    
+    if cola_ingesta.activa():
+        resultados = [_encolar_reporte(indice, reporte) for indice, reporte in enumerate(reportes)]
     else:
-        # Crear nueva entrada
-        nueva_distancia = Distancia(
-            tag_id=tag.id,
-            anchor1_id=anchors_data[0]['id'],
-            anchor1_dist=anchors_data[0]['distancia'],
-            anchor2_id=anchors_data[1]['id'],
-            anchor2_dist=anchors_data[1]['distancia'],
-            anchor3_id=anchors_data[2]['id'],
-            anchor3_dist=anchors_data[2]['distancia']
-        )
-        
-        db.session.add(nueva_distancia)
-        db.session.commit()
-        
-        #Triangular posición después de crear nueva distancia
-        triangular_posicion(
-            tag.id,
-            nueva_distancia.anchor1_id, nueva_distancia.anchor1_dist,
-            nueva_distancia.anchor2_id, nueva_distancia.anchor2_dist,
-            nueva_distancia.anchor3_id, nueva_distancia.anchor3_dist
-        )
-        
-        # También actualizamos la última comunicación del tag
-        tag.ultima_comunicacion = datetime.utcnow()
-        db.session.commit()
-        
-        return jsonify({
-            "mensaje": "Distancias registradas correctamente",
-            "data": nueva_distancia.to_dict()
-        }), 201
\ No newline at end of file
+        resultados = procesar_lote(reportes)
+    for resultado in resultados:
+        resultado['next_report_ms'] = cadencia.siguiente_reporte_ms(resultado['tag'])
+    errores = sum(1 for resultado in resultados if 'error' in resultado)
+    
+    return jsonify({
+        "mensaje": "Lote procesado",
+        "procesados": len(resultados) - errores,
+        "errores": errores,
+        "resultados": resultados
+    })
+
+
+def _leer_cuerpo(decodificador):
+    # Los tags pueden enviar el reporte en JSON o en el formato binario compacto
+    if request.mimetype in formato_binario.TIPOS_CONTENIDO:
+        return decodificador(request.get_data())
+    return request.json
+
+
+def _encolar_reporte(indice, reporte):
+    codigo = reporte.get('tag') if isinstance(reporte, dict) else None
+    error = comprobar_reporte(reporte)
+    if error:
+        return {'indice': indice, 'tag': codigo, 'estado': error[0], 'error': error[1]}
+    if not cola_ingesta.encolar(reporte):
+        return {'indice': indice, 'tag': codigo, 'estado': 503, 'error': "La cola de ingesta está llena"}
+    return {'indice': indice, 'tag': codigo, 'estado': 202, 'mensaje': "Reporte aceptado"}
+
+# Estado de la cola de escritura diferida
+@distancia_bp.route('/cola', methods=['GET'])
+@swag_from({
+    'tags': ['distancias'],
+    'summary': 'Estado de la cola de ingesta',
+    'description': 'Métricas del modo write-behind: profundidad de la cola, latencia de escritura y elementos descartados',
+    'responses': {
+        200: {
+            'description': 'Métricas de la cola',
+            'schema': {
+                'type': 'object',
+                'properties': {
+                    'activa': {'type': 'boolean'},
+                    'profundidad': {'type': 'integer'},
+                    'capacidad': {'type': 'integer'},
+                    'encolados': {'type': 'integer'},
+                    'escritos': {'type': 'integer'},
+                    'rechazados': {'type': 'integer'},
+                    'descartados': {'type': 'integer'},
+                    'lotes': {'type': 'integer'},
+                    'flush_ultimo_ms': {'type': 'number'},
+                    'flush_medio_ms': {'type': 'number'},
+                    'flush_max_ms': {'type': 'number'}
+                }
+            }
+        }
+    }
+})
+def get_estado_cola():
+    return jsonify(cola_ingesta.estadisticas())
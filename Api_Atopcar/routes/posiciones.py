@@ -1,12 +1,11 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, Response, request, jsonify, current_app, stream_with_context
 from extensions import db
 from models.posicion import Posicion
 from models.tag import Tag
 from models.zona import Zona
-from sqlalchemy import desc
-from datetime import datetime, timedelta
-from models.anchor import Anchor
-import numpy as np
+from datetime import datetime, timedelta, timezone
+from services import difusion, exportacion, filtro_kalman, geocercas, geometria_anchors, indice_zonas, paginacion, registro_anchors, sondeo_posiciones, ultimas_posiciones
+import json
 import traceback
 from flasgger import swag_from
 
@@ -41,22 +40,15 @@ posicion_bp = Blueprint('posiciones', __name__, url_prefix='/api/posiciones')
             'required': False,
             'description': 'Filtrar por últimas N horas'
         },
-        {
-            'name': 'limit',
-            'in': 'query',
-            'type': 'integer',
-            'required': False,
-            'default': 100,
-            'description': 'Límite de resultados a devolver'
-        }
+        *paginacion.PARAMETROS
     ],
     'responses': {
         200: {
-            'description': 'Lista de posiciones',
-            'schema': {
-                'type': 'array',
-                'items': {'$ref': '#/definitions/Posicion'}
-            }
+            'description': 'Página de posiciones, de la más reciente a la más antigua',
+            'schema': paginacion.esquema('Posicion')
+        },
+        400: {
+            'description': 'Parámetros de paginación no válidos'
         }
     }
 })
@@ -67,8 +59,6 @@ def get_all_posiciones():
     zona_id = request.args.get('zona_id', type=int)
     # Filtrar por fecha (últimas N horas)
     hours = request.args.get('hours', type=int)
-    # Limitar número de resultados
-    limit = request.args.get('limit', type=int, default=100)
     
     query = Posicion.query
     
@@ -80,11 +70,13 @@ def get_all_posiciones():
         time_threshold = datetime.utcnow() - timedelta(hours=hours)
         query = query.filter(Posicion.timestamp >= time_threshold)
     
-    # Ordenar por timestamp descendente (más recientes primero)
-    query = query.order_by(desc(Posicion.timestamp)).limit(limit)
+    # Más recientes primero, por (timestamp, id) para que el cursor sea único
+    try:
+        posiciones, next_cursor = paginacion.paginar(query, [Posicion.timestamp, Posicion.id], descendente=True)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     
-    posiciones = query.all()
-    return jsonify([posicion.to_dict() for posicion in posiciones])
+    return jsonify(paginacion.pagina([posicion.to_dict() for posicion in posiciones], next_cursor))
 
 # Obtener una posición específica
 @posicion_bp.route('/<int:id>', methods=['GET'])
@@ -174,6 +166,8 @@ def create_posicion():
     
     db.session.add(nueva_posicion)
     db.session.commit()
+    if tag_id:
+        ultimas_posiciones.recalcular(tag_id)
     
     return jsonify(nueva_posicion.to_dict()), 201
 
@@ -232,6 +226,7 @@ def update_posicion(id):
         return jsonify({"error": "La zona especificada no existe"}), 400
     
     # Actualizar campos
+    tag_anterior = posicion.tag_id
     if 'tag_id' in data:
         posicion.tag_id = data['tag_id']
     if 'x' in data:
@@ -243,6 +238,10 @@ def update_posicion(id):
     
     db.session.commit()
     
+    # La posición editada puede ser (o dejar de ser) la última de su tag
+    for afectado in {tag_anterior, posicion.tag_id} - {None}:
+        ultimas_posiciones.recalcular(afectado)
+    
     return jsonify(posicion.to_dict())
 
 # Eliminar una posición
@@ -271,8 +270,11 @@ def update_posicion(id):
 })
 def delete_posicion(id):
     posicion = Posicion.query.get_or_404(id)
+    tag_id = posicion.tag_id
     db.session.delete(posicion)
     db.session.commit()
+    if tag_id:
+        ultimas_posiciones.recalcular(tag_id)
     
     return '', 204
 
@@ -302,16 +304,229 @@ def delete_posicion(id):
     }
 })
 def get_ultima_posicion(tag_id):
+    # La última posición se sirve de la copia en memoria (services/ultimas_posiciones.py)
+    ultima_posicion = ultimas_posiciones.obtener(tag_id)
+    if ultima_posicion is not None:
+        return jsonify(ultima_posicion)
+    
     # Verificar que el tag existe
     if not Tag.query.get(tag_id):
         return jsonify({"error": "El tag especificado no existe"}), 404
     
-    ultima_posicion = Posicion.query.filter_by(tag_id=tag_id).order_by(desc(Posicion.timestamp)).first()
+    return jsonify({"error": "No hay posiciones registradas para este tag"}), 404
+
+# Obtener la última posición de todos los tags
+@posicion_bp.route('/ultimas', methods=['GET'])
+@swag_from({
+    'tags': ['posiciones'],
+    'summary': 'Obtener la última posición de todos los tags',
+    'description': 'Devuelve la posición más reciente de cada tag desde la copia mantenida por la ingesta, '
+                   'sin recorrer el histórico',
+    'parameters': [
+        {
+            'name': 'taller_id',
+            'in': 'query',
+            'type': 'integer',
+            'required': False,
+            'description': 'Filtrar por ID del taller'
+        },
+        {
+            'name': 'zona_id',
+            'in': 'query',
+            'type': 'integer',
+            'required': False,
+            'description': 'Filtrar por ID de la zona'
+        }
+    ],
+    'responses': {
+        200: {
+            'description': 'Última posición de cada tag',
+            'schema': {
+                'type': 'array',
+                'items': {'$ref': '#/definitions/PosicionUltima'}
+            }
+        }
+    }
+})
+def get_ultimas_posiciones():
+    taller_id = request.args.get('taller_id', type=int)
+    zona_id = request.args.get('zona_id', type=int)
+    return jsonify(ultimas_posiciones.todas(taller_id, zona_id))
+
+# Posiciones en directo con Server-Sent Events
+@posicion_bp.route('/stream', methods=['GET'])
+@swag_from({
+    'tags': ['posiciones'],
+    'summary': 'Posiciones en directo (SSE)',
+    'description': 'Flujo text/event-stream con un evento "posicion" por cada posición nueva que guarda la ingesta. '
+                   'Las posiciones de la ingesta del propio proceso llegan en memoria; las de otros procesos '
+                   '(udp_server.py, otros workers) leyendo posiciones_ultimas cada DIFUSION_SONDEO_S segundos. '
+                   'Los clientes con el mismo filtro comparten el mismo canal.',
+    'produces': ['text/event-stream'],
+    'parameters': [
+        {
+            'name': 'taller_id',
+            'in': 'query',
+            'type': 'integer',
+            'required': False,
+            'description': 'Solo posiciones de este taller'
+        },
+        {
+            'name': 'zona_id',
+            'in': 'query',
+            'type': 'integer',
+            'required': False,
+            'description': 'Solo posiciones en esta zona'
+        },
+        {
+            'name': 'tags',
+            'in': 'query',
+            'type': 'string',
+            'required': False,
+            'description': 'IDs de tag separados por comas (por ejemplo 1,2,5)'
+        }
+    ],
+    'responses': {
+        200: {
+            'description': 'Flujo de eventos; cada "data" es una Posicion en JSON con su taller_id'
+        },
+        400: {
+            'description': 'Lista de tags no válida'
+        }
+    }
+})
+def stream_posiciones():
+    taller_id = request.args.get('taller_id', type=int)
+    zona_id = request.args.get('zona_id', type=int)
+    try:
+        tags = [int(t) for t in request.args.get('tags', '').split(',') if t.strip()]
+    except ValueError:
+        return jsonify({"error": "El parámetro tags debe ser una lista de IDs separados por comas"}), 400
+    
+    # Cada cliente ocupa un hilo (o greenlet) del servidor mientras está conectado: con gunicorn
+    # hace falta un worker con hilos (--threads) o gevent (-k gevent); con workers síncronos
+    # cada cliente bloquea un worker entero. Para muchos clientes, mejor ws_server.py
+    latido = current_app.config.get('SSE_LATIDO_S', 15)
+    # Posiciones que ingieren otros procesos (el hilo se arranca con el primer cliente y no
+    # consulta la base de datos mientras no queda ninguno)
+    sondeo_posiciones.iniciar(current_app._get_current_object())
+    canal = difusion.suscribir(difusion.filtro(taller_id, zona_id, tags))
     
-    if not ultima_posicion:
-        return jsonify({"error": "No hay posiciones registradas para este tag"}), 404
+    def eventos():
+        try:
+            ultima = canal.secuencia
+            yield 'retry: 3000\n\n'
+            while True:
+                posiciones, ultima = canal.esperar(ultima, latido)
+                if not posiciones:
+                    # Comentario SSE: mantiene viva la conexión y detecta clientes desconectados
+                    yield ': latido\n\n'
+                    continue
+                for posicion in posiciones:
+                    yield f"event: posicion\ndata: {json.dumps(posicion)}\n\n"
+        finally:
+            difusion.cancelar(canal)
     
-    return jsonify(ultima_posicion.to_dict())
+    return Response(eventos(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+def _instante(nombre):
+    """Fecha ISO 8601 del parámetro nombre (UTC sin zona, como en la base de datos) o None."""
+    valor = request.args.get(nombre)
+    if not valor:
+        return None
+    instante = datetime.fromisoformat(valor)
+    if instante.tzinfo is not None:
+        instante = instante.astimezone(timezone.utc).replace(tzinfo=None)
+    return instante
+
+# Exportar el histórico de posiciones
+@posicion_bp.route('/export', methods=['GET'])
+@swag_from({
+    'tags': ['posiciones'],
+    'summary': 'Exportar el histórico de posiciones',
+    'description': 'Descarga en NDJSON (una Posicion en JSON por línea) o CSV las posiciones filtradas, '
+                   'en orden cronológico. La respuesta se genera por lotes mientras se lee la base de datos, '
+                   'así que sirve para exportar meses de histórico.',
+    'produces': ['application/x-ndjson', 'text/csv'],
+    'parameters': [
+        {
+            'name': 'tag_id',
+            'in': 'query',
+            'type': 'integer',
+            'required': False,
+            'description': 'Filtrar por ID del tag'
+        },
+        {
+            'name': 'zona_id',
+            'in': 'query',
+            'type': 'integer',
+            'required': False,
+            'description': 'Filtrar por ID de la zona'
+        },
+        {
+            'name': 'taller_id',
+            'in': 'query',
+            'type': 'integer',
+            'required': False,
+            'description': 'Filtrar por ID del taller (posiciones en alguna de sus zonas)'
+        },
+        {
+            'name': 'desde',
+            'in': 'query',
+            'type': 'string',
+            'format': 'date-time',
+            'required': False,
+            'description': 'Fecha ISO 8601 inicial, incluida (UTC si no lleva zona)'
+        },
+        {
+            'name': 'hasta',
+            'in': 'query',
+            'type': 'string',
+            'format': 'date-time',
+            'required': False,
+            'description': 'Fecha ISO 8601 final, excluida (UTC si no lleva zona)'
+        },
+        {
+            'name': 'formato',
+            'in': 'query',
+            'type': 'string',
+            'enum': ['ndjson', 'csv'],
+            'required': False,
+            'default': 'ndjson',
+            'description': 'Formato de la descarga'
+        }
+    ],
+    'responses': {
+        200: {
+            'description': 'Fichero NDJSON o CSV con las posiciones'
+        },
+        400: {
+            'description': 'Formato o fechas no válidos'
+        }
+    }
+})
+def export_posiciones():
+    tag_id = request.args.get('tag_id', type=int)
+    zona_id = request.args.get('zona_id', type=int)
+    taller_id = request.args.get('taller_id', type=int)
+    formato = request.args.get('formato', 'ndjson')
+    if formato not in exportacion.FORMATOS:
+        return jsonify({"error": "El formato debe ser ndjson o csv"}), 400
+    try:
+        desde = _instante('desde')
+        hasta = _instante('hasta')
+    except ValueError:
+        return jsonify({"error": "Las fechas desde y hasta deben tener formato ISO 8601"}), 400
+    if desde is not None and hasta is not None and desde >= hasta:
+        return jsonify({"error": "La fecha desde debe ser anterior a hasta"}), 400
+    
+    mimetype, fichero = exportacion.FORMATOS[formato]
+    sentencia = exportacion.consulta(tag_id, zona_id, desde, hasta, taller_id)
+    lote = current_app.config.get('EXPORTACION_LOTE', 1000)
+    # stream_with_context: la sesión de la base de datos se usa después de salir de la vista
+    return Response(stream_with_context(exportacion.trozos(sentencia, formato, lote)), mimetype=mimetype,
+                    headers={'Content-Disposition': f'attachment; filename={fichero}', 'X-Accel-Buffering': 'no'})
 
 
 
@@ -319,9 +534,9 @@ def get_ultima_posicion(tag_id):
 def triangular_posicion(tag_id, anchor1_id, anchor1_dist, anchor2_id, anchor2_dist, anchor3_id, anchor3_dist):
     try:
         # Obtener las coordenadas de los anchors
-        anchor1 = Anchor.query.get(anchor1_id)
-        anchor2 = Anchor.query.get(anchor2_id)
-        anchor3 = Anchor.query.get(anchor3_id)
+        anchor1 = registro_anchors.por_id(anchor1_id)
+        anchor2 = registro_anchors.por_id(anchor2_id)
+        anchor3 = registro_anchors.por_id(anchor3_id)
         
         if not (anchor1 and anchor2 and anchor3):
             print(f"Error: No se encontraron todos los anchors ({anchor1_id}, {anchor2_id}, {anchor3_id})")
@@ -336,74 +551,50 @@ def triangular_posicion(tag_id, anchor1_id, anchor1_dist, anchor2_id, anchor2_di
         print(f"Anchor2 ({anchor2.nombre}): ({anchor2.x}, {anchor2.y}) dist: {anchor2_dist}")
         print(f"Anchor3 ({anchor3.nombre}): ({anchor3.x}, {anchor3.y}) dist: {anchor3_dist}")
         
-        # Método basado en solución de ecuaciones lineales
-        # Ecuaciones para trilateración: 
-        # (x-x1)² + (y-y1)² = r1²
-        # (x-x2)² + (y-y2)² = r2²
-        # (x-x3)² + (y-y3)² = r3²
+        # Resolver la trilateración
+        x_int, y_int, residuo = geometria_anchors.resolver(
+            [anchor1, anchor2, anchor3],
+            [anchor1_dist, anchor2_dist, anchor3_dist]
+        )
         
-        # Restamos primera ecuación de las otras y resolvemos sistema lineal
-        A = np.array([
-            [2*(anchor2.x-anchor1.x), 2*(anchor2.y-anchor1.y)],
-            [2*(anchor3.x-anchor1.x), 2*(anchor3.y-anchor1.y)]
-        ])
+        print(f"Posición calculada: ({x_int}, {y_int}) residuo: {residuo} cm")
         
-        b = np.array([
-            pow(anchor1_dist, 2) - pow(anchor2_dist, 2) - pow(anchor1.x, 2) + pow(anchor2.x, 2) - pow(anchor1.y, 2) + pow(anchor2.y, 2),
-            pow(anchor1_dist, 2) - pow(anchor3_dist, 2) - pow(anchor1.x, 2) + pow(anchor3.x, 2) - pow(anchor1.y, 2) + pow(anchor3.y, 2)
-        ])
+        # Crear nueva posición
+        nueva_posicion = Posicion(
+            tag_id=tag_id,
+            x=x_int,
+            y=y_int,
+            residuo=residuo
+        )
         
-        try:
-            # Resolver sistema de ecuaciones
-            position = np.linalg.solve(A, b)
-            x, y = position[0], position[1]
-            
-            print(f"Posición calculada: ({x:.2f}, {y:.2f})")
-            
-            # Redondear a enteros para guardar en la base de datos
-            x_int, y_int = int(round(x)), int(round(y))
-            
-            # Determinar zona (simplemente usamos la zona del anchor más cercano)
-            zona_id = anchor1.zona_id
-            
-            # Crear nueva posición
-            nueva_posicion = Posicion(
-                tag_id=tag_id,
-                x=x_int,
-                y=y_int,
-                zona_id=zona_id
-            )
-            
-            db.session.add(nueva_posicion)
-            db.session.commit()
-            
-            return nueva_posicion
-            
-        except np.linalg.LinAlgError:
-            # Si el sistema no tiene solución única, usar método alternativo
-            print("No se pudo resolver el sistema de ecuaciones. Usando método alternativo...")
-            # Implementar método de minimización de errores aquí
-            
-            # Método simple: posición promedio ponderada por inverso de distancias
-            total_weight = 1/anchor1_dist + 1/anchor2_dist + 1/anchor3_dist
-            x = (anchor1.x/anchor1_dist + anchor2.x/anchor2_dist + anchor3.x/anchor3_dist) / total_weight
-            y = (anchor1.y/anchor1_dist + anchor2.y/anchor2_dist + anchor3.y/anchor3_dist) / total_weight
-            
-            x_int, y_int = int(round(x)), int(round(y))
-            
-            zona_id = anchor1.zona_id
-            
-            nueva_posicion = Posicion(
-                tag_id=tag_id,
-                x=x_int,
-                y=y_int,
-                zona_id=zona_id
-            )
-            
-            db.session.add(nueva_posicion)
-            db.session.commit()
-            
-            return nueva_posicion
+        # Suavizar con el filtro de seguimiento del tag
+        if current_app.config.get('FILTRO_KALMAN', False):
+            nueva_posicion.timestamp = datetime.utcnow()
+            estimacion = filtro_kalman.actualizar(tag_id, x_int, y_int, nueva_posicion.timestamp, residuo)
+            nueva_posicion.x, nueva_posicion.y = int(round(estimacion.x)), int(round(estimacion.y))
+            nueva_posicion.vx, nueva_posicion.vy = round(estimacion.vx, 1), round(estimacion.vy, 1)
+        
+        # Determinar zona con los polígonos del taller (o la del anchor más cercano si no hay)
+        cercano = min(((anchor1, anchor1_dist), (anchor2, anchor2_dist), (anchor3, anchor3_dist)),
+                      key=lambda par: par[1])[0]
+        nueva_posicion.zona_id = indice_zonas.zona_de(cercano.taller_id, nueva_posicion.x, nueva_posicion.y,
+                                                      cercano.zona_id)
+        cambios_geocercas = {}
+        geocercas.evaluar(tag_id, cercano.taller_id, nueva_posicion.zona_id,
+                          nueva_posicion.timestamp or datetime.utcnow(),
+                          current_app.config.get('GEOCERCAS_COALESCENCIA_S', 0), cambios_geocercas)
+        
+        db.session.add(nueva_posicion)
+        db.session.flush()
+        ultimas_posiciones.guardar([ultimas_posiciones.fila(nueva_posicion, cercano.taller_id)])
+        db.session.commit()
+        geocercas.confirmar(cambios_geocercas)
+        
+        publicable = dict(nueva_posicion.to_dict(), taller_id=cercano.taller_id)
+        ultimas_posiciones.actualizar([publicable])
+        difusion.publicar([publicable])
+        
+        return nueva_posicion
             
     except Exception as e:
         print(f"Error en triangulación: {str(e)}")
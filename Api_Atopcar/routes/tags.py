@@ -2,12 +2,20 @@ from flask import Blueprint, request, jsonify
 from extensions import db
 from models.tag import Tag
 from models.vehiculo import Vehiculo
+from services import bateria, cache_tags, desconexiones, filtro_kalman, geocercas, paginacion, reposo, ultimas_posiciones
 from datetime import datetime
 from flasgger import swag_from
 
 # Crear el blueprint para los tags
 tag_bp = Blueprint('tags', __name__, url_prefix='/api/tags')
 
+# Número máximo de tags en una actualización de batería en bloque
+MAX_TAGS_BATERIA = 1000
+
+
+def _es_id(valor):
+    return isinstance(valor, int) and not isinstance(valor, bool)
+
 # Obtener todos los tags
 @tag_bp.route('/', methods=['GET'])
 @swag_from({
@@ -35,15 +43,16 @@ tag_bp = Blueprint('tags', __name__, url_prefix='/api/tags')
             'type': 'boolean',
             'required': False,
             'description': 'Filtrar tags asignados o no asignados a vehículos (true/false)'
-        }
+        },
+        *paginacion.PARAMETROS
     ],
     'responses': {
         200: {
-            'description': 'Lista de tags',
-            'schema': {
-                'type': 'array',
-                'items': {'$ref': '#/definitions/Tag'}
-            }
+            'description': 'Página de tags ordenada por ID',
+            'schema': paginacion.esquema('Tag')
+        },
+        400: {
+            'description': 'Parámetros de paginación no válidos'
         }
     }
 })
@@ -62,19 +71,21 @@ def get_all_tags():
     
     if bateria_baja is not None:
         if bateria_baja.lower() == 'true':
-            query = query.filter(Tag.bateria < 20)  # Considerar baja a menos del 20%
-    
-    tags = query.all()
+            query = query.filter(Tag.bateria < bateria.umbral_baja())  # BATERIA_UMBRAL_BAJA
     
     if asignado is not None:
-        asignado_bool = asignado.lower() == 'true'
-        # Filtrar en memoria ya que necesitamos acceder a la relación
-        if asignado_bool:
-            tags = [tag for tag in tags if tag.vehiculo is not None]
+        # EXISTS sobre vehiculos.tag_id, para que el filtro no rompa la paginación
+        if asignado.lower() == 'true':
+            query = query.filter(Tag.vehiculo.has())
         else:
-            tags = [tag for tag in tags if tag.vehiculo is None]
+            query = query.filter(~Tag.vehiculo.has())
+    
+    try:
+        tags, next_cursor = paginacion.paginar(query, [Tag.id])
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     
-    return jsonify([tag.to_dict() for tag in tags])
+    return jsonify(paginacion.pagina([tag.to_dict() for tag in tags], next_cursor))
 
 # Obtener un tag específico
 @tag_bp.route('/<int:id>', methods=['GET'])
@@ -164,6 +175,8 @@ def create_tag():
     
     db.session.add(nuevo_tag)
     db.session.commit()
+    # Elimina una posible entrada negativa del código recién creado
+    cache_tags.invalidar(nuevo_tag.codigo)
     
     return jsonify(nuevo_tag.to_dict()), 201
 
@@ -224,6 +237,8 @@ def update_tag(id):
         if Tag.query.filter_by(mac=data['mac']).first():
             return jsonify({"error": f"Ya existe un tag con la MAC {data['mac']}"}), 400
     
+    codigo_anterior = tag.codigo
+    
     # Actualizar campos
     if 'codigo' in data:
         tag.codigo = data['codigo']
@@ -237,6 +252,7 @@ def update_tag(id):
         tag.observaciones = data['observaciones']
     
     db.session.commit()
+    cache_tags.invalidar(codigo_anterior, tag.codigo)
     
     return jsonify(tag.to_dict())
 
@@ -274,8 +290,16 @@ def delete_tag(id):
     if tag.vehiculo:
         return jsonify({"error": "No se puede eliminar un tag asignado a un vehículo. Desasigne primero el tag."}), 400
     
+    codigo = tag.codigo
+    ultimas_posiciones.borrar(id)
     db.session.delete(tag)
     db.session.commit()
+    ultimas_posiciones.olvidar(id)
+    cache_tags.invalidar(codigo)
+    filtro_kalman.olvidar(id)
+    reposo.olvidar(id)
+    geocercas.olvidar(id)
+    desconexiones.olvidar(id)
     
     return '', 204
 
@@ -331,6 +355,7 @@ def asignar_vehiculo(id, vehiculo_id):
     tag.estado = 'asignado'
     
     db.session.commit()
+    cache_tags.invalidar(tag.codigo)
     
     return jsonify(tag.to_dict())
 
@@ -374,6 +399,7 @@ def desasignar_vehiculo(id):
     tag.estado = 'libre'
     
     db.session.commit()
+    cache_tags.invalidar(tag.codigo)
     
     return jsonify(tag.to_dict())
 
@@ -424,9 +450,133 @@ def update_bateria(id):
     if 'bateria' not in data:
         return jsonify({"error": "No se ha especificado el nivel de batería"}), 400
     
-    tag.bateria = data['bateria']
-    tag.ultima_comunicacion = datetime.utcnow()
-    
-    db.session.commit()
+    nivel, error = bateria.validar_nivel(data['bateria'])
+    if error:
+        return jsonify({"error": error}), 400
+    
+    # Las alertas se evalúan antes de asignar el nivel: necesitan el nivel previo
+    try:
+        bateria.alertar({tag.id: nivel})
+        tag.bateria = nivel
+        tag.ultima_comunicacion = datetime.utcnow()
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        bateria.recargar()
+        raise
     
-    return jsonify(tag.to_dict())
\ No newline at end of file
+    return jsonify(tag.to_dict())
+
+# Actualizar el nivel de batería de varios tags
+@tag_bp.route('/bateria', methods=['PUT'])
+@swag_from({
+    'tags': ['tags'],
+    'summary': 'Actualizar la batería de varios tags',
+    'description': 'Actualiza en una sola transacción el nivel de batería y la última comunicación de varios tags '
+                   '(por ejemplo, los que informa una pasarela). Cada tag se identifica por id o por código. '
+                   'Genera alertas bateria_baja al cruzar el umbral.',
+    'parameters': [
+        {
+            'name': 'data',
+            'in': 'body',
+            'required': True,
+            'schema': {
+                'type': 'object',
+                'properties': {
+                    'tags': {
+                        'type': 'array',
+                        'items': {
+                            'type': 'object',
+                            'properties': {
+                                'id': {'type': 'integer', 'description': 'ID del tag'},
+                                'codigo': {'type': 'string', 'description': 'Código del tag (si no se indica id)'},
+                                'bateria': {'type': 'integer', 'description': 'Nivel de batería en porcentaje'}
+                            },
+                            'required': ['bateria']
+                        }
+                    }
+                },
+                'required': ['tags'],
+                'example': {'tags': [{'codigo': 'T0001', 'bateria': 85}, {'id': 2, 'bateria': 15}]}
+            }
+        }
+    ],
+    'responses': {
+        200: {
+            'description': 'Resultado de la actualización',
+            'schema': {
+                'type': 'object',
+                'properties': {
+                    'actualizados': {'type': 'integer'},
+                    'alertas': {'type': 'integer', 'description': 'Alertas bateria_baja generadas'},
+                    'errores': {
+                        'type': 'array',
+                        'items': {
+                            'type': 'object',
+                            'properties': {
+                                'indice': {'type': 'integer'},
+                                'error': {'type': 'string'}
+                            }
+                        }
+                    }
+                }
+            }
+        },
+        400: {
+            'description': f'Cuerpo inválido o más de {MAX_TAGS_BATERIA} tags'
+        }
+    }
+})
+def update_bateria_lote():
+    data = request.json
+    items = data.get('tags') if isinstance(data, dict) else None
+    if not isinstance(items, list) or not items:
+        return jsonify({"error": "Se requiere una lista 'tags' no vacía"}), 400
+    if len(items) > MAX_TAGS_BATERIA:
+        return jsonify({"error": f"No se pueden actualizar más de {MAX_TAGS_BATERIA} tags a la vez"}), 400
+    
+    # Los códigos se resuelven con la caché de tags; los ids se comprueban con una sola consulta
+    codigos = {item['codigo'] for item in items
+               if isinstance(item, dict) and 'id' not in item and isinstance(item.get('codigo'), str)}
+    por_codigo = cache_tags.resolver_varios(codigos) if codigos else {}
+    ids = {item['id'] for item in items if isinstance(item, dict) and _es_id(item.get('id'))}
+    existentes = {tag_id for tag_id, in db.session.query(Tag.id).filter(Tag.id.in_(ids))} if ids else set()
+    
+    niveles = {}
+    errores = []
+    for indice, item in enumerate(items):
+        if not isinstance(item, dict):
+            errores.append({'indice': indice, 'error': "Formato inválido"})
+            continue
+        nivel, error = bateria.validar_nivel(item.get('bateria'))
+        if error:
+            errores.append({'indice': indice, 'error': error})
+            continue
+        if 'id' in item:
+            # Un id que no es entero (lista, objeto...) no se puede buscar en existentes
+            if not _es_id(item['id']):
+                errores.append({'indice': indice, 'error': "El id del tag debe ser un número entero"})
+                continue
+            tag_id = item['id'] if item['id'] in existentes else None
+        else:
+            info = por_codigo.get(item.get('codigo'))
+            tag_id = info.id if info else None
+        if tag_id is None:
+            errores.append({'indice': indice, 'error': "El tag no existe"})
+            continue
+        niveles[tag_id] = nivel
+    
+    alertas = 0
+    if niveles:
+        try:
+            alertas = bateria.alertar(niveles)
+            Tag.query.filter(Tag.id.in_(niveles)).update(
+                {Tag.bateria: bateria.columna(niveles), Tag.ultima_comunicacion: datetime.utcnow()},
+                synchronize_session=False)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            bateria.recargar()
+            raise
+    
+    return jsonify({"actualizados": len(niveles), "alertas": alertas, "errores": errores})
\ No newline at end of file
@@ -1,6 +1,7 @@
 from flask import Blueprint, request, jsonify
 from extensions import db
 from models.usuario import Usuario
+from services import paginacion
 import bcrypt
 from flasgger import swag_from
 
@@ -27,15 +28,16 @@ usuario_bp = Blueprint('usuarios', __name__, url_prefix='/api/usuarios')
             'type': 'boolean',
             'required': False,
             'description': 'Filtrar usuarios activos o inactivos (true/false)'
-        }
+        },
+        *paginacion.PARAMETROS
     ],
     'responses': {
         200: {
-            'description': 'Lista de usuarios',
-            'schema': {
-                'type': 'array',
-                'items': {'$ref': '#/definitions/Usuario'}
-            }
+            'description': 'Página de usuarios ordenada por ID',
+            'schema': paginacion.esquema('Usuario')
+        },
+        400: {
+            'description': 'Parámetros de paginación no válidos'
         }
     }
 })
@@ -53,8 +55,12 @@ def get_all_usuarios():
         activo_bool = activo.lower() == 'true'
         query = query.filter_by(activo=activo_bool)
     
-    usuarios = query.all()
-    return jsonify([usuario.to_dict() for usuario in usuarios])
+    try:
+        usuarios, next_cursor = paginacion.paginar(query, [Usuario.id])
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    
+    return jsonify(paginacion.pagina([usuario.to_dict() for usuario in usuarios], next_cursor))
 
 # Obtener un usuario específico
 @usuario_bp.route('/<int:id>', methods=['GET'])
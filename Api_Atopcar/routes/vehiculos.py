@@ -2,11 +2,25 @@ from flask import Blueprint, request, jsonify
 from extensions import db
 from models.vehiculo import Vehiculo
 from models.tag import Tag
+from models.zona import Zona
+from services import geocercas, paginacion
 from flasgger import swag_from
 
 # Crear el blueprint para los vehículos
 vehiculo_bp = Blueprint('vehiculos', __name__, url_prefix='/api/vehiculos')
 
+def _validar_zonas_permitidas(zonas):
+    """Devuelve None si zonas es null o una lista de ids de zonas existentes, o un mensaje de error."""
+    if zonas is None:
+        return None
+    if not isinstance(zonas, list) or not all(isinstance(z, int) and not isinstance(z, bool) for z in zonas):
+        return "zonas_permitidas debe ser una lista de ids de zona"
+    existentes = {zona.id for zona in Zona.query.filter(Zona.id.in_(zonas))} if zonas else set()
+    faltantes = sorted(set(zonas) - existentes)
+    if faltantes:
+        return f"Las zonas {faltantes} no existen"
+    return None
+
 # Obtener todos los vehículos
 @vehiculo_bp.route('/', methods=['GET'])
 @swag_from({
@@ -27,15 +41,16 @@ vehiculo_bp = Blueprint('vehiculos', __name__, url_prefix='/api/vehiculos')
             'type': 'boolean',
             'required': False,
             'description': 'Filtrar vehículos con o sin tag asignado (true/false)'
-        }
+        },
+        *paginacion.PARAMETROS
     ],
     'responses': {
         200: {
-            'description': 'Lista de vehículos',
-            'schema': {
-                'type': 'array',
-                'items': {'$ref': '#/definitions/Vehiculo'}
-            }
+            'description': 'Página de vehículos ordenada por ID',
+            'schema': paginacion.esquema('Vehiculo')
+        },
+        400: {
+            'description': 'Parámetros de paginación no válidos'
         }
     }
 })
@@ -50,17 +65,19 @@ def get_all_vehiculos():
     if estado:
         query = query.filter_by(estado=estado)
     
-    vehiculos = query.all()
-    
     # Filtrar por vehículos con tag o sin tag
     if con_tag is not None:
-        con_tag_bool = con_tag.lower() == 'true'
-        if con_tag_bool:
-            vehiculos = [v for v in vehiculos if hasattr(v, 'tag') and v.tag]
+        if con_tag.lower() == 'true':
+            query = query.filter(Vehiculo.tag_id.isnot(None))
         else:
-            vehiculos = [v for v in vehiculos if not hasattr(v, 'tag') or not v.tag]
+            query = query.filter(Vehiculo.tag_id.is_(None))
     
-    return jsonify([vehiculo.to_dict() for vehiculo in vehiculos])
+    try:
+        vehiculos, next_cursor = paginacion.paginar(query, [Vehiculo.id])
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    
+    return jsonify(paginacion.pagina([vehiculo.to_dict() for vehiculo in vehiculos], next_cursor))
 
 # Obtener un vehículo específico
 @vehiculo_bp.route('/<int:id>', methods=['GET'])
@@ -108,7 +125,8 @@ def get_vehiculo(id):
                     'matricula': {'type': 'string', 'description': 'Matrícula o placa del vehículo'},
                     'bastidor': {'type': 'string', 'description': 'Número de bastidor o VIN único del vehículo'},
                     'referencia': {'type': 'string', 'description': 'Referencia interna o descripción del vehículo'},
-                    'estado': {'type': 'string', 'description': 'Estado del vehículo', 'enum': ['activo', 'pendiente', 'finalizado', 'entregado'], 'default': 'activo'}
+                    'estado': {'type': 'string', 'description': 'Estado del vehículo', 'enum': ['activo', 'pendiente', 'finalizado', 'entregado'], 'default': 'activo'},
+                    'zonas_permitidas': {'type': 'array', 'items': {'type': 'integer'}, 'description': 'IDs de las zonas en las que puede estar el vehículo (null = cualquiera)'}
                 },
                 'example': {
                     'matricula': '1234ABC',
@@ -140,11 +158,16 @@ def create_vehiculo():
     if data.get('bastidor') and Vehiculo.query.filter_by(bastidor=data['bastidor']).first():
         return jsonify({"error": f"Ya existe un vehículo con el bastidor {data['bastidor']}"}), 400
     
+    error = _validar_zonas_permitidas(data.get('zonas_permitidas'))
+    if error:
+        return jsonify({"error": error}), 400
+    
     nuevo_vehiculo = Vehiculo(
         matricula=data.get('matricula'),
         bastidor=data.get('bastidor'),
         referencia=data.get('referencia'),
-        estado=data.get('estado', 'activo')
+        estado=data.get('estado', 'activo'),
+        zonas_permitidas=data.get('zonas_permitidas')
     )
     
     db.session.add(nuevo_vehiculo)
@@ -176,7 +199,8 @@ def create_vehiculo():
                     'matricula': {'type': 'string', 'description': 'Matrícula o placa del vehículo'},
                     'bastidor': {'type': 'string', 'description': 'Número de bastidor o VIN único del vehículo'},
                     'referencia': {'type': 'string', 'description': 'Referencia interna o descripción del vehículo'},
-                    'estado': {'type': 'string', 'description': 'Estado del vehículo', 'enum': ['activo', 'pendiente', 'finalizado', 'entregado']}
+                    'estado': {'type': 'string', 'description': 'Estado del vehículo', 'enum': ['activo', 'pendiente', 'finalizado', 'entregado']},
+                    'zonas_permitidas': {'type': 'array', 'items': {'type': 'integer'}, 'description': 'IDs de las zonas en las que puede estar el vehículo (null = cualquiera)'}
                 }
             }
         }
@@ -212,9 +236,18 @@ def update_vehiculo(id):
         vehiculo.referencia = data['referencia']
     if 'estado' in data:
         vehiculo.estado = data['estado']
+    if 'zonas_permitidas' in data:
+        error = _validar_zonas_permitidas(data['zonas_permitidas'])
+        if error:
+            return jsonify({"error": error}), 400
+        vehiculo.zonas_permitidas = data['zonas_permitidas']
     
     db.session.commit()
     
+    # Con reglas nuevas la siguiente posición del tag se evalúa aunque no cambie de zona
+    if 'zonas_permitidas' in data and vehiculo.tag_id:
+        geocercas.olvidar(vehiculo.tag_id)
+    
     return jsonify(vehiculo.to_dict())
 
 # Eliminar un vehículo
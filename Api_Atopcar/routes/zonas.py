@@ -4,6 +4,7 @@ from models.zona import Zona
 from models.taller import Taller
 from models.anchor import Anchor
 from models.posicion import Posicion
+from services import indice_zonas, paginacion
 from flasgger import swag_from
 
 # Crear el blueprint para las zonas
@@ -29,15 +30,16 @@ zona_bp = Blueprint('zonas', __name__, url_prefix='/api/zonas')
             'type': 'string',
             'required': False,
             'description': 'Filtrar por tipo de zona'
-        }
+        },
+        *paginacion.PARAMETROS
     ],
     'responses': {
         200: {
-            'description': 'Lista de zonas',
-            'schema': {
-                'type': 'array',
-                'items': {'$ref': '#/definitions/Zona'}
-            }
+            'description': 'Página de zonas ordenada por ID',
+            'schema': paginacion.esquema('Zona')
+        },
+        400: {
+            'description': 'Parámetros de paginación no válidos'
         }
     }
 })
@@ -54,8 +56,12 @@ def get_all_zonas():
     if tipo:
         query = query.filter_by(tipo=tipo)
     
-    zonas = query.all()
-    return jsonify([zona.to_dict() for zona in zonas])
+    try:
+        zonas, next_cursor = paginacion.paginar(query, [Zona.id])
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    
+    return jsonify(paginacion.pagina([zona.to_dict() for zona in zonas], next_cursor))
 
 # Obtener una zona específica
 @zona_bp.route('/<int:id>', methods=['GET'])
@@ -103,7 +109,12 @@ def get_zona(id):
                     'nombre': {'type': 'string', 'description': 'Nombre descriptivo de la zona'},
                     'tipo': {'type': 'string', 'description': 'Clasificación de la zona (recepción, taller, pintura, etc.)'},
                     'color_hex': {'type': 'string', 'description': 'Código de color hexadecimal para representar la zona'},
-                    'taller_id': {'type': 'integer', 'description': 'ID del taller al que pertenece esta zona'}
+                    'taller_id': {'type': 'integer', 'description': 'ID del taller al que pertenece esta zona'},
+                    'poligono': {
+                        'type': 'array',
+                        'description': 'Vértices [x, y] del contorno de la zona en cm (al menos 3)',
+                        'items': {'type': 'array', 'items': {'type': 'number'}}
+                    }
                 },
                 'required': ['nombre']
             }
@@ -130,15 +141,22 @@ def create_zona():
     if data.get('taller_id') and not Taller.query.get(data['taller_id']):
         return jsonify({"error": "El taller especificado no existe"}), 400
     
+    # Verificar la geometría de la zona
+    error = indice_zonas.validar_poligono(data.get('poligono'))
+    if error:
+        return jsonify({"error": error}), 400
+    
     nueva_zona = Zona(
         nombre=data['nombre'],
         tipo=data.get('tipo'),
         color_hex=data.get('color_hex'),
-        taller_id=data.get('taller_id')
+        taller_id=data.get('taller_id'),
+        poligono=data.get('poligono')
     )
     
     db.session.add(nueva_zona)
     db.session.commit()
+    indice_zonas.invalidar(nueva_zona.taller_id)
     
     return jsonify(nueva_zona.to_dict()), 201
 
@@ -166,7 +184,12 @@ def create_zona():
                     'nombre': {'type': 'string', 'description': 'Nombre descriptivo de la zona'},
                     'tipo': {'type': 'string', 'description': 'Clasificación de la zona (recepción, taller, pintura, etc.)'},
                     'color_hex': {'type': 'string', 'description': 'Código de color hexadecimal para representar la zona'},
-                    'taller_id': {'type': 'integer', 'description': 'ID del taller al que pertenece esta zona'}
+                    'taller_id': {'type': 'integer', 'description': 'ID del taller al que pertenece esta zona'},
+                    'poligono': {
+                        'type': 'array',
+                        'description': 'Vértices [x, y] del contorno de la zona en cm (al menos 3)',
+                        'items': {'type': 'array', 'items': {'type': 'number'}}
+                    }
                 }
             }
         }
@@ -192,6 +215,14 @@ def update_zona(id):
     if 'taller_id' in data and data['taller_id'] and not Taller.query.get(data['taller_id']):
         return jsonify({"error": "El taller especificado no existe"}), 400
     
+    # Verificar la geometría si se cambia
+    if 'poligono' in data:
+        error = indice_zonas.validar_poligono(data['poligono'])
+        if error:
+            return jsonify({"error": error}), 400
+    
+    taller_anterior = zona.taller_id
+    
     # Actualizar campos
     if 'nombre' in data:
         zona.nombre = data['nombre']
@@ -201,8 +232,11 @@ def update_zona(id):
         zona.color_hex = data['color_hex']
     if 'taller_id' in data:
         zona.taller_id = data['taller_id']
+    if 'poligono' in data:
+        zona.poligono = data['poligono']
     
     db.session.commit()
+    indice_zonas.invalidar(taller_anterior, zona.taller_id)
     
     return jsonify(zona.to_dict())
 
@@ -246,8 +280,10 @@ def delete_zona(id):
     if posiciones_count > 0:
         return jsonify({"error": f"No se puede eliminar la zona porque tiene {posiciones_count} posiciones registradas"}), 400
     
+    taller_id = zona.taller_id
     db.session.delete(zona)
     db.session.commit()
+    indice_zonas.invalidar(taller_id)
     
     return '', 204
 
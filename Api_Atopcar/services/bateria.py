@@ -0,0 +1,85 @@
+from extensions import db
+from models.alerta import Alerta
+from models.tag import Tag
+from models.vehiculo import Vehiculo
+from flask import current_app
+from sqlalchemy import case
+import threading
+
+# Nivel de batería de los tags y alertas "bateria_baja" con histéresis.
+#
+# Los niveles llegan en los reportes de ranging (campo opcional "bateria") o en bloque por
+# PUT /api/tags/bateria, y se escriben con un único UPDATE ... CASE por lote. La alerta se
+# genera solo al cruzar BATERIA_UMBRAL_BAJA hacia abajo; el tag no vuelve a considerarse
+# cargado hasta superar BATERIA_UMBRAL_RECUPERADA, así que un nivel que oscila alrededor del
+# umbral no repite la alerta. Al recuperarse, sus alertas abiertas se marcan como leídas.
+#
+# El conjunto de tags con batería baja se carga de la base de datos al primer uso, antes de
+# escribir los niveles nuevos.
+
+_lock = threading.Lock()
+_bajas = None
+
+
+def validar_nivel(valor):
+    """Devuelve (nivel entero 0-100, None) o (None, mensaje de error)."""
+    if isinstance(valor, bool) or not isinstance(valor, (int, float)) or not 0 <= valor <= 100:
+        return None, "El nivel de batería debe ser un número entre 0 y 100"
+    return int(round(valor)), None
+
+
+def umbral_baja():
+    return current_app.config.get('BATERIA_UMBRAL_BAJA', 20)
+
+
+def columna(niveles):
+    """Expresión para Tag.bateria que asigna a cada tag de niveles {tag_id: nivel} su nuevo valor."""
+    return case(niveles, value=Tag.id, else_=Tag.bateria)
+
+
+def alertar(niveles):
+    """
+    Evalúa los niveles {tag_id: nivel} con histéresis y añade a la sesión las alertas nuevas
+    (y marca como leídas las de los tags recuperados). No hace commit.
+
+    Debe llamarse antes de escribir los niveles nuevos en la transacción: si el conjunto de
+    tags con batería baja aún no está en memoria se carga de la tabla tags, y un tag que ya
+    tuviera escrito el nivel nuevo parecería bajo antes de cruzar el umbral.
+    """
+    global _bajas
+    baja = umbral_baja()
+    recuperada = current_app.config.get('BATERIA_UMBRAL_RECUPERADA', baja + 5)
+
+    with _lock:
+        if _bajas is None:
+            # Sin autoflush: un nivel pendiente en la sesión no debe contar como previo
+            with db.session.no_autoflush:
+                _bajas = {tag_id for tag_id, in db.session.query(Tag.id).filter(Tag.bateria < baja)}
+
+        nuevas, recuperados = {}, []
+        for tag_id, nivel in niveles.items():
+            if tag_id not in _bajas and nivel < baja:
+                _bajas.add(tag_id)
+                nuevas[tag_id] = nivel
+            elif tag_id in _bajas and nivel >= recuperada:
+                _bajas.discard(tag_id)
+                recuperados.append(tag_id)
+
+    if nuevas:
+        vehiculos = {v.tag_id: v.id for v in Vehiculo.query.filter(Vehiculo.tag_id.in_(nuevas))}
+        for tag_id, nivel in nuevas.items():
+            db.session.add(Alerta(tag_id=tag_id, vehiculo_id=vehiculos.get(tag_id), tipo='bateria_baja',
+                                  descripcion=f"La batería del tag {tag_id} ha bajado al {nivel}%"))
+
+    if recuperados:
+        Alerta.query.filter(Alerta.tag_id.in_(recuperados), Alerta.tipo == 'bateria_baja',
+                            Alerta.leido.is_(False)).update({Alerta.leido: True}, synchronize_session=False)
+
+    return len(nuevas)
+
+
+def recargar():
+    """Descarta el estado en memoria (tras un rollback); se vuelve a cargar en el siguiente uso."""
+    global _bajas
+    with _lock:
+        _bajas = None
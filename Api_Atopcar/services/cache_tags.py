@@ -0,0 +1,92 @@
+from collections import OrderedDict, namedtuple
+from models.tag import Tag
+import threading
+import time
+
+# Caché LRU acotada de código de tag -> (id, estado) para la ingesta de distancias.
+# También guarda entradas negativas para códigos desconocidos, de modo que un dispositivo
+# mal configurado no provoque una consulta a la base de datos en cada reporte.
+# Los endpoints de routes/tags.py la invalidan al crear, modificar o eliminar tags.
+
+TagInfo = namedtuple('TagInfo', ['id', 'codigo', 'estado'])
+
+# Número máximo de códigos guardados
+MAX_ENTRADAS = 4096
+
+# Segundos que se recuerda un tag existente (acota la incoherencia entre workers)
+TTL_SEGUNDOS = 300
+
+# Segundos que se recuerda que un código no existe
+TTL_NEGATIVO_SEGUNDOS = 30
+
+_lock = threading.Lock()
+_entradas = OrderedDict()  # codigo -> (TagInfo o None, caduca_en)
+
+
+def _leer(codigo):
+    """Devuelve (encontrado, TagInfo o None) sin consultar la base de datos."""
+    with _lock:
+        entrada = _entradas.get(codigo)
+        if entrada is None:
+            return False, None
+        info, caduca_en = entrada
+        if time.monotonic() > caduca_en:
+            del _entradas[codigo]
+            return False, None
+        _entradas.move_to_end(codigo)
+        return True, info
+
+
+def _guardar(codigo, info):
+    caduca_en = time.monotonic() + (TTL_SEGUNDOS if info is not None else TTL_NEGATIVO_SEGUNDOS)
+    with _lock:
+        _entradas[codigo] = (info, caduca_en)
+        _entradas.move_to_end(codigo)
+        while len(_entradas) > MAX_ENTRADAS:
+            _entradas.popitem(last=False)
+
+
+def resolver(codigo):
+    """Devuelve el TagInfo del código o None si el tag no existe."""
+    encontrado, info = _leer(codigo)
+    if encontrado:
+        return info
+
+    tag = Tag.query.filter_by(codigo=codigo).first()
+    info = TagInfo(tag.id, tag.codigo, tag.estado) if tag else None
+    _guardar(codigo, info)
+    return info
+
+
+def resolver_varios(codigos):
+    """Resuelve varios códigos con una sola consulta para los que no están en caché."""
+    resultado = {}
+    pendientes = []
+    for codigo in codigos:
+        encontrado, info = _leer(codigo)
+        if encontrado:
+            resultado[codigo] = info
+        else:
+            pendientes.append(codigo)
+
+    if pendientes:
+        encontrados = {tag.codigo: TagInfo(tag.id, tag.codigo, tag.estado)
+                       for tag in Tag.query.filter(Tag.codigo.in_(pendientes))}
+        for codigo in pendientes:
+            info = encontrados.get(codigo)
+            _guardar(codigo, info)
+            resultado[codigo] = info
+
+    return resultado
+
+
+def invalidar(*codigos):
+    """Elimina de la caché los códigos indicados (incluidas las entradas negativas)."""
+    with _lock:
+        for codigo in codigos:
+            _entradas.pop(codigo, None)
+
+
+def limpiar():
+    with _lock:
+        _entradas.clear()
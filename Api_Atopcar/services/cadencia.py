@@ -0,0 +1,48 @@
+from flask import current_app
+from services import cache_tags, cola_ingesta, filtro_kalman, reposo
+from datetime import datetime
+import math
+
+# Cadencia adaptativa de los reportes de los tags.
+#
+# La respuesta de la ingesta incluye next_report_ms, el tiempo que el tag debería esperar
+# antes del siguiente reporte. Un tag en movimiento reporta a la cadencia mínima; uno parado
+# va espaciando los reportes cuanto más tiempo lleva quieto, hasta la cadencia máxima. Con el
+# servidor cargado (cola de escritura diferida llenándose) todos los intervalos se alargan.
+
+# Velocidad estimada (cm/s) a partir de la que un tag se considera en movimiento
+VELOCIDAD_MOVIMIENTO_CM_S = 10.0
+
+# Milisegundos de espera añadidos por cada segundo que el tag lleva parado
+ESPERA_POR_SEGUNDO_PARADO_MS = 250
+
+# Con la cola de ingesta llena el intervalo se multiplica por (1 + FACTOR_CARGA)
+FACTOR_CARGA = 4.0
+
+
+def _carga():
+    """Ocupación de la cola de escritura diferida, de 0 a 1 (0 si no está activa)."""
+    estado = cola_ingesta.estadisticas()
+    return estado['profundidad'] / estado['capacidad'] if estado['capacidad'] else 0.0
+
+
+def siguiente_reporte_ms(codigo):
+    """Calcula el intervalo recomendado (ms) hasta el siguiente reporte del tag con ese código."""
+    minimo = current_app.config.get('CADENCIA_MIN_MS', 2000)
+    maximo = current_app.config.get('CADENCIA_MAX_MS', 30000)
+
+    tag = cache_tags.resolver(codigo) if isinstance(codigo, str) else None
+    if tag is None:
+        # Tag desconocido: que no insista
+        return maximo
+
+    intervalo = minimo
+    estimacion = filtro_kalman.estimacion(tag.id)
+    en_movimiento = estimacion is not None and math.hypot(estimacion.vx, estimacion.vy) >= VELOCIDAD_MOVIMIENTO_CM_S
+    desde = reposo.en_reposo_desde(tag.id)
+    if not en_movimiento and desde is not None:
+        parado_s = max((datetime.utcnow() - desde).total_seconds(), 0.0)
+        intervalo += parado_s * ESPERA_POR_SEGUNDO_PARADO_MS
+
+    intervalo *= 1 + FACTOR_CARGA * _carga()
+    return int(min(intervalo, maximo))
@@ -0,0 +1,134 @@
+from services.ingesta import procesar_lote
+from datetime import datetime
+import atexit
+import queue
+import threading
+import time
+import traceback
+
+# Modo write-behind de la ingesta (opcional, INGESTA_WRITE_BEHIND en la configuración).
+# El endpoint valida el reporte contra las cachés en memoria, lo encola y responde sin esperar
+# a la base de datos. Un hilo en segundo plano vacía la cola en lotes acotados por tamaño
+# (INGESTA_LOTE_MAX) o por tiempo (INGESTA_INTERVALO_MS) y los escribe con procesar_lote,
+# es decir, con inserciones masivas y un único commit por lote.
+
+_cola = None
+_hilo = None
+_parar = threading.Event()
+
+_lock = threading.Lock()
+_contadores = {
+    'encolados': 0,
+    'escritos': 0,
+    'rechazados': 0,    # reportes que al escribirse devolvieron error (tag/anchor borrado, etc.)
+    'descartados': 0,   # reportes perdidos por cola llena o por fallo al escribir el lote
+    'lotes': 0,
+    'flush_total_ms': 0.0,
+    'flush_max_ms': 0.0,
+    'flush_ultimo_ms': None
+}
+
+
+def activa():
+    return _cola is not None
+
+
+def iniciar(app):
+    """Crea la cola y arranca el hilo de escritura con la configuración de la aplicación."""
+    global _cola, _hilo
+    if _cola is not None:
+        return
+
+    _cola = queue.Queue(maxsize=app.config.get('INGESTA_COLA_MAX', 10000))
+    lote_max = app.config.get('INGESTA_LOTE_MAX', 200)
+    intervalo = app.config.get('INGESTA_INTERVALO_MS', 500) / 1000.0
+
+    _hilo = threading.Thread(target=_bucle, args=(app, lote_max, intervalo),
+                             name='cola-ingesta', daemon=True)
+    _hilo.start()
+    atexit.register(detener)
+
+
+def detener(timeout=5.0):
+    """Pide al hilo que vacíe lo pendiente y termine."""
+    _parar.set()
+    if _hilo is not None:
+        _hilo.join(timeout)
+
+
+def encolar(reporte, recibido=None):
+    """
+    Encola un reporte ya validado. Devuelve False si la cola está llena y se descarta.
+    recibido: hora de recepción del reporte (por defecto, ahora).
+    """
+    try:
+        _cola.put_nowait((reporte, recibido or datetime.utcnow()))
+    except queue.Full:
+        with _lock:
+            _contadores['descartados'] += 1
+        return False
+
+    with _lock:
+        _contadores['encolados'] += 1
+    return True
+
+
+def estadisticas():
+    with _lock:
+        datos = dict(_contadores)
+    flush_total_ms = datos.pop('flush_total_ms')
+    datos['flush_medio_ms'] = round(flush_total_ms / datos['lotes'], 2) if datos['lotes'] else None
+    datos['activa'] = activa()
+    datos['profundidad'] = _cola.qsize() if _cola is not None else 0
+    datos['capacidad'] = _cola.maxsize if _cola is not None else 0
+    return datos
+
+
+def _tomar_lote(lote_max, intervalo):
+    """Espera al primer elemento y acumula más hasta llenar el lote o agotar el intervalo."""
+    try:
+        lote = [_cola.get(timeout=0.5)]
+    except queue.Empty:
+        return []
+
+    limite = time.monotonic() + intervalo
+    while len(lote) < lote_max:
+        restante = limite - time.monotonic()
+        if restante <= 0:
+            break
+        try:
+            lote.append(_cola.get(timeout=restante))
+        except queue.Empty:
+            break
+    return lote
+
+
+def _escribir(app, lote):
+    inicio = time.perf_counter()
+    try:
+        with app.app_context():
+            resultados = procesar_lote([reporte for reporte, _ in lote],
+                                       recibidos=[recibido for _, recibido in lote])
+        rechazados = sum(1 for resultado in resultados if 'error' in resultado)
+        escritos, descartados = len(lote) - rechazados, 0
+    except Exception:
+        traceback.print_exc()
+        rechazados, escritos, descartados = 0, 0, len(lote)
+
+    duracion = (time.perf_counter() - inicio) * 1000
+    with _lock:
+        _contadores['escritos'] += escritos
+        _contadores['rechazados'] += rechazados
+        _contadores['descartados'] += descartados
+        _contadores['lotes'] += 1
+        _contadores['flush_total_ms'] += duracion
+        _contadores['flush_max_ms'] = max(_contadores['flush_max_ms'], round(duracion, 2))
+        _contadores['flush_ultimo_ms'] = round(duracion, 2)
+
+
+def _bucle(app, lote_max, intervalo):
+    # Al detenerse se sigue vaciando la cola antes de salir
+    while not (_parar.is_set() and _cola.empty()):
+        lote = _tomar_lote(lote_max, intervalo)
+        if lote:
+            _escribir(app, lote)
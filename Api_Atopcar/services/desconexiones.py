@@ -0,0 +1,173 @@
+from extensions import db
+from models.alerta import Alerta
+from models.tag import Tag
+from models.vehiculo import Vehiculo
+from datetime import datetime, timedelta
+import atexit
+import heapq
+import threading
+import traceback
+
+# Detector de tags desconectados (opcional, DESCONEXION_DETECTOR en la configuración).
+#
+# Cada tag tiene un plazo: la hora de su última comunicación más DESCONEXION_TIMEOUT_S. Los
+# plazos se guardan en un montículo (heap) ordenado por vencimiento, así que registrar un
+# reporte es O(log n) y el hilo del detector solo mira la cima: duerme hasta el plazo más
+# próximo y no recorre nunca la tabla de tags. Las entradas antiguas de un tag que ha vuelto
+# a reportar no se borran del montículo; se descartan al salir porque ya no coinciden con
+# su plazo vigente.
+#
+# Al vencer un plazo se comprueba ultima_comunicacion en la base de datos (otro proceso, por
+# ejemplo el servidor UDP, puede haber recibido el reporte) y solo entonces se crea la alerta
+# "desconexion". Cuando el tag vuelve a reportar, la ingesta marca sus alertas como leídas.
+
+# Espera máxima del hilo entre comprobaciones (s), por si cambia la hora del sistema
+MAX_ESPERA_S = 60.0
+
+_lock = threading.Lock()
+_monticulo = []         # (plazo, tag_id)
+_plazos = {}            # tag_id -> plazo vigente
+_desconectados = set()  # tags con una alerta de desconexión abierta
+_timeout = None
+_hilo = None
+_parar = threading.Event()
+_despertar = threading.Event()
+
+
+def activo():
+    return _hilo is not None
+
+
+def _programar(tag_id, plazo):
+    # Llamar con _lock adquirido
+    _plazos[tag_id] = plazo
+    heapq.heappush(_monticulo, (plazo, tag_id))
+    if _monticulo[0] == (plazo, tag_id):
+        _despertar.set()
+
+    # Si las entradas caducadas dominan el montículo se reconstruye con las vigentes
+    if len(_monticulo) > 4 * len(_plazos) + 64:
+        _monticulo[:] = [(p, t) for t, p in _plazos.items()]
+        heapq.heapify(_monticulo)
+
+
+def desconectados(tag_ids):
+    """Devuelve los tags de la lista que tienen una alerta de desconexión abierta."""
+    with _lock:
+        return _desconectados.intersection(tag_ids)
+
+
+def vistos(tag_ids, instante):
+    """Registra una comunicación de los tags en el instante dado y renueva sus plazos."""
+    if _timeout is None:
+        return
+    plazo = instante + _timeout
+    with _lock:
+        for tag_id in tag_ids:
+            _desconectados.discard(tag_id)
+            if _plazos.get(tag_id) != plazo:
+                _programar(tag_id, plazo)
+
+
+def olvidar(tag_id):
+    """Deja de vigilar un tag (por ejemplo, al borrarlo)."""
+    with _lock:
+        _plazos.pop(tag_id, None)
+        _desconectados.discard(tag_id)
+
+
+def _extraer_vencidos(ahora):
+    """Saca del montículo los tags cuyo plazo vigente ha vencido. Devuelve (vencidos, espera_s)."""
+    vencidos = []
+    with _lock:
+        while _monticulo and _monticulo[0][0] <= ahora:
+            plazo, tag_id = heapq.heappop(_monticulo)
+            if _plazos.get(tag_id) == plazo:
+                del _plazos[tag_id]
+                vencidos.append(tag_id)
+        espera = (_monticulo[0][0] - ahora).total_seconds() if _monticulo else MAX_ESPERA_S
+    return vencidos, min(espera, MAX_ESPERA_S)
+
+
+def _alertar(vencidos, ahora):
+    tags = {tag.id: tag for tag in Tag.query.filter(Tag.id.in_(vencidos))}
+    abiertas = {tag_id for tag_id, in db.session.query(Alerta.tag_id).filter(
+        Alerta.tag_id.in_(vencidos), Alerta.tipo == 'desconexion', Alerta.leido.is_(False))}
+    vehiculos = {v.tag_id: v.id for v in Vehiculo.query.filter(Vehiculo.tag_id.in_(vencidos))}
+
+    confirmados = []
+    with _lock:
+        for tag_id in vencidos:
+            tag = tags.get(tag_id)
+            if tag is None or tag_id in _plazos:
+                # Tag borrado o que ha reportado mientras se consultaba
+                continue
+            if tag.ultima_comunicacion is not None and tag.ultima_comunicacion + _timeout > ahora:
+                # Ha reportado a otro proceso: se reprograma con su última comunicación
+                _programar(tag_id, tag.ultima_comunicacion + _timeout)
+                continue
+            _desconectados.add(tag_id)
+            if tag_id not in abiertas:
+                confirmados.append(tag)
+
+    for tag in confirmados:
+        ultima = tag.ultima_comunicacion.strftime('%Y-%m-%d %H:%M:%S') if tag.ultima_comunicacion else 'nunca'
+        db.session.add(Alerta(tag_id=tag.id, vehiculo_id=vehiculos.get(tag.id), tipo='desconexion',
+                              descripcion=f"El tag {tag.codigo} no comunica desde {ultima}"))
+    db.session.commit()
+    if confirmados:
+        print(f"Desconexión detectada en {len(confirmados)} tags")
+
+
+def _cargar():
+    """Programa los tags que ya han comunicado alguna vez (una sola consulta al arrancar)."""
+    abiertas = {tag_id for tag_id, in db.session.query(Alerta.tag_id).filter(
+        Alerta.tipo == 'desconexion', Alerta.leido.is_(False), Alerta.tag_id.isnot(None))}
+    with _lock:
+        _desconectados.update(abiertas)
+        for tag_id, ultima in db.session.query(Tag.id, Tag.ultima_comunicacion).filter(
+                Tag.ultima_comunicacion.isnot(None)):
+            if tag_id not in _desconectados:
+                _programar(tag_id, ultima + _timeout)
+
+
+def _bucle(app):
+    while not _parar.is_set():
+        # Se rearma antes de mirar la cima para no perder un aviso de _programar
+        _despertar.clear()
+        vencidos, espera = _extraer_vencidos(datetime.utcnow())
+        if vencidos:
+            try:
+                with app.app_context():
+                    _alertar(vencidos, datetime.utcnow())
+            except Exception:
+                traceback.print_exc()
+                # Se reintenta en la siguiente vuelta
+                with _lock:
+                    for tag_id in vencidos:
+                        if tag_id not in _plazos:
+                            _programar(tag_id, datetime.utcnow() + timedelta(seconds=MAX_ESPERA_S))
+            continue
+
+        _despertar.wait(max(espera, 0.0))
+
+
+def iniciar(app):
+    """Carga los plazos de los tags y arranca el hilo del detector (requiere contexto de aplicación)."""
+    global _timeout, _hilo
+    if _hilo is not None:
+        return
+
+    _timeout = timedelta(seconds=app.config.get('DESCONEXION_TIMEOUT_S', 120))
+    _cargar()
+
+    _hilo = threading.Thread(target=_bucle, args=(app,), name='detector-desconexiones', daemon=True)
+    _hilo.start()
+    atexit.register(detener)
+
+
+def detener(timeout=5.0):
+    _parar.set()
+    _despertar.set()
+    if _hilo is not None:
+        _hilo.join(timeout)
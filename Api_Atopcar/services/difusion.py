@@ -0,0 +1,133 @@
+from collections import deque
+import threading
+import traceback
+
+# Publicación en memoria de las posiciones nuevas para los clientes en directo (SSE).
+#
+# La ingesta publica cada posición guardada justo después del commit. Los suscriptores se
+# agrupan por filtro (taller, zona, lista de tags): todos los que usan el mismo filtro
+# comparten un Canal, así que cada posición se compara una sola vez por filtro y no por
+# cliente. El canal guarda las últimas posiciones en un buffer circular numerado y cada
+# cliente lee desde el último número que ha visto; un cliente lento pierde las posiciones
+# más antiguas en lugar de acumular memoria.
+#
+# Además de los canales, se pueden registrar oyentes (funciones) que reciben cada lote de
+# posiciones publicado; el servidor WebSocket (ws_server.py) los usa para pasar las
+# posiciones a su bucle asyncio.
+#
+# Todo esto es en memoria y por proceso. Las posiciones que ingiere otro proceso llegan a
+# través de services/sondeo_posiciones.py, que también llama a publicar; por eso publicar
+# descarta una posición que ya se publicó (mismo id para el mismo tag).
+
+# Posiciones que guarda cada canal para los clientes que se retrasan
+TAMANO_BUFFER = 256
+
+
+class Canal:
+    def __init__(self, filtro):
+        self.filtro = filtro
+        self.eventos = deque(maxlen=TAMANO_BUFFER)  # (secuencia, posición)
+        self.secuencia = 0
+        self.suscriptores = 0
+        self.condicion = threading.Condition()
+
+    def admite(self, posicion):
+        taller_id, zona_id, tags = self.filtro
+        return ((taller_id is None or posicion.get('taller_id') == taller_id) and
+                (zona_id is None or posicion.get('zona_id') == zona_id) and
+                (tags is None or posicion.get('tag_id') in tags))
+
+    def agregar(self, posiciones):
+        with self.condicion:
+            for posicion in posiciones:
+                self.secuencia += 1
+                self.eventos.append((self.secuencia, posicion))
+            self.condicion.notify_all()
+
+    def esperar(self, ultima, timeout):
+        """
+        Devuelve (posiciones, última secuencia) con las publicadas después de 'ultima',
+        esperando hasta timeout segundos si no hay ninguna.
+        """
+        with self.condicion:
+            if self.secuencia <= ultima:
+                self.condicion.wait(timeout)
+            nuevas = [posicion for secuencia, posicion in self.eventos if secuencia > ultima]
+            return nuevas, self.secuencia
+
+
+_lock = threading.Lock()
+_canales = {}
+_oyentes = []
+_publicadas = {}    # tag_id -> id de la última posición publicada
+
+
+def filtro(taller_id=None, zona_id=None, tags=None):
+    """Clave de filtro normalizada; None en un campo significa 'cualquiera'."""
+    return taller_id, zona_id, frozenset(tags) if tags else None
+
+
+def suscribir(clave):
+    """Devuelve el Canal compartido de ese filtro, creándolo si es el primer suscriptor."""
+    with _lock:
+        canal = _canales.get(clave)
+        if canal is None:
+            canal = _canales[clave] = Canal(clave)
+        canal.suscriptores += 1
+        return canal
+
+
+def cancelar(canal):
+    with _lock:
+        canal.suscriptores -= 1
+        if canal.suscriptores <= 0 and _canales.get(canal.filtro) is canal:
+            del _canales[canal.filtro]
+
+
+def escuchar(oyente):
+    """Registra una función que se llamará con cada lista de posiciones publicada."""
+    with _lock:
+        _oyentes.append(oyente)
+
+
+def dejar_de_escuchar(oyente):
+    with _lock:
+        if oyente in _oyentes:
+            _oyentes.remove(oyente)
+
+
+def hay_suscriptores():
+    """Indica si algún cliente en directo (canal SSE u oyente) recibiría lo que se publique."""
+    return bool(_canales or _oyentes)
+
+
+def publicar(posiciones):
+    """Entrega las posiciones (diccionarios con tag_id, zona_id y taller_id) a los canales que las admiten."""
+    if not posiciones or not hay_suscriptores():
+        return
+    with _lock:
+        nuevas = []
+        for posicion in posiciones:
+            if _publicadas.get(posicion['tag_id']) != posicion['id']:
+                _publicadas[posicion['tag_id']] = posicion['id']
+                nuevas.append(posicion)
+        canales = list(_canales.values())
+        oyentes = list(_oyentes)
+    posiciones = nuevas
+    if not posiciones:
+        return
+    for oyente in oyentes:
+        try:
+            oyente(posiciones)
+        except Exception:
+            # La ingesta ya ha hecho commit: un oyente que falla no debe afectarla
+            traceback.print_exc()
+    for canal in canales:
+        admitidas = [posicion for posicion in posiciones if canal.admite(posicion)]
+        if admitidas:
+            canal.agregar(admitidas)
+
+
+def estadisticas():
+    with _lock:
+        return {'canales': len(_canales), 'suscriptores': sum(c.suscriptores for c in _canales.values())}
@@ -0,0 +1,75 @@
+from extensions import db
+from models.posicion import Posicion
+from models.zona import Zona
+from sqlalchemy import select
+import csv
+import io
+import json
+
+# Exportación del histórico de posiciones en NDJSON o CSV.
+#
+# La consulta se recorre con un cursor del lado del servidor (yield_per) y cada lote de filas se
+# convierte en un único trozo de la respuesta, así que la memoria usada depende del tamaño del
+# lote y no del número de filas exportadas. Se seleccionan columnas sueltas en lugar de objetos
+# Posicion para no llenar la sesión.
+
+FORMATOS = {
+    'ndjson': ('application/x-ndjson', 'posiciones.ndjson'),
+    'csv': ('text/csv', 'posiciones.csv'),
+}
+
+# Mismas claves y orden que Posicion.to_dict
+COLUMNAS = [Posicion.id, Posicion.tag_id, Posicion.x, Posicion.y, Posicion.zona_id,
+            Posicion.residuo, Posicion.vx, Posicion.vy, Posicion.timestamp]
+
+
+def consulta(tag_id=None, zona_id=None, desde=None, hasta=None, taller_id=None):
+    """SELECT de las posiciones filtradas en orden cronológico (por (timestamp, id))."""
+    sentencia = select(*COLUMNAS)
+    if tag_id:
+        sentencia = sentencia.where(Posicion.tag_id == tag_id)
+    if zona_id:
+        sentencia = sentencia.where(Posicion.zona_id == zona_id)
+    if taller_id:
+        # Las posiciones no guardan el taller: se filtra por sus zonas (índice (zona_id, timestamp))
+        sentencia = sentencia.where(Posicion.zona_id.in_(select(Zona.id).where(Zona.taller_id == taller_id)))
+    if desde is not None:
+        sentencia = sentencia.where(Posicion.timestamp >= desde)
+    if hasta is not None:
+        sentencia = sentencia.where(Posicion.timestamp < hasta)
+    return sentencia.order_by(Posicion.timestamp, Posicion.id)
+
+
+def _fila(fila):
+    datos = dict(fila._mapping)
+    if datos['timestamp'] is not None:
+        datos['timestamp'] = datos['timestamp'].isoformat()
+    return datos
+
+
+def _ndjson(filas):
+    return ''.join(json.dumps(_fila(fila)) + '\n' for fila in filas)
+
+
+def _csv(filas):
+    salida = io.StringIO()
+    escritor = csv.writer(salida)
+    for fila in filas:
+        escritor.writerow(_fila(fila).values())
+    return salida.getvalue()
+
+
+def trozos(sentencia, formato, lote):
+    """Generador con el cuerpo de la respuesta: un trozo de texto por lote de filas."""
+    resultado = db.session.execute(sentencia.execution_options(yield_per=lote))
+    try:
+        if formato == 'csv':
+            salida = io.StringIO()
+            csv.writer(salida).writerow(columna.key for columna in COLUMNAS)
+            yield salida.getvalue()
+        serializar = _csv if formato == 'csv' else _ndjson
+        for filas in resultado.partitions():
+            yield serializar(filas)
+    finally:
+        # Libera el cursor del servidor también si el cliente corta la descarga
+        resultado.close()
@@ -0,0 +1,94 @@
+from collections import namedtuple
+import threading
+
+# Filtro de Kalman de velocidad constante por tag, con el estado en memoria.
+#
+# Cada eje se modela como [posición, velocidad] con aceleración aleatoria (ruido blanco).
+# Como los dos ejes comparten el ruido de proceso y el de medida, también comparten la
+# covarianza 2x2, así que el estado de un tag son 8 números: instante, x, vx, y, vy y los
+# tres términos de la covarianza. Cada actualización es O(1) y solo usa aritmética escalar.
+#
+# El ruido de medida de cada posición es su residuo de trilateración (con un mínimo), de modo
+# que las posiciones mal condicionadas corrigen menos la estimación.
+
+EstadoTag = namedtuple('EstadoTag', ['instante', 'x', 'vx', 'y', 'vy', 'p00', 'p01', 'p11'])
+Estimacion = namedtuple('Estimacion', ['x', 'y', 'vx', 'vy'])
+
+# Desviación típica mínima de una posición trilaterada (cm)
+RUIDO_MEDIDA_MIN_CM = 10.0
+
+# Desviación típica de la aceleración de un vehículo en el taller (cm/s²)
+ACELERACION_CM_S2 = 10.0
+
+# Incertidumbre inicial de la velocidad al empezar a seguir un tag (cm/s)
+VELOCIDAD_INICIAL_CM_S = 100.0
+
+# Si un tag pasa más tiempo que este sin reportar (s), se reinicia su estado
+MAX_INTERVALO_S = 120.0
+
+_lock = threading.Lock()
+_estados = {}
+
+
+def _iniciar(instante, x, y, r):
+    return EstadoTag(instante, x, 0.0, y, 0.0, r, 0.0, VELOCIDAD_INICIAL_CM_S ** 2)
+
+
+def actualizar(tag_id, x, y, instante, residuo=None):
+    """
+    Incorpora una posición medida (cm) del tag en el instante dado (datetime) y devuelve la
+    Estimacion filtrada de posición (cm) y velocidad (cm/s).
+    """
+    r = max(residuo or 0.0, RUIDO_MEDIDA_MIN_CM) ** 2
+
+    with _lock:
+        estado = _estados.get(tag_id)
+        dt = (instante - estado.instante).total_seconds() if estado else None
+
+        if estado is None or dt > MAX_INTERVALO_S:
+            estado = _iniciar(instante, x, y, r)
+        else:
+            # Los reportes desordenados (dt < 0) se tratan como simultáneos al último
+            dt = max(dt, 0.0)
+            q = ACELERACION_CM_S2 ** 2
+
+            # Predicción con velocidad constante
+            px = estado.x + estado.vx * dt
+            py = estado.y + estado.vy * dt
+            p00 = estado.p00 + 2 * dt * estado.p01 + dt * dt * estado.p11 + q * dt ** 4 / 4
+            p01 = estado.p01 + dt * estado.p11 + q * dt ** 3 / 2
+            p11 = estado.p11 + q * dt * dt
+
+            # Corrección con la posición medida
+            s = p00 + r
+            k0, k1 = p00 / s, p01 / s
+            innovacion_x, innovacion_y = x - px, y - py
+            estado = EstadoTag(
+                max(instante, estado.instante),
+                px + k0 * innovacion_x, estado.vx + k1 * innovacion_x,
+                py + k0 * innovacion_y, estado.vy + k1 * innovacion_y,
+                (1 - k0) * p00, (1 - k0) * p01, p11 - k1 * p01
+            )
+
+        _estados[tag_id] = estado
+
+    return Estimacion(estado.x, estado.y, estado.vx, estado.vy)
+
+
+def estimacion(tag_id):
+    """Devuelve la última Estimacion del tag o None si no se está siguiendo."""
+    estado = _estados.get(tag_id)
+    if estado is None:
+        return None
+    return Estimacion(estado.x, estado.y, estado.vx, estado.vy)
+
+
+def olvidar(tag_id):
+    """Descarta el estado de un tag (por ejemplo, al borrarlo)."""
+    with _lock:
+        _estados.pop(tag_id, None)
+
+
+def limpiar():
+    with _lock:
+        _estados.clear()
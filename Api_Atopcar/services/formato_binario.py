@@ -0,0 +1,95 @@
+import struct
+
+# Formato binario compacto para los reportes de ranging de los tags.
+#
+# Todos los campos son little-endian. Un mensaje puede contener varias tramas seguidas.
+#
+#   desplazamiento  tamaño  campo
+#   0               1       versión del formato (VERSION)
+#   1               1       número de anchors N
+#   2               2       número de secuencia (uint16, lo incrementa el tag en cada reporte)
+#   4               10      código del tag en ASCII, relleno con bytes nulos (tags.codigo)
+#   14              4 * N   N pares (dirección corta del anchor uint16, distancia en mm uint16)
+#
+# La dirección corta se convierte al nombre del anchor en hexadecimal en mayúsculas
+# (0x5BA3 -> "5BA3"), igual que hace make_link_json en el firmware. La distancia máxima
+# representable es 65,535 m.
+#
+# Con 3 anchors una trama ocupa 26 bytes, frente a los ~150 del JSON equivalente.
+
+VERSION = 1
+CONTENT_TYPE = 'application/vnd.atopcar.uwb'
+TIPOS_CONTENIDO = (CONTENT_TYPE, 'application/octet-stream')
+
+# Bytes del código del tag en la cabecera
+LONGITUD_CODIGO = 10
+
+CABECERA = struct.Struct(f'<BBH{LONGITUD_CODIGO}s')
+PAR = struct.Struct('<HH')
+
+# Número máximo de anchors en una trama
+MAX_ANCHORS = 32
+
+
+def codificar(tag, anchors, secuencia=0):
+    """
+    Codifica un reporte. anchors es una lista de (dirección corta, distancia en metros).
+    Los tags generan la trama en el firmware (make_link_bin); aquí se usa para pruebas y benchmarks.
+    """
+    codigo = tag.encode('ascii')
+    if len(codigo) > LONGITUD_CODIGO:
+        # struct rellena o trunca en silencio: un código truncado sería el de otro tag
+        raise ValueError(f"El código del tag no puede superar {LONGITUD_CODIGO} bytes: {tag}")
+    trama = bytearray(CABECERA.pack(VERSION, len(anchors), secuencia & 0xFFFF, codigo))
+    for direccion, distancia in anchors:
+        trama += PAR.pack(direccion, min(int(round(distancia * 1000)), 0xFFFF))
+    return bytes(trama)
+
+
+def _decodificar_trama(datos, inicio):
+    if len(datos) - inicio < CABECERA.size:
+        raise ValueError("Trama binaria incompleta")
+
+    version, num_anchors, secuencia, codigo = CABECERA.unpack_from(datos, inicio)
+    if version != VERSION:
+        raise ValueError(f"Versión de formato binario no soportada: {version}")
+    if num_anchors > MAX_ANCHORS:
+        raise ValueError(f"Número de anchors no válido: {num_anchors}")
+
+    inicio_pares = inicio + CABECERA.size
+    fin = inicio_pares + num_anchors * PAR.size
+    if len(datos) < fin:
+        raise ValueError("Trama binaria incompleta")
+
+    reporte = {
+        'tag': codigo.rstrip(b'\0').decode('ascii', 'replace'),
+        'secuencia': secuencia,
+        'anchors': [
+            {'shortAddres': '%X' % direccion, 'distancia': distancia_mm / 1000.0}
+            for direccion, distancia_mm in PAR.iter_unpack(datos[inicio_pares:fin])
+        ]
+    }
+    return reporte, fin
+
+
+def decodificar(datos):
+    """Decodifica un mensaje con una sola trama. Lanza ValueError si el formato no es válido."""
+    reporte, fin = _decodificar_trama(datos, 0)
+    if fin != len(datos):
+        raise ValueError("Datos sobrantes tras la trama binaria")
+    return reporte
+
+
+def decodificar_varios(datos):
+    """Decodifica un mensaje con una o varias tramas consecutivas."""
+    reportes = []
+    inicio = 0
+    while inicio < len(datos):
+        reporte, inicio = _decodificar_trama(datos, inicio)
+        reportes.append(reporte)
+    return reportes
+
+
+def es_binario(datos):
+    """Distingue una trama binaria de un JSON (que empieza por '{' o '[')."""
+    return len(datos) > 0 and datos[0] == VERSION
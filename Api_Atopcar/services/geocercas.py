@@ -0,0 +1,93 @@
+from extensions import db
+from models.alerta import Alerta
+from models.vehiculo import Vehiculo
+from services import indice_zonas
+from collections import namedtuple
+import threading
+
+# Alertas "fuera_de_area" generadas en la ingesta de posiciones.
+#
+# Para cada tag se recuerda la última zona en la que se ha clasificado su posición. Las reglas
+# solo se evalúan cuando esa zona cambia (una transición), así que un vehículo que sigue en la
+# misma zona no cuesta nada más que una comparación. En cada transición se comprueba:
+#   - que la posición siga dentro de alguna zona del taller (los polígonos marcan sus límites),
+#   - y, si el vehículo tiene zonas_permitidas, que la nueva zona sea una de ellas.
+# Las alertas de un mismo tag se agrupan: si ya se generó una hace menos de coalescencia_s
+# segundos no se crea otra, para que un vehículo que oscila sobre un borde no llene la tabla.
+# La infracción agrupada queda pendiente y, si el tag sigue en esa zona cuando vence el
+# intervalo, se genera entonces la alerta.
+#
+# evaluar() no toca el estado recordado: anota los cambios en un diccionario del lote que se
+# aplica con confirmar() después del commit. Si el lote se deshace, el estado sigue siendo el
+# anterior y las mismas transiciones se vuelven a evaluar con las posiciones siguientes.
+
+Estado = namedtuple('Estado', ['zona_id', 'ultima_alerta', 'pendiente'])
+
+_lock = threading.Lock()
+_estados = {}   # tag_id -> Estado confirmado
+
+
+def _motivo(tag_id, taller_id, zona_id):
+    """Devuelve (vehiculo_id, descripción) si la zona incumple las reglas del tag, o None."""
+    vehiculo = Vehiculo.query.filter_by(tag_id=tag_id).first()
+
+    if zona_id is None:
+        return (vehiculo.id if vehiculo else None,
+                f"El tag {tag_id} ha salido de las zonas definidas del taller {taller_id}")
+
+    if vehiculo is not None and vehiculo.zonas_permitidas and zona_id not in vehiculo.zonas_permitidas:
+        return vehiculo.id, f"El vehículo {vehiculo.id} ha entrado en la zona {zona_id}, que no tiene permitida"
+
+    return None
+
+
+def _agrupada(ultima_alerta, instante, coalescencia_s):
+    return ultima_alerta is not None and 0 <= (instante - ultima_alerta).total_seconds() < coalescencia_s
+
+
+def evaluar(tag_id, taller_id, zona_id, instante, coalescencia_s, cambios):
+    """
+    Incorpora la zona de una nueva posición del tag. Si es una transición que incumple las reglas
+    (o vence el intervalo de una infracción agrupada) añade a la sesión una Alerta (sin confirmar)
+    y la devuelve; en otro caso devuelve None. El nuevo estado del tag se anota en cambios
+    ({tag_id: Estado}), que se aplica con confirmar() tras el commit.
+    """
+    # Sin polígonos en el taller la zona es la del anchor más cercano y no delimita nada
+    if taller_id is None or not indice_zonas.indice(taller_id).zonas:
+        return None
+
+    estado = cambios.get(tag_id)
+    if estado is None:
+        with _lock:
+            estado = _estados.get(tag_id)
+
+    if estado is not None and estado.zona_id == zona_id:
+        # Misma zona: solo queda emitir la infracción agrupada si ya ha vencido el intervalo
+        if estado.pendiente is None or _agrupada(estado.ultima_alerta, instante, coalescencia_s):
+            return None
+        motivo = estado.pendiente
+    else:
+        motivo = _motivo(tag_id, taller_id, zona_id)
+        ultima_alerta = estado.ultima_alerta if estado else None
+        if motivo is None or _agrupada(ultima_alerta, instante, coalescencia_s):
+            cambios[tag_id] = Estado(zona_id, ultima_alerta, motivo)
+            return None
+
+    cambios[tag_id] = Estado(zona_id, instante, None)
+    vehiculo_id, descripcion = motivo
+    alerta = Alerta(tag_id=tag_id, vehiculo_id=vehiculo_id, tipo='fuera_de_area', descripcion=descripcion)
+    alerta.timestamp = instante
+    db.session.add(alerta)
+    return alerta
+
+
+def confirmar(cambios):
+    """Aplica los cambios de estado de un lote ya confirmado en la base de datos."""
+    with _lock:
+        _estados.update(cambios)
+
+
+def olvidar(tag_id):
+    """Descarta la zona, la última alerta y la infracción pendiente recordadas del tag."""
+    with _lock:
+        _estados.pop(tag_id, None)
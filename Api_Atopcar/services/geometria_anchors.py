@@ -0,0 +1,87 @@
+from collections import namedtuple
+from services.trilateracion import DISTANCIA_MINIMA_CM, TOLERANCIA_DETERMINANTE
+import math
+
+# Caché de la geometría de cada trío de anchors usado en la trilateración.
+#
+# En el sistema lineal de trilateración (ver services/trilateracion.py)
+#   A = [[2(x2-x1), 2(y2-y1)], [2(x3-x1), 2(y3-y1)]]
+#   b = [d1² - d2² + k2, d1² - d3² + k3],  ki = xi² + yi² - x1² - y1²
+# la matriz A y los términos ki solo dependen de las coordenadas de los anchors. Se guardan
+# por trío ordenado de ids, con A ya invertida, de modo que cada cálculo se reduce a unas
+# pocas multiplicaciones. Los tríos de anchors alineados se marcan como degenerados una sola vez.
+
+Geometria = namedtuple('Geometria', ['coordenadas', 'inversa', 'constantes', 'degenerada'])
+
+# Número máximo de tríos guardados; al superarlo se vacía la caché
+MAX_ENTRADAS = 4096
+
+_cache = {}
+
+
+def _construir(anchors):
+    (x1, y1), (x2, y2), (x3, y3) = coordenadas = tuple((a.x, a.y) for a in anchors)
+
+    a11, a12 = 2 * (x2 - x1), 2 * (y2 - y1)
+    a21, a22 = 2 * (x3 - x1), 2 * (y3 - y1)
+    det = a11 * a22 - a12 * a21
+    norma1 = x1 * x1 + y1 * y1
+    constantes = (x2 * x2 + y2 * y2 - norma1, x3 * x3 + y3 * y3 - norma1)
+
+    if abs(det) <= TOLERANCIA_DETERMINANTE * (abs(a11 * a22) + abs(a12 * a21)):
+        print(f"Los anchors {[a.id for a in anchors]} están alineados; "
+              f"sus posiciones se calcularán con la media ponderada por distancias")
+        return Geometria(coordenadas, None, constantes, True)
+
+    inversa = (a22 / det, -a12 / det, -a21 / det, a11 / det)
+    return Geometria(coordenadas, inversa, constantes, False)
+
+
+def obtener(anchors):
+    """Devuelve la Geometria del trío de anchors (objetos con id, x e y), calculándola si hace falta."""
+    clave = (anchors[0].id, anchors[1].id, anchors[2].id)
+    geometria = _cache.get(clave)
+    if geometria is None:
+        geometria = _construir(anchors)
+        if len(_cache) >= MAX_ENTRADAS:
+            _cache.clear()
+        _cache[clave] = geometria
+    return geometria
+
+
+def resolver(anchors, distancias):
+    """
+    Calcula (x, y, residuo) para un reporte de 3 anchors usando la geometría cacheada.
+    Equivale a multilaterar con 3 anchors.
+    """
+    geometria = obtener(anchors)
+    d1, d2, d3 = (max(d, DISTANCIA_MINIMA_CM) for d in distancias)
+
+    if geometria.degenerada:
+        # Media ponderada por el inverso de las distancias
+        pesos = (1 / d1, 1 / d2, 1 / d3)
+        total = sum(pesos)
+        x = sum(p * c[0] for p, c in zip(pesos, geometria.coordenadas)) / total
+        y = sum(p * c[1] for p, c in zip(pesos, geometria.coordenadas)) / total
+    else:
+        i11, i12, i21, i22 = geometria.inversa
+        k2, k3 = geometria.constantes
+        b1 = d1 * d1 - d2 * d2 + k2
+        b2 = d1 * d1 - d3 * d3 + k3
+        x = i11 * b1 + i12 * b2
+        y = i21 * b1 + i22 * b2
+
+    residuo = math.sqrt(sum((math.hypot(x - cx, y - cy) - d) ** 2
+                            for (cx, cy), d in zip(geometria.coordenadas, (d1, d2, d3))) / 3)
+    return int(round(x)), int(round(y)), round(residuo, 2)
+
+
+def invalidar(*anchor_ids):
+    """Elimina los tríos que contienen alguno de los anchors indicados (o todos si no se indica ninguno)."""
+    if not anchor_ids:
+        _cache.clear()
+        return
+    ids = set(anchor_ids)
+    for clave in list(_cache):
+        if ids.intersection(clave):
+            _cache.pop(clave, None)
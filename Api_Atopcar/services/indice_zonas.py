@@ -0,0 +1,153 @@
+from collections import namedtuple
+from flask import current_app
+from models.zona import Zona
+from services import raster_zonas
+import threading
+import time
+
+# Índice espacial en memoria de las zonas de cada taller.
+#
+# Cada zona puede tener un polígono (lista de vértices [x, y] en cm, en coordenadas del taller).
+# Por taller se construye una rejilla uniforme de celdas de TAMANO_CELDA_CM; cada celda guarda
+# las zonas cuyo rectángulo envolvente la toca. Clasificar un punto es buscar su celda y hacer
+# el test punto-en-polígono solo con esas zonas, así que el coste no depende del número total
+# de zonas del taller. Los índices se construyen al primer uso y se invalidan desde los
+# endpoints de routes/zonas.py; como eso solo afecta al proceso que atiende la petición, un
+# tiempo de vida (TTL) acota cuánto tarda otro proceso (udp_server.py, ws_server.py, otros
+# workers) en ver los polígonos nuevos.
+
+ZonaIndexada = namedtuple('ZonaIndexada', ['id', 'min_x', 'min_y', 'max_x', 'max_y', 'vertices', 'area'])
+IndiceTaller = namedtuple('IndiceTaller', ['celdas', 'zonas'])
+
+# Lado de cada celda de la rejilla (cm)
+TAMANO_CELDA_CM = 200
+
+# Segundos tras los que se vuelven a leer las zonas de un taller
+TTL_SEGUNDOS = 300
+
+_lock = threading.Lock()
+_indices = {}   # taller_id -> (IndiceTaller, instante de construcción)
+
+
+def validar_poligono(poligono):
+    """
+    Comprueba que el polígono sea una lista de al menos 3 vértices [x, y] numéricos.
+    Devuelve None si es válido o un mensaje de error.
+    """
+    if poligono is None:
+        return None
+    if not isinstance(poligono, list) or len(poligono) < 3:
+        return "El polígono debe ser una lista de al menos 3 vértices [x, y]"
+    for vertice in poligono:
+        if (not isinstance(vertice, (list, tuple)) or len(vertice) != 2 or
+                not all(isinstance(c, (int, float)) and not isinstance(c, bool) for c in vertice)):
+            return "Cada vértice del polígono debe ser un par [x, y] numérico"
+    if _area(poligono) == 0:
+        return "El polígono no puede tener área nula"
+    return None
+
+
+def _area(vertices):
+    # Fórmula del área de Gauss (shoelace)
+    doble = 0.0
+    for i in range(len(vertices)):
+        x1, y1 = vertices[i - 1]
+        x2, y2 = vertices[i]
+        doble += x1 * y2 - x2 * y1
+    return abs(doble) / 2
+
+
+def _contiene(vertices, x, y):
+    # Trazado de rayos: número impar de cruces con los lados -> punto interior
+    dentro = False
+    x1, y1 = vertices[-1]
+    for x2, y2 in vertices:
+        if (y1 > y) != (y2 > y) and x < (x2 - x1) * (y - y1) / (y2 - y1) + x1:
+            dentro = not dentro
+        x1, y1 = x2, y2
+    return dentro
+
+
+def _celda(valor):
+    return int(valor // TAMANO_CELDA_CM)
+
+
+def _construir(taller_id):
+    zonas = []
+    celdas = {}
+    for zona in Zona.query.filter(Zona.taller_id == taller_id, Zona.poligono.isnot(None)).order_by(Zona.id):
+        if not zona.poligono or validar_poligono(zona.poligono):
+            continue
+        vertices = tuple((float(x), float(y)) for x, y in zona.poligono)
+        xs = [x for x, _ in vertices]
+        ys = [y for _, y in vertices]
+        indexada = ZonaIndexada(zona.id, min(xs), min(ys), max(xs), max(ys), vertices, _area(vertices))
+        zonas.append(indexada)
+
+        for i in range(_celda(indexada.min_x), _celda(indexada.max_x) + 1):
+            for j in range(_celda(indexada.min_y), _celda(indexada.max_y) + 1):
+                celdas.setdefault((i, j), []).append(indexada)
+
+    # Si dos zonas se solapan gana la más pequeña (la más específica)
+    for candidatas in celdas.values():
+        candidatas.sort(key=lambda z: z.area)
+
+    return IndiceTaller(celdas, zonas)
+
+
+def indice(taller_id):
+    """
+    Devuelve el índice del taller, construyéndolo si no existe o ha caducado (requiere
+    contexto de aplicación).
+    """
+    entrada = _indices.get(taller_id)
+    if entrada is None or time.monotonic() - entrada[1] > TTL_SEGUNDOS:
+        with _lock:
+            entrada = _indices.get(taller_id)
+            ahora = time.monotonic()
+            if entrada is None or ahora - entrada[1] > TTL_SEGUNDOS:
+                indice_taller = _construir(taller_id)
+                # Sin cambios se conserva el mismo objeto, y con él el raster de raster_zonas
+                if entrada is not None and entrada[0].zonas == indice_taller.zonas:
+                    indice_taller = entrada[0]
+                entrada = _indices[taller_id] = (indice_taller, ahora)
+    return entrada[0]
+
+
+def clasificar(taller_id, x, y):
+    """Devuelve el id de la zona del taller que contiene el punto, o None."""
+    for zona in indice(taller_id).celdas.get((_celda(x), _celda(y)), ()):
+        if zona.min_x <= x <= zona.max_x and zona.min_y <= y <= zona.max_y and _contiene(zona.vertices, x, y):
+            return zona.id
+    return None
+
+
+def zona_de(taller_id, x, y, por_defecto=None):
+    """
+    Zona de una posición. Si el taller no tiene zonas con polígono se devuelve por_defecto
+    (la zona del anchor más cercano, como antes de existir los polígonos).
+    """
+    if taller_id is None:
+        return por_defecto
+    indice_taller = indice(taller_id)
+    if not indice_taller.zonas:
+        return por_defecto
+
+    # Con el raster activado la clasificación es un acceso al array
+    config = current_app.config
+    if config.get('ZONAS_RASTER', False):
+        raster = raster_zonas.obtener(taller_id, indice_taller, config.get('ZONAS_RASTER_RESOLUCION_CM', 10),
+                                      config['ZONAS_RASTER_DIR'])
+        if raster.celdas is not None:
+            return raster_zonas.zona_en(raster, x, y)
+
+    return clasificar(taller_id, x, y)
+
+
+def invalidar(*taller_ids):
+    """Descarta el índice de los talleres indicados (o de todos); se reconstruye en el siguiente uso."""
+    with _lock:
+        if not taller_ids:
+            _indices.clear()
+        for taller_id in taller_ids:
+            _indices.pop(taller_id, None)
@@ -0,0 +1,394 @@
+from extensions import db
+from models.alerta import Alerta
+from models.distancia import Distancia
+from models.posicion import Posicion
+from models.tag import Tag
+from services import bateria, cache_tags, desconexiones, difusion, filtro_kalman, geocercas, geometria_anchors, indice_zonas, registro_anchors, reposo, ultimas_posiciones
+from services.trilateracion import multilaterar, trilaterar_lote
+from services.upsert import upsert_distancias
+from flask import current_app
+from datetime import datetime, timedelta
+import traceback
+
+# Diferencia mínima (en cm) en alguna distancia para considerar que el tag se ha movido
+UMBRAL_CAMBIO_CM = 50.0
+
+# Número máximo de reportes aceptados en un mismo lote
+MAX_REPORTES_LOTE = 1000
+
+# Número mínimo y máximo de anchors en un reporte
+MIN_ANCHORS = 3
+MAX_ANCHORS = 32
+
+# Antigüedad máxima (offset_ms) de una medida que el tag envía con retraso
+MAX_OFFSET_MS = 10 * 60 * 1000
+
+# A partir de este número de reportes de 3 anchors compensa resolverlos con arrays de NumPy;
+# por debajo es más rápida la geometría cacheada de cada trío (benchmarks/bench_trilateracion.py)
+LOTE_MINIMO_VECTORIZADO = 16
+
+
+def _error(indice, tag, estado, mensaje):
+    return {'indice': indice, 'tag': tag, 'estado': estado, 'error': mensaje}
+
+
+def _lecturas_reporte(reporte):
+    """
+    Devuelve la lista de lecturas del reporte como pares (anchor, distancia en metros).
+    Se aceptan los dos formatos que envían los tags:
+    {"anchors": [{"shortAddres", "distancia"}]} y {"links": [{"A", "R"}]}.
+    """
+    if isinstance(reporte.get('anchors'), list):
+        return [(a.get('shortAddres'), a.get('distancia', None)) if isinstance(a, dict) else (None, None)
+                for a in reporte['anchors']]
+    if isinstance(reporte.get('links'), list):
+        return [(l.get('A'), l.get('R', None)) if isinstance(l, dict) else (None, None)
+                for l in reporte['links']]
+    return None
+
+
+def validar_reporte(reporte):
+    """
+    Comprueba el formato de un reporte {tag, anchors[]} o {tag, links[]} sin acceder a la
+    base de datos. Devuelve (lecturas, None) con las lecturas [(nombre_anchor, distancia_cm)]
+    o (None, (codigo_http, mensaje)) si el reporte no es válido.
+    """
+    crudas = _lecturas_reporte(reporte) if isinstance(reporte, dict) else None
+    if (crudas is None or not reporte.get('tag') or not isinstance(reporte['tag'], str) or
+            not MIN_ANCHORS <= len(crudas) <= MAX_ANCHORS):
+        return None, (400, f"Formato inválido. Se requiere un tag y entre {MIN_ANCHORS} y {MAX_ANCHORS} anchors")
+
+    lecturas = []
+    for i, (nombre, valor) in enumerate(crudas):
+        if not nombre or not isinstance(nombre, str) or valor is None:
+            return None, (400, f"Formato inválido para el anchor #{i+1}")
+
+        # Convertir distancia a número (metros -> cm)
+        try:
+            distancia = float(valor) * 100
+        except (TypeError, ValueError):
+            return None, (400, f"La distancia debe ser un número válido para el anchor {nombre}")
+
+        lecturas.append((nombre, distancia))
+
+    if len({nombre for nombre, _ in lecturas}) != len(lecturas):
+        return None, (400, "Formato inválido. Hay anchors repetidos en el reporte")
+
+    # Nivel de batería opcional del tag
+    if reporte.get('bateria') is not None:
+        _, error = bateria.validar_nivel(reporte['bateria'])
+        if error:
+            return None, (400, error)
+
+    # Antigüedad opcional de la medida (ms antes del envío), para tags que acumulan varias
+    offset = reporte.get('offset_ms')
+    if offset is not None and (isinstance(offset, bool) or not isinstance(offset, int) or
+                               not 0 <= offset <= MAX_OFFSET_MS):
+        return None, (400, f"offset_ms debe ser un entero entre 0 y {MAX_OFFSET_MS}")
+
+    return lecturas, None
+
+
+def cambio_significativo(distancia_anterior, distancias_nuevas):
+    """
+    Indica si alguna distancia ha variado al menos UMBRAL_CAMBIO_CM respecto a la guardada.
+    distancias_nuevas es un diccionario {anchor_id: distancia}; si alguno de los anchors
+    guardados no aparece en el reporte también se considera un cambio.
+    """
+    if distancia_anterior is None:
+        return True
+
+    for n in (1, 2, 3):
+        anchor_id = distancia_anterior[f'anchor{n}_id']
+        if anchor_id not in distancias_nuevas:
+            return True
+        if abs(distancias_nuevas[anchor_id] - (distancia_anterior[f'anchor{n}_dist'] or 0)) >= UMBRAL_CAMBIO_CM:
+            return True
+    return False
+
+
+def _mas_cercanos(dists, cantidad=3):
+    """Índices de los anchors más cercanos, en el orden en que aparecen en el reporte."""
+    return sorted(sorted(range(len(dists)), key=dists.__getitem__)[:cantidad])
+
+
+def _calcular_posiciones(pendientes):
+    """
+    Calcula (x, y, residuo) para cada lista de (anchor, distancia) de pendientes, o None si falla.
+    Los reportes de 3 anchors se resuelven juntos con trilaterar_lote si son bastantes, o con la
+    geometría cacheada de su trío; el resto, uno a uno con multilaterar.
+    """
+    soluciones = [None] * len(pendientes)
+
+    trios = [i for i, situados in enumerate(pendientes) if len(situados) == 3]
+    if len(trios) < LOTE_MINIMO_VECTORIZADO:
+        for i in trios:
+            try:
+                soluciones[i] = geometria_anchors.resolver([anchor for anchor, _ in pendientes[i]],
+                                                           [dist for _, dist in pendientes[i]])
+            except Exception as e:
+                print(f"Error en triangulación: {str(e)}")
+    else:
+        try:
+            posiciones, residuos = trilaterar_lote(
+                [[(anchor.x, anchor.y) for anchor, _ in pendientes[i]] for i in trios],
+                [[dist for _, dist in pendientes[i]] for i in trios])
+            for i, (x, y), residuo in zip(trios, posiciones.tolist(), residuos.tolist()):
+                soluciones[i] = (int(round(x)), int(round(y)), round(residuo, 2))
+        except Exception as e:
+            print(f"Error en la triangulación del lote: {str(e)}")
+
+    for i, situados in enumerate(pendientes):
+        if len(situados) == 3:
+            continue
+        try:
+            soluciones[i] = multilaterar([(anchor.x, anchor.y) for anchor, _ in situados],
+                                         [dist for _, dist in situados])
+        except Exception as e:
+            print(f"Error en triangulación: {str(e)}")
+
+    return soluciones
+
+
+def comprobar_reporte(reporte):
+    """
+    Valida un reporte y comprueba que su tag y sus anchors existen usando solo las cachés
+    en memoria. Devuelve None si es válido o (codigo_http, mensaje) si no lo es.
+    """
+    lecturas, error = validar_reporte(reporte)
+    if error:
+        return error
+
+    if not cache_tags.resolver(reporte['tag']):
+        return 404, f"El tag {reporte['tag']} no existe en la base de datos"
+
+    for nombre, _ in lecturas:
+        if not registro_anchors.por_nombre(nombre):
+            return 404, f"El anchor {nombre} no existe en la base de datos"
+
+    return None
+
+
+def procesar_lote(reportes, recibidos=None):
+    """
+    Procesa una lista de reportes de ranging en una única transacción.
+
+    Los tags se resuelven con la caché de códigos, los anchors con el registro en memoria
+    y las distancias previas con una sola consulta IN (...). Todas las escrituras se
+    confirman con un único commit.
+    recibidos: lista opcional con la hora de recepción de cada reporte (modo write-behind);
+    si no se indica, todos se reciben en el instante del lote. El timestamp de cada posición
+    es su hora de recepción menos el offset_ms opcional del reporte, y las posiciones del
+    lote se procesan en ese orden.
+    Devuelve una lista de resultados por reporte, en el mismo orden que la entrada.
+    """
+    resultados = [None] * len(reportes)
+
+    # 1. Validación de formato (sin consultas)
+    validos = []
+    for indice, reporte in enumerate(reportes):
+        lecturas, error = validar_reporte(reporte)
+        codigo = reporte.get('tag') if isinstance(reporte, dict) else None
+        if error:
+            resultados[indice] = _error(indice, codigo, *error)
+        else:
+            validos.append((indice, codigo, lecturas))
+
+    if not validos:
+        return resultados
+
+    # 2. Resolución de tags (caché), anchors (registro en memoria) y distancias previas (una consulta)
+    codigos = {codigo for _, codigo, _ in validos}
+    nombres = {nombre for _, _, lecturas in validos for nombre, _ in lecturas}
+
+    tags = cache_tags.resolver_varios(codigos)
+
+    anchors = {nombre: registro_anchors.por_nombre(nombre) for nombre in nombres}
+
+    # Las distancias previas se leen como diccionarios (mismo formato que Distancia.to_dict)
+    tag_ids = [tag.id for tag in tags.values() if tag]
+    distancias = {}
+    if tag_ids:
+        tabla = Distancia.__table__
+        for fila in db.session.execute(tabla.select().where(tabla.c.tag_id.in_(tag_ids))):
+            distancias[fila.tag_id] = dict(fila._mapping)
+
+    # 3. Trilateración y escrituras en memoria
+    ahora = max(recibidos) if recibidos else datetime.utcnow()
+    tags_vistos = set()
+    niveles_bateria = {}
+    distancias_resultado = []
+    distancias_upsert = {}
+    pendientes = []
+    nuevas_posiciones = []
+    talleres = {}
+    cambios_geocercas = {}
+    try:
+        for indice, codigo, lecturas in validos:
+            tag = tags.get(codigo)
+            if not tag:
+                resultados[indice] = _error(indice, codigo, 404, f"El tag {codigo} no existe en la base de datos")
+                continue
+
+            anchors_reporte = [anchors.get(nombre) for nombre, _ in lecturas]
+            faltante = next((nombre for (nombre, _), anchor in zip(lecturas, anchors_reporte) if anchor is None), None)
+            if faltante is not None:
+                resultados[indice] = _error(indice, codigo, 404, f"El anchor {faltante} no existe en la base de datos")
+                continue
+
+            # La última comunicación se actualiza con cada reporte válido, haya o no movimiento
+            tags_vistos.add(tag.id)
+            if reportes[indice].get('bateria') is not None:
+                niveles_bateria[tag.id], _ = bateria.validar_nivel(reportes[indice]['bateria'])
+            dists = [dist for _, dist in lecturas]
+            distancia_anterior = distancias.get(tag.id)
+
+            # La posición se calcula siempre; services/reposo.py decide si se guarda.
+            # Solo se usan los anchors con coordenadas conocidas
+            situados = [(anchor, dist) for anchor, dist in zip(anchors_reporte, dists)
+                        if anchor.x is not None and anchor.y is not None]
+            if len(situados) >= MIN_ANCHORS:
+                pendientes.append((indice, tag.id, situados))
+
+            # La tabla distancias solo se reescribe si alguna distancia cambia de forma apreciable
+            if not cambio_significativo(distancia_anterior,
+                                        {anchor.id: dist for anchor, dist in zip(anchors_reporte, dists)}):
+                resultados[indice] = {
+                    'indice': indice, 'tag': codigo, 'estado': 200,
+                    'mensaje': "No hay cambios significativos en las distancias",
+                    'distancia': None, 'posicion': None
+                }
+                distancias_resultado.append((indice, distancia_anterior))
+                continue
+
+            if distancia_anterior is None:
+                estado, mensaje = 201, "Distancias registradas correctamente"
+            else:
+                estado, mensaje = 200, "Distancias actualizadas correctamente"
+
+            # La tabla distancias guarda la última medida a los 3 anchors más cercanos
+            i1, i2, i3 = _mas_cercanos(dists)
+            distancia = {
+                'id': distancia_anterior['id'] if distancia_anterior else None,
+                'tag_id': tag.id,
+                'anchor1_id': anchors_reporte[i1].id, 'anchor1_dist': dists[i1],
+                'anchor2_id': anchors_reporte[i2].id, 'anchor2_dist': dists[i2],
+                'anchor3_id': anchors_reporte[i3].id, 'anchor3_dist': dists[i3]
+            }
+            # Los reportes siguientes del mismo tag en el lote se comparan con este
+            distancias[tag.id] = distancia
+            distancias_upsert[tag.id] = distancia
+
+            resultados[indice] = {
+                'indice': indice, 'tag': codigo, 'estado': estado, 'mensaje': mensaje,
+                'distancia': None, 'posicion': None
+            }
+            distancias_resultado.append((indice, distancia))
+
+        # Posiciones de todo el lote en un solo cálculo
+        soluciones = _calcular_posiciones([situados for _, _, situados in pendientes])
+
+        # Instante de cada medida: un tag que envía varias medidas acumuladas las separa con
+        # offset_ms. El filtro, el reposo y las geocercas las reciben en orden cronológico
+        instantes = {}
+        for indice, _, _ in pendientes:
+            recibido = recibidos[indice] if recibidos else ahora
+            instantes[indice] = recibido - timedelta(milliseconds=reportes[indice].get('offset_ms') or 0)
+        calculadas = sorted(zip(pendientes, soluciones), key=lambda par: instantes[par[0][0]])
+
+        filtrar = current_app.config.get('FILTRO_KALMAN', False)
+        radio_reposo = current_app.config.get('POSICION_RADIO_REPOSO_CM', 0)
+        latido = current_app.config.get('POSICION_LATIDO_S', 0)
+        coalescencia = current_app.config.get('GEOCERCAS_COALESCENCIA_S', 0)
+        for (indice, tag_id, situados), solucion in calculadas:
+            if solucion is None:
+                continue
+            x, y, residuo = solucion
+            instante = instantes[indice]
+
+            posicion = Posicion(tag_id=tag_id, x=x, y=y, residuo=residuo)
+            if filtrar:
+                estimacion = filtro_kalman.actualizar(tag_id, x, y, instante, residuo)
+                posicion.x, posicion.y = int(round(estimacion.x)), int(round(estimacion.y))
+                posicion.vx, posicion.vy = round(estimacion.vx, 1), round(estimacion.vy, 1)
+
+            # La zona se busca en los polígonos del taller del anchor más cercano
+            cercano = min(situados, key=lambda par: par[1])[0]
+            posicion.zona_id = indice_zonas.zona_de(cercano.taller_id, posicion.x, posicion.y, cercano.zona_id)
+
+            # Las reglas de área solo se evalúan cuando el tag cambia de zona
+            geocercas.evaluar(tag_id, cercano.taller_id, posicion.zona_id, instante, coalescencia, cambios_geocercas)
+
+            # Vehículo parado: no se guarda hasta que se mueva o toque el latido
+            if not reposo.debe_guardar(tag_id, posicion.x, posicion.y, instante, radio_reposo, latido):
+                continue
+
+            # El timestamp se fija aquí para poder construir la respuesta sin recargar la fila
+            posicion.timestamp = instante
+            db.session.add(posicion)
+            nuevas_posiciones.append((indice, posicion))
+            talleres[indice] = cercano.taller_id
+
+        # Última medición de cada tag con una única sentencia INSERT ... ON CONFLICT/DUPLICATE KEY
+        ids_distancias = {}
+        if distancias_upsert:
+            filas = [{k: v for k, v in d.items() if k != 'id'} for d in distancias_upsert.values()]
+            ids_distancias = upsert_distancias(filas)
+
+        # Un único flush para obtener los ids de las filas nuevas
+        db.session.flush()
+
+        # Última posición de cada tag con un solo upsert en posiciones_ultimas
+        if nuevas_posiciones:
+            ultimas_posiciones.guardar([ultimas_posiciones.fila(posicion, talleres[indice])
+                                        for indice, posicion in nuevas_posiciones])
+
+        # Última comunicación y batería de todos los tags del lote con un solo UPDATE.
+        # Las alertas de batería se evalúan antes: necesitan los niveles previos
+        if tags_vistos:
+            valores = {Tag.ultima_comunicacion: ahora}
+            if niveles_bateria:
+                bateria.alertar(niveles_bateria)
+                valores[Tag.bateria] = bateria.columna(niveles_bateria)
+            Tag.query.filter(Tag.id.in_(tags_vistos)).update(valores, synchronize_session=False)
+
+            # Los tags que vuelven a comunicar cierran sus alertas de desconexión
+            reconectados = desconexiones.desconectados(tags_vistos)
+            if reconectados:
+                Alerta.query.filter(Alerta.tag_id.in_(reconectados), Alerta.tipo == 'desconexion',
+                                    Alerta.leido.is_(False)).update({Alerta.leido: True}, synchronize_session=False)
+
+        # Las respuestas se construyen antes del commit, que expira los objetos de la sesión
+        for indice, distancia in distancias_resultado:
+            distancia = dict(distancia)
+            if distancia['id'] is None:
+                distancia['id'] = ids_distancias.get(distancia['tag_id'])
+            resultados[indice]['distancia'] = distancia
+        publicables = []
+        for indice, posicion in nuevas_posiciones:
+            resultados[indice]['posicion'] = posicion.to_dict()
+            publicables.append(dict(resultados[indice]['posicion'], taller_id=talleres[indice]))
+
+        db.session.commit()
+        geocercas.confirmar(cambios_geocercas)
+        desconexiones.vistos(tags_vistos, ahora)
+        ultimas_posiciones.actualizar(publicables)
+        difusion.publicar(publicables)
+    except Exception:
+        traceback.print_exc()
+        db.session.rollback()
+        # Las posiciones no se han guardado: no pueden servir de referencia de reposo
+        for _, posicion in nuevas_posiciones:
+            reposo.olvidar(posicion.tag_id)
+        # Tampoco las alertas: la siguiente posición de cada tag vuelve a evaluarse (las
+        # geocercas no aplican cambios_geocercas)
+        if niveles_bateria:
+            bateria.recargar()
+        raise
+
+    return resultados
+
+
+def procesar_reporte(reporte):
+    """Procesa un único reporte con la misma unidad de trabajo que procesar_lote."""
+    return procesar_lote([reporte])[0]
@@ -0,0 +1,122 @@
+from flask import current_app, request
+from sqlalchemy import and_, or_
+from datetime import datetime
+import base64
+import binascii
+import json
+
+# Paginación por clave (keyset) de los listados.
+#
+# La primera página se pide solo con limit; las siguientes, con el next_cursor que devolvió la
+# anterior. El cursor es opaco para el cliente: guarda los valores de la clave de ordenación
+# (el primary key o (timestamp, id)) de la última fila entregada, y la página siguiente empieza
+# justo después con un WHERE sobre esa clave en lugar de un OFFSET. Con un índice que cubra la
+# clave, el coste de una página no depende del tamaño de la tabla ni de lo lejos que esté.
+
+# Parámetros de swagger comunes a todos los listados paginados
+PARAMETROS = [
+    {
+        'name': 'limit',
+        'in': 'query',
+        'type': 'integer',
+        'required': False,
+        'default': 100,
+        'description': 'Número máximo de resultados por página (máximo PAGINACION_LIMITE_MAX)'
+    },
+    {
+        'name': 'cursor',
+        'in': 'query',
+        'type': 'string',
+        'required': False,
+        'description': 'next_cursor devuelto por la página anterior'
+    }
+]
+
+
+def esquema(definicion):
+    """Esquema de swagger de una página de la definición dada."""
+    return {
+        'type': 'object',
+        'properties': {
+            'items': {'type': 'array', 'items': {'$ref': f'#/definitions/{definicion}'}},
+            'next_cursor': {
+                'type': 'string',
+                'description': 'Cursor de la página siguiente; null en la última página'
+            }
+        }
+    }
+
+
+def _codificar(valores):
+    valores = [valor.isoformat() if isinstance(valor, datetime) else valor for valor in valores]
+    texto = json.dumps(valores, separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(texto).decode().rstrip('=')
+
+
+def _decodificar(cursor, columnas):
+    try:
+        texto = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        valores = json.loads(texto)
+        if not isinstance(valores, list) or len(valores) != len(columnas):
+            raise ValueError
+        resultado = []
+        for valor, columna in zip(valores, columnas):
+            if columna.type.python_type is datetime:
+                resultado.append(datetime.fromisoformat(valor))
+            elif isinstance(valor, int) and not isinstance(valor, bool):
+                resultado.append(valor)
+            else:
+                raise ValueError
+        return resultado
+    except (ValueError, TypeError, binascii.Error):
+        raise ValueError("El parámetro cursor no es válido")
+
+
+def _limite():
+    limite = request.args.get('limit')
+    if limite is None:
+        return current_app.config.get('PAGINACION_LIMITE_DEFECTO', 100)
+    try:
+        limite = int(limite)
+    except ValueError:
+        raise ValueError("El parámetro limit debe ser un número entero")
+    if limite < 1:
+        raise ValueError("El parámetro limit debe ser mayor que 0")
+    return min(limite, current_app.config.get('PAGINACION_LIMITE_MAX', 1000))
+
+
+def _despues_de(columnas, valores, descendente):
+    # (a, b) > (va, vb)  ==  a > va OR (a = va AND b > vb), escrito así para que los motores
+    # usen el índice (MySQL no siempre lo hace con la comparación de tuplas)
+    condiciones = []
+    for i, columna in enumerate(columnas):
+        iguales = [c == v for c, v in zip(columnas[:i], valores[:i])]
+        siguiente = columna < valores[i] if descendente else columna > valores[i]
+        condiciones.append(and_(*iguales, siguiente))
+    return or_(*condiciones)
+
+
+def paginar(query, columnas, descendente=False):
+    """
+    Aplica limit y cursor de la petición a la consulta, ordenada por columnas (la última debe
+    ser única, normalmente el id). Devuelve (filas, next_cursor). Lanza ValueError con un
+    mensaje para el cliente si limit o cursor no son válidos.
+    """
+    limite = _limite()
+    cursor = request.args.get('cursor')
+    if cursor:
+        query = query.filter(_despues_de(columnas, _decodificar(cursor, columnas), descendente))
+
+    query = query.order_by(*[columna.desc() if descendente else columna.asc() for columna in columnas])
+    # Una fila de más indica si hay página siguiente
+    filas = query.limit(limite + 1).all()
+    if len(filas) <= limite:
+        return filas, None
+
+    filas = filas[:limite]
+    ultima = filas[-1]
+    return filas, _codificar([getattr(ultima, columna.key) for columna in columnas])
+
+
+def pagina(items, next_cursor):
+    return {'items': items, 'next_cursor': next_cursor}
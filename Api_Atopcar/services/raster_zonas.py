@@ -0,0 +1,128 @@
+from collections import namedtuple
+import glob
+import hashlib
+import json
+import numpy as np
+import os
+import threading
+
+# Rasterizado opcional de las zonas de un taller (ZONAS_RASTER en la configuración).
+#
+# Se precalcula una rejilla uint16 con la resolución configurada en la que cada celda guarda
+# el id de la zona que la contiene (0 = ninguna). Clasificar un punto es un único acceso al
+# array. La rejilla se genera a partir del índice de polígonos de services/indice_zonas.py la
+# primera vez que se necesita, se guarda en un fichero .npy cuyo nombre incluye una huella de
+# la geometría y en los siguientes arranques se abre con memory-map. Si las zonas cambian,
+# la huella cambia y se genera un fichero nuevo.
+
+Raster = namedtuple('Raster', ['indice', 'origen_x', 'origen_y', 'resolucion', 'celdas'])
+
+# Tamaño máximo de una rejilla (celdas); por encima se usa el índice de polígonos
+MAX_CELDAS = 50_000_000
+
+# Mayor id de zona representable en uint16 (0 se reserva para "sin zona")
+MAX_ZONA_ID = np.iinfo(np.uint16).max
+
+_lock = threading.Lock()
+_rasters = {}
+
+
+def _huella(taller_id, zonas, resolucion):
+    geometria = sorted((zona.id, zona.vertices) for zona in zonas)
+    datos = json.dumps([taller_id, resolucion, geometria]).encode()
+    return hashlib.sha1(datos).hexdigest()[:16]
+
+
+def _rasterizar(zonas, origen_x, origen_y, resolucion, ancho, alto):
+    celdas = np.zeros((alto, ancho), dtype=np.uint16)
+
+    # Las zonas más pequeñas se pintan al final para que ganen en los solapes, igual que en el índice
+    for zona in sorted(zonas, key=lambda z: z.area, reverse=True):
+        i0 = int((zona.min_x - origen_x) // resolucion)
+        i1 = min(int((zona.max_x - origen_x) // resolucion) + 1, ancho)
+        j0 = int((zona.min_y - origen_y) // resolucion)
+        j1 = min(int((zona.max_y - origen_y) // resolucion) + 1, alto)
+
+        # Centros de las celdas del rectángulo envolvente de la zona
+        X = origen_x + (np.arange(i0, i1) + 0.5) * resolucion
+        Y = origen_y + (np.arange(j0, j1) + 0.5) * resolucion
+        X, Y = np.meshgrid(X, Y)
+
+        # Trazado de rayos vectorizado sobre todos los centros
+        dentro = np.zeros(X.shape, dtype=bool)
+        x1, y1 = zona.vertices[-1]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            for x2, y2 in zona.vertices:
+                cruza = ((y1 > Y) != (y2 > Y)) & (X < (x2 - x1) * (Y - y1) / (y2 - y1) + x1)
+                dentro ^= cruza
+                x1, y1 = x2, y2
+
+        celdas[j0:j1, i0:i1][dentro] = zona.id
+
+    return celdas
+
+
+def _cargar_o_generar(taller_id, indice_taller, resolucion, directorio):
+    zonas = indice_taller.zonas
+    if any(zona.id > MAX_ZONA_ID for zona in zonas):
+        return None
+
+    origen_x = min(zona.min_x for zona in zonas)
+    origen_y = min(zona.min_y for zona in zonas)
+    ancho = int((max(zona.max_x for zona in zonas) - origen_x) // resolucion) + 1
+    alto = int((max(zona.max_y for zona in zonas) - origen_y) // resolucion) + 1
+    if ancho * alto > MAX_CELDAS:
+        print(f"El raster de zonas del taller {taller_id} tendría {ancho * alto} celdas; se usa el índice de polígonos")
+        return None
+
+    ruta = os.path.join(directorio, f"taller_{taller_id}_{_huella(taller_id, zonas, resolucion)}.npy")
+    if not os.path.exists(ruta):
+        os.makedirs(directorio, exist_ok=True)
+        celdas = _rasterizar(zonas, origen_x, origen_y, resolucion, ancho, alto)
+
+        # Escritura atómica: otro proceso nunca ve un fichero a medias
+        temporal = f"{ruta}.{os.getpid()}.tmp"
+        with open(temporal, 'wb') as fichero:
+            np.save(fichero, celdas)
+        os.replace(temporal, ruta)
+
+        # Los rasters de geometrías anteriores del taller ya no sirven
+        for antiguo in glob.glob(os.path.join(directorio, f"taller_{taller_id}_*.npy")):
+            if antiguo != ruta:
+                try:
+                    os.remove(antiguo)
+                except OSError:
+                    pass
+
+    # Vista ndarray sobre el fichero mapeado: sin copia y sin la sobrecarga de indexar np.memmap
+    celdas = np.asarray(np.load(ruta, mmap_mode='r'))
+    return Raster(indice_taller, origen_x, origen_y, resolucion, celdas)
+
+
+def obtener(taller_id, indice_taller, resolucion, directorio):
+    """
+    Devuelve el Raster del taller para ese índice de polígonos, o None si no se puede rasterizar.
+    Si el índice se ha reconstruido (las zonas han cambiado) se carga o genera uno nuevo.
+    """
+    raster = _rasters.get(taller_id)
+    if raster is not None and raster.indice is indice_taller and raster.resolucion == resolucion:
+        return raster
+
+    with _lock:
+        raster = _rasters.get(taller_id)
+        if raster is None or raster.indice is not indice_taller or raster.resolucion != resolucion:
+            raster = _cargar_o_generar(taller_id, indice_taller, resolucion, directorio)
+            if raster is None:
+                raster = Raster(indice_taller, None, None, resolucion, None)
+            _rasters[taller_id] = raster
+    return raster
+
+
+def zona_en(raster, x, y):
+    """Id de la zona de la celda que contiene el punto, o None."""
+    i = int((x - raster.origen_x) // raster.resolucion)
+    j = int((y - raster.origen_y) // raster.resolucion)
+    alto, ancho = raster.celdas.shape
+    if 0 <= j < alto and 0 <= i < ancho:
+        return raster.celdas.item(j, i) or None
+    return None
@@ -0,0 +1,70 @@
+from collections import namedtuple
+from models.anchor import Anchor
+from services import geometria_anchors
+import threading
+import time
+
+# Registro en memoria de los anchors usado por la ingesta de distancias.
+# Los anchors casi nunca cambian, así que se cargan una vez al arrancar y se invalidan
+# desde los endpoints de routes/anchors.py. Cada proceso mantiene su propia copia; el
+# tiempo de vida (TTL) acota cuánto tarda un worker en ver cambios hechos desde otro.
+
+AnchorInfo = namedtuple('AnchorInfo', ['id', 'nombre', 'x', 'y', 'zona_id', 'taller_id', 'activo'])
+
+# Segundos tras los que el registro se recarga aunque nadie lo haya invalidado
+TTL_SEGUNDOS = 300
+
+_lock = threading.Lock()
+_por_id = {}
+_por_nombre = {}
+_cargado_en = None
+
+
+def cargar():
+    """Carga todos los anchors desde la base de datos (requiere contexto de aplicación)."""
+    global _por_id, _por_nombre, _cargado_en
+
+    with _lock:
+        por_id = {}
+        por_nombre = {}
+        for anchor in Anchor.query.order_by(Anchor.id):
+            info = AnchorInfo(anchor.id, anchor.nombre, anchor.x, anchor.y,
+                              anchor.zona_id, anchor.taller_id, anchor.activo)
+            por_id[info.id] = info
+            # Si hay nombres repetidos se usa el primero, igual que filter_by(...).first()
+            if info.nombre is not None:
+                por_nombre.setdefault(info.nombre, info)
+
+        # Anchors movidos o borrados desde fuera de esta API: su geometría cacheada ya no vale
+        cambiados = [anchor_id for anchor_id, info in _por_id.items()
+                     if anchor_id not in por_id or (por_id[anchor_id].x, por_id[anchor_id].y) != (info.x, info.y)]
+        if cambiados:
+            geometria_anchors.invalidar(*cambiados)
+
+        # Se sustituyen los diccionarios completos para que los lectores nunca vean un estado a medias
+        _por_id, _por_nombre = por_id, por_nombre
+        _cargado_en = time.monotonic()
+
+
+def invalidar():
+    """Marca el registro como obsoleto; se recargará en la siguiente consulta."""
+    global _cargado_en
+    _cargado_en = None
+
+
+def _asegurar_cargado():
+    cargado_en = _cargado_en
+    if cargado_en is None or time.monotonic() - cargado_en > TTL_SEGUNDOS:
+        cargar()
+
+
+def por_nombre(nombre):
+    """Devuelve el AnchorInfo con ese nombre (shortAddress) o None."""
+    _asegurar_cargado()
+    return _por_nombre.get(nombre)
+
+
+def por_id(anchor_id):
+    """Devuelve el AnchorInfo con ese id o None."""
+    _asegurar_cargado()
+    return _por_id.get(anchor_id)
@@ -0,0 +1,52 @@
+import threading
+
+# Detección de reposo en el espacio de posiciones para no llenar el histórico.
+#
+# Para cada tag se recuerda la última posición guardada en la tabla posiciones. Una posición
+# nueva solo se guarda si se aleja más de un radio de esa referencia (movimiento) o si ha
+# pasado el intervalo de latido desde la última escritura (el vehículo sigue ahí). Mientras
+# el vehículo está parado solo se escribe una fila por latido, y la trayectoria de un
+# vehículo en movimiento se conserva con la resolución del radio.
+
+_lock = threading.Lock()
+_referencias = {}
+_contadores = {'guardadas': 0, 'suprimidas': 0}
+
+
+def debe_guardar(tag_id, x, y, instante, radio_cm, latido_s):
+    """
+    Indica si la posición (x, y) del tag en el instante dado debe guardarse.
+    Si se guarda, pasa a ser la nueva referencia del tag.
+    """
+    with _lock:
+        referencia = _referencias.get(tag_id)
+        desde = instante
+        if referencia is not None:
+            rx, ry, instante_ref, desde_ref = referencia
+            quieto = (x - rx) ** 2 + (y - ry) ** 2 <= radio_cm ** 2
+            if quieto and (instante - instante_ref).total_seconds() < latido_s:
+                _contadores['suprimidas'] += 1
+                return False
+            if quieto:
+                desde = desde_ref
+
+        _referencias[tag_id] = (x, y, instante, desde)
+        _contadores['guardadas'] += 1
+        return True
+
+
+def en_reposo_desde(tag_id):
+    """Instante desde el que el tag no se ha alejado del radio de reposo, o None si no se conoce."""
+    referencia = _referencias.get(tag_id)
+    return referencia[3] if referencia is not None else None
+
+
+def olvidar(tag_id):
+    """Descarta la referencia de un tag; su siguiente posición se guardará siempre."""
+    with _lock:
+        _referencias.pop(tag_id, None)
+
+
+def estadisticas():
+    with _lock:
+        return dict(_contadores)
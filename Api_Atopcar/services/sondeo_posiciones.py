@@ -0,0 +1,81 @@
+from models.posicion_ultima import PosicionUltima
+from services import difusion
+import atexit
+import threading
+import traceback
+
+# Difusión entre procesos de las posiciones nuevas.
+#
+# services/difusion.py reparte en memoria lo que publica la ingesta del propio proceso. Cuando
+# la ingesta corre en otro (udp_server.py, otro worker de gunicorn o el proceso Flask frente a
+# ws_server.py), las posiciones llegan a través de la tabla posiciones_ultimas, que tiene una
+# fila por tag: un hilo la lee cada DIFUSION_SONDEO_S segundos y publica las filas cuya
+# posición ha cambiado desde la lectura anterior. La primera lectura solo toma nota del
+# estado. Lo que el propio proceso ya publicó no se repite (difusion.publicar lo descarta).
+#
+# Mientras el proceso no tiene clientes en directo el hilo no consulta la base de datos; al
+# volver a tenerlos, la primera lectura vuelve a tomar nota del estado, en lugar de publicar
+# todo lo que cambió sin nadie escuchando.
+
+_lock = threading.Lock()
+_vistas = None          # tag_id -> id de la última posición leída
+_hilo = None
+_parar = threading.Event()
+
+
+def activo():
+    return _hilo is not None
+
+
+def _sondear():
+    """Lee posiciones_ultimas y devuelve las posiciones que han cambiado (formato PosicionUltima.to_dict)."""
+    global _vistas
+    filas = [fila.to_dict() for fila in PosicionUltima.query]
+    with _lock:
+        primera = _vistas is None
+        anteriores = _vistas or {}
+        _vistas = {posicion['tag_id']: posicion['id'] for posicion in filas}
+    if primera:
+        return []
+    return [posicion for posicion in filas if anteriores.get(posicion['tag_id']) != posicion['id']]
+
+
+def _bucle(app, intervalo):
+    global _vistas
+    while not _parar.wait(intervalo):
+        if not difusion.hay_suscriptores():
+            with _lock:
+                _vistas = None
+            continue
+        try:
+            with app.app_context():
+                cambiadas = _sondear()
+            difusion.publicar(cambiadas)
+        except Exception:
+            # La sesión se descarta al salir del contexto; se reintenta en el siguiente ciclo
+            traceback.print_exc()
+
+
+def iniciar(app):
+    """Arranca el hilo de sondeo si DIFUSION_SONDEO_S > 0. Se puede llamar varias veces."""
+    global _hilo
+    intervalo = app.config.get('DIFUSION_SONDEO_S', 0)
+    if not intervalo:
+        return
+    with _lock:
+        if _hilo is not None:
+            return
+        _parar.clear()
+        _hilo = threading.Thread(target=_bucle, args=(app, intervalo), name='sondeo-posiciones', daemon=True)
+        _hilo.start()
+    atexit.register(detener)
+
+
+def detener(timeout=5.0):
+    global _hilo, _vistas
+    _parar.set()
+    if _hilo is not None:
+        _hilo.join(timeout)
+    with _lock:
+        _hilo = None
+        _vistas = None
@@ -0,0 +1,82 @@
+import numpy as np
+
+# Distancia mínima (cm) usada para los pesos, evita dividir por cero con lecturas nulas
+DISTANCIA_MINIMA_CM = 1.0
+
+
+def multilaterar(coordenadas, distancias):
+    """
+    Calcula la posición de un tag a partir de 3 o más anchors por mínimos cuadrados ponderados.
+
+    coordenadas: secuencia de (x, y) de cada anchor; distancias: distancia medida a cada uno (cm).
+    Devuelve (x, y, residuo), donde residuo es el error cuadrático medio (cm) entre las distancias
+    medidas y las distancias desde la posición calculada a cada anchor.
+    """
+    P = np.asarray(coordenadas, dtype=float)
+    d = np.maximum(np.asarray(distancias, dtype=float), DISTANCIA_MINIMA_CM)
+
+    # Ecuaciones para cada anchor i:  (x-xi)² + (y-yi)² = di²
+    # Restando la del anchor de referencia (el primero) queda un sistema lineal de N-1 ecuaciones:
+    #   2(xi-x0)·x + 2(yi-y0)·y = d0² - di² - x0² + xi² - y0² + yi²
+    A = 2 * (P[1:] - P[0])
+    normas = np.einsum('ij,ij->i', P, P)
+    b = d[0]**2 - d[1:]**2 - normas[0] + normas[1:]
+
+    # El error de una distancia crece con la distancia: cada ecuación pesa 1/di²
+    raiz_pesos = 1 / d[1:]
+    solucion, _, rango, _ = np.linalg.lstsq(A * raiz_pesos[:, None], b * raiz_pesos, rcond=None)
+
+    if rango < 2:
+        # Anchors alineados: el sistema no tiene solución única
+        print("No se pudo resolver el sistema de ecuaciones. Usando método alternativo...")
+
+        # Método simple: posición promedio ponderada por inverso de distancias
+        pesos = 1 / d
+        solucion = pesos @ P / pesos.sum()
+
+    residuo = np.sqrt(np.mean((np.linalg.norm(P - solucion, axis=1) - d) ** 2))
+
+    # Redondear a enteros para guardar en la base de datos
+    return int(round(solucion[0])), int(round(solucion[1])), round(float(residuo), 2)
+
+
+
+# Tolerancia relativa del determinante por debajo de la cual un trío de anchors se considera alineado
+TOLERANCIA_DETERMINANTE = 1e-9
+
+
+def trilaterar_lote(coordenadas, distancias):
+    """
+    Resuelve de una vez muchos reportes de 3 anchors con operaciones sobre arrays.
+
+    coordenadas: array (n, 3, 2) con las coordenadas de los 3 anchors de cada reporte.
+    distancias: array (n, 3) con las distancias medidas (cm).
+    Devuelve (posiciones, residuos): un array (n, 2) de floats y un array (n,) con el error
+    cuadrático medio de cada fila. Las filas con anchors alineados usan la media ponderada
+    por el inverso de las distancias, igual que multilaterar.
+    """
+    P = np.asarray(coordenadas, dtype=float)
+    d = np.maximum(np.asarray(distancias, dtype=float), DISTANCIA_MINIMA_CM)
+
+    # Mismo sistema 2x2 que multilaterar, resuelto por la regla de Cramer para todas las filas
+    A = 2 * (P[:, 1:] - P[:, :1])
+    normas = np.einsum('nij,nij->ni', P, P)
+    b = d[:, :1]**2 - d[:, 1:]**2 - normas[:, :1] + normas[:, 1:]
+
+    diagonal = A[:, 0, 0] * A[:, 1, 1]
+    antidiagonal = A[:, 0, 1] * A[:, 1, 0]
+    det = diagonal - antidiagonal
+    singular = np.abs(det) <= TOLERANCIA_DETERMINANTE * (np.abs(diagonal) + np.abs(antidiagonal))
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        x = (b[:, 0] * A[:, 1, 1] - b[:, 1] * A[:, 0, 1]) / det
+        y = (A[:, 0, 0] * b[:, 1] - A[:, 1, 0] * b[:, 0]) / det
+    posiciones = np.stack([x, y], axis=1)
+
+    if singular.any():
+        print(f"{int(singular.sum())} reportes con anchors alineados. Usando método alternativo...")
+        pesos = 1 / d[singular]
+        posiciones[singular] = np.einsum('ni,nij->nj', pesos, P[singular]) / pesos.sum(axis=1)[:, None]
+
+    residuos = np.sqrt(np.mean((np.linalg.norm(P - posiciones[:, None, :], axis=2) - d) ** 2, axis=1))
+    return posiciones, residuos
@@ -0,0 +1,140 @@
+from extensions import db
+from models.posicion import Posicion
+from models.posicion_ultima import PosicionUltima
+from models.tag import Tag
+from models.zona import Zona
+from services.upsert import upsert_posiciones_ultimas
+from flask import current_app
+from sqlalchemy import desc, exists
+import threading
+import time
+
+# Última posición de cada tag, en memoria y en la tabla posiciones_ultimas.
+#
+# La ingesta escribe la fila de cada tag en la misma transacción que su posición (un único
+# upsert por lote) y, tras el commit, actualiza el diccionario en memoria. Las consultas de
+# la última posición de un tag o de todas las de un taller se sirven del diccionario, sin
+# recorrer el histórico. Si la ingesta corre en otro proceso (udp_server.py), el diccionario
+# se recarga de la tabla, que es pequeña (una fila por tag), como mucho cada
+# POSICIONES_ULTIMAS_RECARGA_S segundos y solo cuando alguien lo consulta.
+#
+# En bases de datos anteriores a la tabla, la migración que la crea (o, sin migraciones,
+# rellenar() al arrancar la aplicación) copia la última posición del histórico de los tags
+# que aún no tienen fila; las consultas nunca recorren el histórico. Las escrituras no
+# sustituyen una fila por otra con un timestamp anterior (un worker que confirma tarde),
+# salvo al recalcular.
+
+_lock = threading.Lock()
+_ultimas = None     # tag_id -> diccionario con el formato de PosicionUltima.to_dict
+_cargado_en = 0.0
+
+
+def fila(posicion, taller_id):
+    """Fila de posiciones_ultimas para una Posicion ya volcada (con id)."""
+    return {
+        'tag_id': posicion.tag_id, 'posicion_id': posicion.id,
+        'x': posicion.x, 'y': posicion.y, 'zona_id': posicion.zona_id, 'taller_id': taller_id,
+        'residuo': posicion.residuo, 'vx': posicion.vx, 'vy': posicion.vy, 'timestamp': posicion.timestamp
+    }
+
+
+def guardar(filas, forzar=False):
+    """Escribe las filas en posiciones_ultimas dentro de la transacción en curso (sin commit)."""
+    upsert_posiciones_ultimas(filas, forzar)
+
+
+def actualizar(posiciones, forzar=False):
+    """Tras el commit: actualiza la memoria con diccionarios de PosicionUltima.to_dict."""
+    with _lock:
+        if _ultimas is None:
+            return
+        for posicion in posiciones:
+            actual = _ultimas.get(posicion['tag_id'])
+            # Fechas ISO 8601 del mismo formato: se comparan como texto
+            if (forzar or actual is None or actual['timestamp'] is None or
+                    (posicion['timestamp'] or '') >= actual['timestamp']):
+                _ultimas[posicion['tag_id']] = posicion
+
+
+def _ultima_del_historico(tag_id):
+    return Posicion.query.filter_by(tag_id=tag_id).order_by(desc(Posicion.timestamp), desc(Posicion.id)).first()
+
+
+def rellenar():
+    """
+    Copia a posiciones_ultimas la última posición del histórico de cada tag sin fila y
+    confirma. Una consulta por tag sobre el índice (tag_id, timestamp); se llama una vez al
+    arrancar (requiere contexto de aplicación). Los workers que arrancan a la vez no chocan:
+    las filas se escriben con el mismo upsert que la ingesta.
+    """
+    # Solo los tags con histórico: los que nunca han tenido posición no se consultan en cada arranque
+    sin_fila = db.session.query(Tag.id).filter(~exists().where(PosicionUltima.tag_id == Tag.id),
+                                               exists().where(Posicion.tag_id == Tag.id)).all()
+    if not sin_fila:
+        return
+    talleres = dict(db.session.query(Zona.id, Zona.taller_id))
+    filas = []
+    for tag_id, in sin_fila:
+        posicion = _ultima_del_historico(tag_id)
+        if posicion is not None:
+            filas.append(fila(posicion, talleres.get(posicion.zona_id)))
+    if filas:
+        guardar(filas)
+        db.session.commit()
+        print(f"posiciones_ultimas: copiada la última posición de {len(filas)} tags del histórico")
+
+
+def _vigentes():
+    global _ultimas, _cargado_en
+    recarga = current_app.config.get('POSICIONES_ULTIMAS_RECARGA_S', 0)
+    ahora = time.monotonic()
+    with _lock:
+        if _ultimas is not None and not (recarga and ahora - _cargado_en > recarga):
+            return _ultimas
+
+    ultimas = {fila.tag_id: fila.to_dict() for fila in PosicionUltima.query}
+    with _lock:
+        _ultimas, _cargado_en = ultimas, ahora
+        return _ultimas
+
+
+def obtener(tag_id):
+    """Última posición del tag o None."""
+    return _vigentes().get(tag_id)
+
+
+def todas(taller_id=None, zona_id=None):
+    """Últimas posiciones de todos los tags, opcionalmente de un taller o una zona."""
+    return [posicion for posicion in list(_vigentes().values())
+            if (taller_id is None or posicion['taller_id'] == taller_id) and
+               (zona_id is None or posicion['zona_id'] == zona_id)]
+
+
+def recalcular(tag_id):
+    """
+    Vuelve a tomar la última posición del tag del histórico (tras crear, editar o borrar
+    posiciones a mano) y confirma el cambio.
+    """
+    posicion = _ultima_del_historico(tag_id)
+    if posicion is None:
+        PosicionUltima.query.filter_by(tag_id=tag_id).delete()
+        db.session.commit()
+        olvidar(tag_id)
+        return
+
+    zona = db.session.get(Zona, posicion.zona_id) if posicion.zona_id else None
+    datos = fila(posicion, zona.taller_id if zona else None)
+    guardar([datos], forzar=True)
+    db.session.commit()
+    actualizar([PosicionUltima(**datos).to_dict()], forzar=True)
+
+
+def borrar(tag_id):
+    """Elimina la fila del tag dentro de la transacción en curso (antes de borrar el tag)."""
+    PosicionUltima.query.filter_by(tag_id=tag_id).delete()
+
+
+def olvidar(tag_id):
+    with _lock:
+        if _ultimas is not None:
+            _ultimas.pop(tag_id, None)
@@ -0,0 +1,147 @@
+from extensions import db
+from models.distancia import Distancia
+from models.posicion_ultima import PosicionUltima
+from sqlalchemy import func, or_
+from sqlalchemy.dialects import mysql, postgresql, sqlite
+
+# Escritura de la última medición de cada tag en la tabla distancias (una fila por tag_id), y de
+# su última posición en posiciones_ultimas, con un único INSERT ... ON DUPLICATE KEY UPDATE (MySQL)
+# o INSERT ... ON CONFLICT (SQLite/PostgreSQL). Así se evita el SELECT previo y la carrera entre
+# workers al crear la primera fila de un tag.
+
+COLUMNAS_DISTANCIA = (
+    'anchor1_id', 'anchor1_dist',
+    'anchor2_id', 'anchor2_dist',
+    'anchor3_id', 'anchor3_dist'
+)
+
+
+def upsert_distancias(filas, columnas_actualizar=COLUMNAS_DISTANCIA):
+    """
+    Inserta o actualiza varias filas de distancias con una sola sentencia.
+
+    filas: lista de diccionarios con 'tag_id' y los campos de COLUMNAS_DISTANCIA.
+    columnas_actualizar: columnas que se sobrescriben si el tag ya tenía fila.
+    Devuelve {tag_id: id} cuando el motor permite conocer los ids (RETURNING en
+    SQLite/PostgreSQL, LAST_INSERT_ID en MySQL para una sola fila); si no, un diccionario vacío.
+    """
+    # Si un tag aparece varias veces se queda su última medición
+    # (PostgreSQL no permite actualizar la misma fila dos veces en una sentencia)
+    filas = list({fila['tag_id']: fila for fila in filas}.values())
+    if not filas:
+        return {}
+
+    # Sin columnas que actualizar se hace una actualización nula para que la sentencia devuelva la fila
+    columnas_actualizar = tuple(columnas_actualizar) or ('tag_id',)
+
+    tabla = Distancia.__table__
+    dialecto = db.session.get_bind().dialect.name
+
+    if dialecto == 'mysql':
+        stmt = mysql.insert(tabla).values(filas)
+        valores = {columna: stmt.inserted[columna] for columna in columnas_actualizar}
+        # LAST_INSERT_ID(id) hace que lastrowid devuelva también el id de la fila actualizada
+        valores['id'] = func.last_insert_id(tabla.c.id)
+        resultado = db.session.execute(stmt.on_duplicate_key_update(valores))
+        if len(filas) == 1 and resultado.lastrowid:
+            return {filas[0]['tag_id']: resultado.lastrowid}
+        return {}
+
+    if dialecto in ('sqlite', 'postgresql'):
+        insert = sqlite.insert if dialecto == 'sqlite' else postgresql.insert
+        stmt = insert(tabla).values(filas)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[tabla.c.tag_id],
+            set_={columna: stmt.excluded[columna] for columna in columnas_actualizar}
+        ).returning(tabla.c.tag_id, tabla.c.id)
+        return {tag_id: id for tag_id, id in db.session.execute(stmt)}
+
+    # Otros motores: lectura previa y escritura fila a fila con el ORM
+    ids = {}
+    for fila in filas:
+        distancia = Distancia.query.filter_by(tag_id=fila['tag_id']).first()
+        if distancia is None:
+            distancia = Distancia(**fila)
+            db.session.add(distancia)
+        else:
+            for columna in columnas_actualizar:
+                setattr(distancia, columna, fila.get(columna))
+        db.session.flush()
+        ids[fila['tag_id']] = distancia.id
+    return ids
+
+
+def upsert_distancia(fila, columnas_actualizar=COLUMNAS_DISTANCIA):
+    """
+    Inserta o actualiza la fila de un solo tag, como upsert_distancias. Devuelve True si la
+    fila se ha creado y False si el tag ya tenía una (POST /api/distancias responde 201 o 200).
+    """
+    columnas_actualizar = tuple(columnas_actualizar) or ('tag_id',)
+    tabla = Distancia.__table__
+
+    if db.session.get_bind().dialect.name == 'mysql':
+        # Filas afectadas por ON DUPLICATE KEY UPDATE: 1 si se inserta y 2 si se actualiza.
+        # SQLAlchemy conecta con CLIENT_FOUND_ROWS, así que una fila reescrita con los mismos
+        # valores también cuenta 1
+        stmt = mysql.insert(tabla).values(fila)
+        resultado = db.session.execute(stmt.on_duplicate_key_update(
+            {columna: stmt.inserted[columna] for columna in columnas_actualizar}))
+        return resultado.rowcount == 1
+
+    # Resto de motores: comprobación previa en la misma transacción
+    existia = db.session.query(Distancia.id).filter_by(tag_id=fila['tag_id']).first() is not None
+    upsert_distancias([fila], columnas_actualizar)
+    return not existia
+
+
+COLUMNAS_POSICION_ULTIMA = ('posicion_id', 'x', 'y', 'zona_id', 'taller_id', 'residuo', 'vx', 'vy', 'timestamp')
+
+
+def upsert_posiciones_ultimas(filas, forzar=False):
+    """
+    Inserta o sustituye la última posición de varios tags con una sola sentencia.
+    filas: lista de diccionarios con 'tag_id' y los campos de COLUMNAS_POSICION_ULTIMA.
+    forzar: sustituir la fila aunque tenga un timestamp más reciente (al recalcular tras
+    borrar o editar posiciones del histórico). Sin forzar, un worker que escribe tarde no
+    pisa una posición más nueva con otra más antigua.
+    """
+    filas = list({fila['tag_id']: fila for fila in filas}.values())
+    if not filas:
+        return
+
+    tabla = PosicionUltima.__table__
+    dialecto = db.session.get_bind().dialect.name
+
+    if dialecto == 'mysql':
+        stmt = mysql.insert(tabla).values(filas)
+        if forzar:
+            valores = [(columna, stmt.inserted[columna]) for columna in COLUMNAS_POSICION_ULTIMA]
+        else:
+            # MySQL aplica las asignaciones en orden y las siguientes ven los valores ya
+            # actualizados: timestamp es la última columna de COLUMNAS_POSICION_ULTIMA
+            nueva = or_(tabla.c.timestamp.is_(None), stmt.inserted.timestamp >= tabla.c.timestamp)
+            valores = [(columna, func.if_(nueva, stmt.inserted[columna], tabla.c[columna]))
+                       for columna in COLUMNAS_POSICION_ULTIMA]
+        db.session.execute(stmt.on_duplicate_key_update(valores))
+        return
+
+    if dialecto in ('sqlite', 'postgresql'):
+        insert = sqlite.insert if dialecto == 'sqlite' else postgresql.insert
+        stmt = insert(tabla).values(filas)
+        condicion = None
+        if not forzar:
+            condicion = or_(tabla.c.timestamp.is_(None), stmt.excluded.timestamp >= tabla.c.timestamp)
+        db.session.execute(stmt.on_conflict_do_update(
+            index_elements=[tabla.c.tag_id],
+            set_={columna: stmt.excluded[columna] for columna in COLUMNAS_POSICION_ULTIMA},
+            where=condicion))
+        return
+
+    # Otros motores: lectura previa y escritura fila a fila con el ORM
+    for fila in filas:
+        actual = db.session.get(PosicionUltima, fila['tag_id'])
+        if actual is None:
+            db.session.add(PosicionUltima(**fila))
+        elif forzar or actual.timestamp is None or fila['timestamp'] >= actual.timestamp:
+            for columna in COLUMNAS_POSICION_ULTIMA:
+                setattr(actual, columna, fila[columna])
@@ -0,0 +1,81 @@
+import os
+import tempfile
+
+# La aplicación se crea al importar app.py: la base de datos de pruebas debe estar configurada
+# antes. Por defecto, un SQLite temporal; TEST_DATABASE_URL permite usar otro motor (se borran
+# todas las tablas en cada test).
+_directorio = tempfile.mkdtemp(prefix='atopcar-tests-')
+os.environ['DATABASE_URL'] = os.environ.get('TEST_DATABASE_URL',
+                                            'sqlite:///' + os.path.join(_directorio, 'atopcar.db'))
+
+from app import app as _app
+from extensions import db
+from models.anchor import Anchor
+from models.tag import Tag
+from models.taller import Taller
+from models.zona import Zona
+from services import (bateria, cache_tags, difusion, filtro_kalman, geocercas, geometria_anchors,
+                      indice_zonas, raster_zonas, registro_anchors, reposo, sondeo_posiciones, ultimas_posiciones)
+import pytest
+
+# Anchors del taller de pruebas: nombre (dirección corta en hexadecimal) y posición en cm
+ANCHORS = [('5BA3', 0, 0), ('2219', 500, 0), ('234B', 0, 500), ('AAAA', 500, 500)]
+
+# Zona que cubre la mitad izquierda del taller; la derecha queda fuera de las zonas definidas
+POLIGONO = [[0, 0], [250, 0], [250, 500], [0, 500]]
+
+
+def _reiniciar_servicios():
+    """Descarta el estado en memoria de los servicios, como en un proceso recién arrancado."""
+    cache_tags.limpiar()
+    registro_anchors.invalidar()
+    geometria_anchors.invalidar()
+    indice_zonas.invalidar()
+    bateria.recargar()
+    filtro_kalman.limpiar()
+    with geocercas._lock:
+        geocercas._estados.clear()
+    with reposo._lock:
+        reposo._referencias.clear()
+    with raster_zonas._lock:
+        raster_zonas._rasters.clear()
+    with difusion._lock:
+        difusion._publicadas.clear()
+    with sondeo_posiciones._lock:
+        sondeo_posiciones._vistas = None
+    with ultimas_posiciones._lock:
+        ultimas_posiciones._ultimas = None
+        ultimas_posiciones._cargado_en = 0.0
+
+
+@pytest.fixture
+def app():
+    _app.config['TESTING'] = True
+    with _app.app_context():
+        db.drop_all()
+        db.create_all()
+        _reiniciar_servicios()
+        yield _app
+        db.session.remove()
+
+
+@pytest.fixture
+def taller(app):
+    """Taller 1 con la zona 1 y cuatro anchors, y los tags T0001-T0003 (ids 1-3)."""
+    db.session.add(Taller(nombre='Taller de pruebas'))
+    db.session.add(Zona(nombre='Zona de pruebas', tipo='espera', taller_id=1))
+    for i, (nombre, x, y) in enumerate(ANCHORS):
+        db.session.add(Anchor(nombre=nombre, mac=f'00:00:00:00:00:0{i}', x=x, y=y, zona_id=1, taller_id=1))
+    for i in range(1, 4):
+        db.session.add(Tag(codigo=f'T000{i}', mac=f'00:00:00:00:01:0{i}', bateria=80))
+    db.session.commit()
+    registro_anchors.invalidar()
+    return db.session.get(Taller, 1)
+
+
+def reporte(tag, distancias=(2.0, 4.0, 4.0), anchors=('5BA3', '2219', '234B'), **extra):
+    """Reporte de ranging en el formato JSON de /api/distancias/registrar (distancias en metros)."""
+    datos = {'tag': tag, 'anchors': [{'shortAddres': nombre, 'distancia': str(distancia)}
+                                     for nombre, distancia in zip(anchors, distancias)]}
+    datos.update(extra)
+    return datos
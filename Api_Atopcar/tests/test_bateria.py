@@ -0,0 +1,76 @@
+from extensions import db
+from models.alerta import Alerta
+from models.tag import Tag
+from services import bateria
+from tests.conftest import reporte
+
+
+def _alertas(tag_id=1):
+    return Alerta.query.filter_by(tag_id=tag_id, tipo='bateria_baja').order_by(Alerta.id).all()
+
+
+def test_primer_cruce_en_un_proceso_nuevo_alerta(client, taller):
+    # El tag estaba al 80 %: el primer nivel bajo tras arrancar debe alertar aunque el conjunto
+    # de tags con batería baja se cargue en esa misma petición
+    assert client.put('/api/tags/1/bateria', json={'bateria': 10}).status_code == 200
+
+    assert len(_alertas()) == 1
+    assert db.session.get(Tag, 1).bateria == 10
+
+
+def test_histeresis(client, taller):
+    for nivel in (15, 19, 22, 18):
+        client.put('/api/tags/1/bateria', json={'bateria': nivel})
+    assert len(_alertas()) == 1
+
+    # Al superar el umbral de recuperación la alerta abierta se marca como leída
+    client.put('/api/tags/1/bateria', json={'bateria': 30})
+    assert [alerta.leido for alerta in _alertas()] == [True]
+
+    client.put('/api/tags/1/bateria', json={'bateria': 12})
+    assert [alerta.leido for alerta in _alertas()] == [True, False]
+
+
+def test_tag_ya_bajo_al_arrancar_no_repite(client, taller):
+    db.session.get(Tag, 2).bateria = 10
+    db.session.commit()
+    bateria.recargar()
+
+    client.put('/api/tags/2/bateria', json={'bateria': 9})
+
+    assert _alertas(2) == []
+
+
+def test_lote_y_reportes_de_ranging(client, taller):
+    respuesta = client.put('/api/tags/bateria', json={'tags': [{'codigo': 'T0001', 'bateria': 5},
+                                                                {'id': 2, 'bateria': 50}]})
+    assert respuesta.get_json()['alertas'] == 1
+
+    bateria.recargar()
+    client.post('/api/distancias/registrar', json=reporte('T0002', bateria=8))
+
+    assert len(_alertas(1)) == 1
+    assert len(_alertas(2)) == 1
+    assert db.session.get(Tag, 2).bateria == 8
+
+
+def test_nivel_no_valido(client, taller):
+    assert client.put('/api/tags/1/bateria', json={'bateria': 120}).status_code == 400
+    assert client.put('/api/tags/1/bateria', json={'bateria': True}).status_code == 400
+
+
+def test_lote_con_errores_por_tag(client, taller):
+    respuesta = client.put('/api/tags/bateria', json={'tags': [
+        {'id': [1], 'bateria': 5},
+        {'id': True, 'bateria': 5},
+        {'id': 1, 'bateria': 'mucha'},
+        {'id': 99, 'bateria': 5},
+        {'codigo': 'T0002', 'bateria': 40},
+    ]})
+
+    assert respuesta.status_code == 200
+    datos = respuesta.get_json()
+    assert datos['actualizados'] == 1
+    assert [error['indice'] for error in datos['errores']] == [0, 1, 2, 3]
+    assert db.session.get(Tag, 1).bateria == 80
+    assert db.session.get(Tag, 2).bateria == 40
@@ -0,0 +1,71 @@
+from datetime import datetime, timedelta
+from services import cadencia, cola_ingesta, filtro_kalman, reposo
+from tests.conftest import reporte
+import pytest
+
+
+def _parado_hace(tag_id, segundos):
+    reposo.debe_guardar(tag_id, 100, 100, datetime.utcnow() - timedelta(seconds=segundos), 30, 300)
+
+
+@pytest.fixture
+def carga(monkeypatch):
+    def fijar(profundidad, capacidad=100):
+        monkeypatch.setattr(cola_ingesta, 'estadisticas', lambda: {'profundidad': profundidad, 'capacidad': capacidad})
+    return fijar
+
+
+def test_tag_sin_historial_usa_la_minima(app, taller):
+    assert cadencia.siguiente_reporte_ms('T0001') == app.config['CADENCIA_MIN_MS']
+
+
+def test_tag_desconocido_usa_la_maxima(app, taller):
+    assert cadencia.siguiente_reporte_ms('NOEXISTE') == app.config['CADENCIA_MAX_MS']
+    assert cadencia.siguiente_reporte_ms(None) == app.config['CADENCIA_MAX_MS']
+
+
+def test_crece_con_el_tiempo_parado_hasta_la_maxima(app, taller):
+    _parado_hace(1, 10)
+    _parado_hace(2, 3600)
+
+    intervalo = cadencia.siguiente_reporte_ms('T0001')
+    assert intervalo == pytest.approx(app.config['CADENCIA_MIN_MS'] + 10 * cadencia.ESPERA_POR_SEGUNDO_PARADO_MS,
+                                      abs=50)
+    assert cadencia.siguiente_reporte_ms('T0002') == app.config['CADENCIA_MAX_MS']
+
+
+def test_en_movimiento_usa_la_minima(app, taller):
+    _parado_hace(1, 60)
+    inicio = datetime.utcnow() - timedelta(seconds=10)
+    for i in range(10):
+        filtro_kalman.actualizar(1, 100 + 50 * i, 100, inicio + timedelta(seconds=i))
+
+    assert cadencia.siguiente_reporte_ms('T0001') == app.config['CADENCIA_MIN_MS']
+
+
+def test_la_carga_alarga_los_intervalos(app, taller, carga):
+    minimo = app.config['CADENCIA_MIN_MS']
+
+    carga(50)
+    assert cadencia.siguiente_reporte_ms('T0001') == int(minimo * (1 + cadencia.FACTOR_CARGA / 2))
+
+    carga(100)
+    assert cadencia.siguiente_reporte_ms('T0001') == int(minimo * (1 + cadencia.FACTOR_CARGA))
+
+
+def test_sin_cola_no_hay_carga(app, taller, carga):
+    carga(0, capacidad=0)
+
+    assert cadencia.siguiente_reporte_ms('T0001') == app.config['CADENCIA_MIN_MS']
+
+
+def test_respuestas_de_la_ingesta(client, taller):
+    individual = client.post('/api/distancias/registrar', json=reporte('T0001')).get_json()
+    lote = client.post('/api/distancias/registrar-lote',
+                       json=[reporte('T0002'), reporte('NOEXISTE')]).get_json()['resultados']
+
+    # Los tags acaban de guardar su primera posición: apenas llevan unos milisegundos parados
+    minimo, maximo = client.application.config['CADENCIA_MIN_MS'], client.application.config['CADENCIA_MAX_MS']
+    assert individual['next_report_ms'] == pytest.approx(minimo, abs=50)
+    assert lote[0]['next_report_ms'] == pytest.approx(minimo, abs=50)
+    assert lote[1]['next_report_ms'] == maximo
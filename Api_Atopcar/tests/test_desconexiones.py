@@ -0,0 +1,139 @@
+from datetime import datetime, timedelta
+from extensions import db
+from models.alerta import Alerta
+from models.tag import Tag
+from models.vehiculo import Vehiculo
+from services import desconexiones
+from tests.conftest import reporte
+import threading
+import time
+import pytest
+
+TIMEOUT = timedelta(seconds=120)
+INICIO = datetime(2026, 1, 1, 8, 0, 0)
+
+
+@pytest.fixture
+def detector(app, monkeypatch):
+    """Estado del detector vacío, con el plazo configurado pero sin el hilo."""
+    monkeypatch.setattr(desconexiones, '_timeout', TIMEOUT)
+    monkeypatch.setattr(desconexiones, '_monticulo', [])
+    monkeypatch.setattr(desconexiones, '_plazos', {})
+    monkeypatch.setattr(desconexiones, '_desconectados', set())
+    return desconexiones
+
+
+def _alertas(tag_id=None):
+    consulta = Alerta.query.filter_by(tipo='desconexion')
+    if tag_id is not None:
+        consulta = consulta.filter_by(tag_id=tag_id)
+    return consulta.all()
+
+
+def test_vencen_en_orden_de_plazo(detector):
+    detector.vistos([2], INICIO + timedelta(seconds=10))
+    detector.vistos([1], INICIO)
+    detector.vistos([3], INICIO + timedelta(seconds=50))
+
+    vencidos, espera = detector._extraer_vencidos(INICIO + TIMEOUT + timedelta(seconds=20))
+
+    assert vencidos == [1, 2]
+    assert espera == pytest.approx(30)
+    assert detector._plazos.keys() == {3}
+
+
+def test_un_reporte_nuevo_aplaza_el_plazo(detector):
+    detector.vistos([1], INICIO)
+    detector.vistos([1], INICIO + timedelta(seconds=60))
+
+    # La entrada antigua sigue en el montículo, pero ya no es el plazo vigente
+    assert detector._extraer_vencidos(INICIO + TIMEOUT + timedelta(seconds=1))[0] == []
+    assert detector._extraer_vencidos(INICIO + TIMEOUT + timedelta(seconds=60))[0] == [1]
+
+
+def test_sin_plazos_espera_el_maximo(detector):
+    assert detector._extraer_vencidos(INICIO) == ([], desconexiones.MAX_ESPERA_S)
+
+
+def test_el_monticulo_se_compacta(detector):
+    for i in range(500):
+        detector.vistos([1], INICIO + timedelta(seconds=i))
+
+    assert len(detector._monticulo) <= 4 * len(detector._plazos) + 64
+
+
+def test_alerta_al_vencer(detector, taller):
+    db.session.add(Vehiculo(matricula='1234ABC', tag_id=1))
+    Tag.query.filter_by(id=1).update({Tag.ultima_comunicacion: INICIO})
+    db.session.commit()
+    detector.vistos([1], INICIO)
+
+    ahora = INICIO + TIMEOUT + timedelta(seconds=1)
+    vencidos, _ = detector._extraer_vencidos(ahora)
+    detector._alertar(vencidos, ahora)
+
+    alerta, = _alertas(1)
+    assert alerta.vehiculo_id == 1 and not alerta.leido
+    assert detector.desconectados([1, 2]) == {1}
+
+    # Un segundo vencimiento no duplica la alerta abierta
+    detector._alertar([1], ahora + TIMEOUT)
+    assert len(_alertas(1)) == 1
+
+
+def test_reportado_a_otro_proceso_se_reprograma(detector, taller):
+    reciente = INICIO + timedelta(seconds=100)
+    Tag.query.filter_by(id=1).update({Tag.ultima_comunicacion: reciente})
+    db.session.commit()
+
+    detector._alertar([1], INICIO + TIMEOUT + timedelta(seconds=1))
+
+    assert _alertas() == []
+    assert detector._plazos[1] == reciente + TIMEOUT
+
+
+def test_al_reconectar_se_cierra_la_alerta(detector, client, taller):
+    Tag.query.filter_by(id=1).update({Tag.ultima_comunicacion: INICIO})
+    db.session.commit()
+    detector.vistos([1], INICIO)
+    ahora = INICIO + TIMEOUT + timedelta(seconds=1)
+    detector._alertar(detector._extraer_vencidos(ahora)[0], ahora)
+    assert detector.desconectados([1]) == {1}
+
+    client.post('/api/distancias/registrar', json=reporte('T0001'))
+
+    assert all(alerta.leido for alerta in _alertas(1))
+    assert detector.desconectados([1]) == set()
+    assert detector._plazos[1] > datetime.utcnow()
+
+
+def test_olvidar(detector):
+    detector.vistos([1], INICIO)
+    detector._desconectados.add(1)
+
+    detector.olvidar(1)
+
+    assert detector._extraer_vencidos(INICIO + 2 * TIMEOUT)[0] == []
+    assert detector.desconectados([1]) == set()
+
+
+def test_el_hilo_alerta_de_los_tags_que_no_comunican(detector, app, taller, monkeypatch):
+    monkeypatch.setitem(app.config, 'DESCONEXION_TIMEOUT_S', 0.2)
+    monkeypatch.setattr(desconexiones, '_hilo', None)
+    monkeypatch.setattr(desconexiones, '_parar', threading.Event())
+    # Los tags 2 y 3 siguen comunicando (desde el punto de vista de la base de datos)
+    Tag.query.filter(Tag.id != 1).update({Tag.ultima_comunicacion: datetime.utcnow() + timedelta(hours=1)})
+    Tag.query.filter_by(id=1).update({Tag.ultima_comunicacion: datetime.utcnow()})
+    db.session.commit()
+
+    desconexiones.iniciar(app)
+    try:
+        limite = time.monotonic() + 5
+        while not _alertas(1) and time.monotonic() < limite:
+            time.sleep(0.05)
+            db.session.expire_all()
+    finally:
+        desconexiones.detener()
+
+    assert len(_alertas(1)) == 1
+    assert _alertas(2) == []
@@ -0,0 +1,98 @@
+from datetime import datetime, timedelta
+from extensions import db
+from models.posicion import Posicion
+from models.taller import Taller
+from models.zona import Zona
+import csv
+import io
+import json
+import pytest
+
+INICIO = datetime(2026, 1, 1, 8, 0, 0)
+
+# (tag_id, zona_id, segundos desde INICIO); la zona 2 es del taller 2. Se insertan desordenadas
+POSICIONES = [(1, 1, 30), (2, 2, 10), (1, 1, 0), (3, 1, 20), (1, 2, 40), (2, 2, 50)]
+
+
+@pytest.fixture
+def historico(taller):
+    db.session.add(Taller(nombre='Otro taller'))
+    db.session.add(Zona(nombre='Zona del otro taller', tipo='espera', taller_id=2))
+    for tag_id, zona_id, segundos in POSICIONES:
+        posicion = Posicion(tag_id=tag_id, x=segundos, y=segundos, zona_id=zona_id)
+        posicion.timestamp = INICIO + timedelta(seconds=segundos)
+        db.session.add(posicion)
+    db.session.commit()
+
+
+def _ndjson(respuesta):
+    return [json.loads(linea) for linea in respuesta.get_data(as_text=True).splitlines()]
+
+
+def _segundos(posiciones):
+    return [int((datetime.fromisoformat(p['timestamp']) - INICIO).total_seconds()) for p in posiciones]
+
+
+def test_ndjson_en_orden_cronologico(client, historico):
+    respuesta = client.get('/api/posiciones/export')
+
+    assert respuesta.status_code == 200
+    assert respuesta.mimetype == 'application/x-ndjson'
+    assert respuesta.headers['Content-Disposition'] == 'attachment; filename=posiciones.ndjson'
+    posiciones = _ndjson(respuesta)
+    assert _segundos(posiciones) == [0, 10, 20, 30, 40, 50]
+    # Mismas claves que Posicion.to_dict
+    assert list(posiciones[0]) == list(Posicion.query.first().to_dict())
+
+
+def test_csv_con_cabecera(client, historico):
+    respuesta = client.get('/api/posiciones/export?formato=csv')
+
+    assert respuesta.mimetype == 'text/csv'
+    filas = list(csv.DictReader(io.StringIO(respuesta.get_data(as_text=True))))
+    assert list(filas[0]) == ['id', 'tag_id', 'x', 'y', 'zona_id', 'residuo', 'vx', 'vy', 'timestamp']
+    assert [fila['x'] for fila in filas] == ['0', '10', '20', '30', '40', '50']
+    assert filas[0]['residuo'] == ''
+
+
+@pytest.mark.parametrize('filtro, esperados', [
+    ('tag_id=1', [0, 30, 40]),
+    ('zona_id=2', [10, 40, 50]),
+    ('taller_id=1', [0, 20, 30]),
+    ('taller_id=2', [10, 40, 50]),
+    ('tag_id=1&taller_id=2', [40]),
+    ('desde=2026-01-01T08:00:10&hasta=2026-01-01T08:00:40', [10, 20, 30]),
+    # Con zona horaria se convierte a UTC
+    ('desde=2026-01-01T09:00:20%2B01:00', [20, 30, 40, 50]),
+    ('tag_id=99', []),
+])
+def test_filtros(client, historico, filtro, esperados):
+    assert _segundos(_ndjson(client.get(f'/api/posiciones/export?{filtro}'))) == esperados
+
+
+@pytest.mark.parametrize('consulta', [
+    'desde=ayer',
+    'hasta=2026-13-01',
+    'desde=2026-01-01T09:00:00&hasta=2026-01-01T08:00:00',
+    'desde=2026-01-01T08:00:00&hasta=2026-01-01T08:00:00',
+    'formato=xml',
+])
+def test_parametros_no_validos(client, historico, consulta):
+    respuesta = client.get(f'/api/posiciones/export?{consulta}')
+
+    assert respuesta.status_code == 400
+    assert 'error' in respuesta.get_json()
+
+
+@pytest.mark.parametrize('formato, cabecera', [('ndjson', 0), ('csv', 1)])
+def test_se_genera_por_lotes(client, historico, monkeypatch, formato, cabecera):
+    monkeypatch.setitem(client.application.config, 'EXPORTACION_LOTE', 2)
+
+    respuesta = client.get(f'/api/posiciones/export?formato={formato}', buffered=False)
+
+    assert respuesta.is_streamed
+    trozos = [trozo for trozo in respuesta.response if trozo]
+    respuesta.close()
+    # 6 filas en lotes de 2 (más la cabecera del CSV)
+    assert len(trozos) == 3 + cabecera
+    assert all(trozo.count(b'\n') == 2 for trozo in trozos[cabecera:])
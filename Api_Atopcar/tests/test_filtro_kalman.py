@@ -0,0 +1,90 @@
+from datetime import datetime, timedelta
+from models.posicion import Posicion
+from services import filtro_kalman
+from tests.conftest import reporte
+import numpy as np
+import pytest
+
+INICIO = datetime(2026, 1, 1, 8, 0, 0)
+
+
+def _recorrido(tag_id, puntos, periodo_s=1.0, residuo=None):
+    return [filtro_kalman.actualizar(tag_id, x, y, INICIO + timedelta(seconds=i * periodo_s), residuo)
+            for i, (x, y) in enumerate(puntos)]
+
+
+def _salto_medio(puntos):
+    return np.mean(np.hypot(*np.diff(np.array(puntos), axis=0).T))
+
+
+def _error_medio(puntos, real):
+    return np.mean(np.hypot(*(np.array(puntos) - real).T))
+
+
+def test_suaviza_el_ruido_de_un_tag_parado(app):
+    generador = np.random.default_rng(3)
+    medidas = [(1000 + dx, 500 + dy) for dx, dy in generador.normal(0, 30, size=(60, 2))]
+
+    # El residuo de trilateración indica al filtro cuánto ruido tiene cada medida
+    estimaciones = _recorrido(1, medidas, residuo=30.0)
+
+    filtradas = [(e.x, e.y) for e in estimaciones]
+    assert _salto_medio(filtradas[20:]) < _salto_medio(medidas[20:]) / 2
+    assert _error_medio(filtradas[20:], (1000, 500)) < _error_medio(medidas[20:], (1000, 500))
+
+
+def test_estima_la_velocidad(app):
+    # 50 cm/s en x, 20 cm/s en y
+    estimaciones = _recorrido(1, [(50 * i, 20 * i) for i in range(30)])
+
+    assert estimaciones[-1].vx == pytest.approx(50, abs=2)
+    assert estimaciones[-1].vy == pytest.approx(20, abs=2)
+    assert estimaciones[-1].x == pytest.approx(50 * 29, abs=5)
+
+
+def test_la_primera_medida_inicia_el_estado(app):
+    estimacion = filtro_kalman.actualizar(1, 300, 400, INICIO)
+
+    assert estimacion == (300, 400, 0.0, 0.0)
+    assert filtro_kalman.estimacion(1) == estimacion
+
+
+def test_residuo_alto_corrige_menos(app):
+    for tag_id, residuo in ((1, None), (2, 200.0)):
+        _recorrido(tag_id, [(0, 0)] * 10)
+        filtro_kalman.actualizar(tag_id, 100, 0, INICIO + timedelta(seconds=10), residuo)
+
+    assert filtro_kalman.estimacion(2).x < filtro_kalman.estimacion(1).x
+
+
+def test_estado_por_tag_y_reinicio_tras_un_silencio(app):
+    _recorrido(1, [(0, 0)] * 5)
+    _recorrido(2, [(800, 800)] * 5)
+    assert filtro_kalman.estimacion(1).x == pytest.approx(0)
+    assert filtro_kalman.estimacion(2).x == pytest.approx(800)
+
+    silencio = INICIO + timedelta(seconds=5 + filtro_kalman.MAX_INTERVALO_S)
+    assert filtro_kalman.actualizar(1, 600, 0, silencio).x == 600
+
+
+def test_olvidar_y_limpiar(app):
+    _recorrido(1, [(0, 0)])
+    _recorrido(2, [(0, 0)])
+
+    filtro_kalman.olvidar(1)
+    assert filtro_kalman.estimacion(1) is None
+    assert filtro_kalman.estimacion(2) is not None
+
+    filtro_kalman.limpiar()
+    assert filtro_kalman.estimacion(2) is None
+
+
+@pytest.mark.parametrize('activado', [False, True])
+def test_ingesta_segun_la_configuracion(client, taller, monkeypatch, activado):
+    monkeypatch.setitem(client.application.config, 'FILTRO_KALMAN', activado)
+
+    client.post('/api/distancias/registrar', json=reporte('T0001'))
+
+    posicion = Posicion.query.filter_by(tag_id=1).one()
+    assert (posicion.vx is not None) == activado
+    assert (filtro_kalman.estimacion(1) is not None) == activado
@@ -0,0 +1,90 @@
+from models.posicion import Posicion
+from services import formato_binario
+import pytest
+
+ANCHORS = [(0x5BA3, 2.0), (0x2219, 4.0), (0x234B, 4.0)]
+
+
+def test_trama_con_el_formato_documentado():
+    trama = formato_binario.codificar('T0001', ANCHORS, secuencia=0x1234)
+
+    assert len(trama) == 14 + 4 * 3
+    assert trama[:4] == bytes([1, 3, 0x34, 0x12])
+    assert trama[4:14] == b'T0001\0\0\0\0\0'
+    # Dirección corta y distancia en mm, little-endian
+    assert trama[14:18] == bytes([0xA3, 0x5B, 0xD0, 0x07])
+
+
+def test_ida_y_vuelta():
+    reporte = formato_binario.decodificar(formato_binario.codificar('T0001', ANCHORS, secuencia=7))
+
+    assert reporte == {
+        'tag': 'T0001',
+        'secuencia': 7,
+        'anchors': [{'shortAddres': '5BA3', 'distancia': 2.0},
+                    {'shortAddres': '2219', 'distancia': 4.0},
+                    {'shortAddres': '234B', 'distancia': 4.0}]
+    }
+
+
+def test_varias_tramas():
+    datos = formato_binario.codificar('T0001', ANCHORS, 1) + formato_binario.codificar('T0002', ANCHORS[:2], 2)
+
+    reportes = formato_binario.decodificar_varios(datos)
+
+    assert [(r['tag'], r['secuencia'], len(r['anchors'])) for r in reportes] == [('T0001', 1, 3), ('T0002', 2, 2)]
+    with pytest.raises(ValueError):
+        formato_binario.decodificar(datos)
+
+
+def test_codigo_de_mas_de_10_bytes():
+    formato_binario.codificar('T123456789', ANCHORS)
+    with pytest.raises(ValueError):
+        formato_binario.codificar('T1234567890', ANCHORS)
+
+
+def test_distancia_fuera_de_rango_se_satura():
+    reporte = formato_binario.decodificar(formato_binario.codificar('T0001', [(0x5BA3, 70.0)]))
+
+    assert reporte['anchors'][0]['distancia'] == 65.535
+
+
+@pytest.mark.parametrize('datos', [
+    b'',
+    bytes([1, 3, 0, 0]) + b'T0001',                                         # cabecera incompleta
+    formato_binario.codificar('T0001', ANCHORS)[:-1],                       # falta el último par
+    bytes([2]) + formato_binario.codificar('T0001', ANCHORS)[1:],           # otra versión
+    bytes([1, formato_binario.MAX_ANCHORS + 1]) + bytes(12),                # demasiados anchors
+])
+def test_tramas_no_validas(datos):
+    with pytest.raises(ValueError):
+        formato_binario.decodificar(datos)
+
+
+def test_es_binario():
+    assert formato_binario.es_binario(formato_binario.codificar('T0001', ANCHORS))
+    assert not formato_binario.es_binario(b'{"tag": "T0001"}')
+    assert not formato_binario.es_binario(b'[]')
+
+
+def test_registrar_por_content_type(client, taller):
+    respuesta = client.post('/api/distancias/registrar', data=formato_binario.codificar('T0001', ANCHORS),
+                            content_type=formato_binario.CONTENT_TYPE)
+
+    assert respuesta.status_code in (200, 201)
+    assert Posicion.query.filter_by(tag_id=1).count() == 1
+
+
+def test_registrar_lote_binario(client, taller):
+    datos = formato_binario.codificar('T0001', ANCHORS) + formato_binario.codificar('T0002', ANCHORS)
+
+    respuesta = client.post('/api/distancias/registrar-lote', data=datos, content_type='application/octet-stream')
+
+    assert respuesta.get_json()['procesados'] == 2
+
+
+def test_registrar_trama_no_valida(client, taller):
+    respuesta = client.post('/api/distancias/registrar', data=b'\x01\x03',
+                            content_type=formato_binario.CONTENT_TYPE)
+
+    assert respuesta.status_code == 400
@@ -0,0 +1,101 @@
+from datetime import datetime, timedelta
+from extensions import db
+from models.alerta import Alerta
+from models.vehiculo import Vehiculo
+from models.zona import Zona
+from services import geocercas
+from tests.conftest import POLIGONO
+import pytest
+
+COALESCENCIA_S = 300
+INICIO = datetime(2026, 1, 1, 12, 0, 0)
+
+
+@pytest.fixture
+def zonas(taller):
+    db.session.get(Zona, 1).poligono = POLIGONO
+    db.session.add(Zona(nombre='Zona 2', tipo='espera', taller_id=1, poligono=[[250, 0], [500, 0], [500, 250], [250, 250]]))
+    db.session.commit()
+
+
+def _evaluar(zona_id, segundos, tag_id=1, confirmar=True):
+    """Evalúa una posición del tag como un lote que hace commit; devuelve la alerta o None."""
+    cambios = {}
+    alerta = geocercas.evaluar(tag_id, 1, zona_id, INICIO + timedelta(seconds=segundos), COALESCENCIA_S, cambios)
+    if confirmar:
+        db.session.commit()
+        geocercas.confirmar(cambios)
+    return alerta
+
+
+def test_salida_de_las_zonas_alerta(zonas):
+    assert _evaluar(1, 0) is None
+    assert _evaluar(1, 10) is None
+
+    alerta = _evaluar(None, 20)
+
+    assert alerta is not None and alerta.tipo == 'fuera_de_area'
+    assert alerta.timestamp == INICIO + timedelta(seconds=20)
+    # Sigue fuera: no es una transición
+    assert _evaluar(None, 30) is None
+
+
+def test_infraccion_agrupada_queda_pendiente(zonas):
+    _evaluar(1, 0)
+    assert _evaluar(None, 10) is not None
+
+    # Oscila sobre el borde dentro del intervalo: no se repite la alerta
+    assert _evaluar(1, 20) is None
+    assert _evaluar(None, 30) is None
+    assert _evaluar(None, 10 + COALESCENCIA_S - 1) is None
+
+    # Al vencer el intervalo con el tag aún fuera se genera la alerta pendiente
+    assert _evaluar(None, 10 + COALESCENCIA_S) is not None
+    assert Alerta.query.filter_by(tipo='fuera_de_area').count() == 2
+
+
+def test_infraccion_pendiente_se_descarta_al_volver(zonas):
+    _evaluar(1, 0)
+    _evaluar(None, 10)
+    _evaluar(1, 20)
+    _evaluar(None, 30)
+    _evaluar(1, 40)
+
+    assert _evaluar(1, 10 + COALESCENCIA_S) is None
+    assert Alerta.query.filter_by(tipo='fuera_de_area').count() == 1
+
+
+def test_lote_deshecho_no_cambia_el_estado(zonas):
+    _evaluar(1, 0)
+    assert _evaluar(None, 10, confirmar=False) is not None
+    db.session.rollback()
+
+    # La misma transición se vuelve a evaluar con la posición siguiente
+    assert _evaluar(None, 20) is not None
+    assert Alerta.query.filter_by(tipo='fuera_de_area').count() == 1
+
+
+def test_cambios_del_lote_se_encadenan(zonas):
+    # Varias posiciones del mismo tag en un lote usan el estado anotado por las anteriores
+    cambios = {}
+    geocercas.evaluar(1, 1, 1, INICIO, COALESCENCIA_S, cambios)
+    primera = geocercas.evaluar(1, 1, None, INICIO + timedelta(seconds=1), COALESCENCIA_S, cambios)
+    segunda = geocercas.evaluar(1, 1, None, INICIO + timedelta(seconds=2), COALESCENCIA_S, cambios)
+
+    assert primera is not None and segunda is None
+
+
+def test_zona_no_permitida(zonas):
+    db.session.add(Vehiculo(matricula='0000AAA', bastidor='B1', referencia='R1', tag_id=1, zonas_permitidas=[1]))
+    db.session.commit()
+
+    _evaluar(1, 0)
+    alerta = _evaluar(2, 10)
+
+    assert alerta is not None and alerta.vehiculo_id == 1
+    assert _evaluar(1, 20) is None
+
+
+def test_sin_poligonos_no_se_evalua(taller):
+    assert _evaluar(1, 0) is None
+    assert _evaluar(None, 10) is None
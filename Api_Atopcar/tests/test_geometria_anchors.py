@@ -0,0 +1,59 @@
+from services import geometria_anchors
+from services.trilateracion import multilaterar
+from tests.conftest import reporte
+from types import SimpleNamespace
+import pytest
+
+
+def _anchors(*coordenadas):
+    return [SimpleNamespace(id=i, x=x, y=y) for i, (x, y) in enumerate(coordenadas, start=1)]
+
+
+@pytest.mark.parametrize('distancias', [(200, 400, 400), (350, 120, 480), (0, 500, 500)])
+def test_resolver_equivale_a_multilaterar(app, distancias):
+    anchors = _anchors((0, 0), (500, 0), (0, 500))
+
+    assert geometria_anchors.resolver(anchors, distancias) == multilaterar([(a.x, a.y) for a in anchors], distancias)
+
+
+def test_trio_alineado(app):
+    anchors = _anchors((0, 0), (100, 0), (300, 0))
+
+    assert geometria_anchors.obtener(anchors).degenerada
+    assert geometria_anchors.resolver(anchors, (100, 50, 200)) == multilaterar([(0, 0), (100, 0), (300, 0)],
+                                                                              (100, 50, 200))
+
+
+def test_la_geometria_se_reutiliza(app):
+    anchors = _anchors((0, 0), (500, 0), (0, 500))
+
+    geometria = geometria_anchors.obtener(anchors)
+    # Mientras no se invalide, las coordenadas guardadas son las que cuentan
+    anchors[1].x = 900
+    assert geometria_anchors.obtener(anchors) is geometria
+
+    geometria_anchors.invalidar(3)
+    assert geometria_anchors.obtener(anchors) is not geometria
+    assert geometria_anchors.obtener(anchors).coordenadas[1] == (900, 0)
+
+
+def test_invalidar_solo_los_trios_del_anchor(app):
+    a, b, c, d = [SimpleNamespace(id=i, x=x, y=y) for i, (x, y) in
+                  enumerate([(0, 0), (500, 0), (0, 500), (500, 500)], start=1)]
+    geometria_anchors.obtener([a, b, c])
+    geometria_anchors.obtener([b, c, d])
+
+    geometria_anchors.invalidar(1)
+
+    assert set(geometria_anchors._cache) == {(2, 3, 4)}
+
+
+def test_mover_un_anchor_invalida_su_geometria(client, taller):
+    antes = client.post('/api/distancias/registrar', json=reporte('T0001', (2.0, 4.0, 4.0))).get_json()['posicion']
+
+    # Se desplaza todo el trío 100 cm en x: la misma medida debe quedar 100 cm más a la derecha
+    for anchor_id, x in ((1, 100), (2, 600), (3, 100)):
+        assert client.put(f'/api/anchors/{anchor_id}', json={'x': x}).status_code == 200
+    despues = client.post('/api/distancias/registrar', json=reporte('T0002', (2.0, 4.0, 4.0))).get_json()['posicion']
+
+    assert (despues['x'], despues['y']) == (antes['x'] + 100, antes['y'])
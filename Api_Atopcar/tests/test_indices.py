@@ -0,0 +1,21 @@
+from extensions import db
+from models.alerta import Alerta
+from models.posicion import Posicion
+import os
+import runpy
+
+SCRIPT = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'benchmarks', 'comprobar_indices.py')
+
+
+def test_consultas_frecuentes_usan_indices(taller, capsys):
+    for i in range(20):
+        db.session.add(Posicion(tag_id=1 + i % 3, x=i, y=i, zona_id=1))
+        db.session.add(Alerta(tag_id=1, tipo='otros', descripcion=f'Alerta {i}', leido=i % 2 == 0))
+    db.session.commit()
+
+    # Termina con SystemExit(1) si alguna consulta recorre la tabla completa
+    runpy.run_path(SCRIPT, run_name='__main__')
+
+    salida = capsys.readouterr().out
+    assert 'FALLO' not in salida
+    assert salida.count('OK') >= 8
@@ -0,0 +1,62 @@
+from datetime import datetime, timedelta
+from models.posicion import Posicion
+from services.ingesta import MAX_OFFSET_MS, procesar_lote
+from tests.conftest import reporte
+
+
+def _lote(client, reportes):
+    respuesta = client.post('/api/distancias/registrar-lote', json=reportes)
+    assert respuesta.status_code == 200
+    return respuesta.get_json()['resultados']
+
+
+def test_offset_ms_fija_el_instante_de_cada_medida(client, taller):
+    antes = datetime.utcnow()
+    resultados = _lote(client, [
+        reporte('T0001', (2.0, 4.0, 4.0), offset_ms=0),
+        reporte('T0001', (4.0, 2.0, 5.0), offset_ms=5000),
+    ])
+    despues = datetime.utcnow()
+
+    reciente, atrasada = (datetime.fromisoformat(r['posicion']['timestamp']) for r in resultados)
+    assert antes <= reciente <= despues
+    assert reciente - atrasada >= timedelta(milliseconds=5000)
+    # La medida más reciente es la última posición del tag aunque llegue antes en el lote
+    assert client.get('/api/posiciones/tag/1/ultima').get_json()['id'] == resultados[0]['posicion']['id']
+
+
+def test_posiciones_se_guardan_en_orden_cronologico(client, taller):
+    _lote(client, [
+        reporte('T0001', (2.0, 4.0, 4.0), offset_ms=1000),
+        reporte('T0001', (4.0, 2.0, 5.0), offset_ms=3000),
+        reporte('T0001', (4.0, 5.0, 2.0), offset_ms=2000),
+    ])
+
+    posiciones = Posicion.query.filter_by(tag_id=1).order_by(Posicion.id).all()
+    assert [p.timestamp for p in posiciones] == sorted(p.timestamp for p in posiciones)
+
+
+def test_hora_de_recepcion_del_modo_diferido(app, taller):
+    recibido = datetime(2026, 1, 1, 12, 0, 0)
+
+    resultados = procesar_lote([reporte('T0001', offset_ms=1500)], [recibido])
+
+    assert resultados[0]['posicion']['timestamp'] == (recibido - timedelta(milliseconds=1500)).isoformat()
+
+
+def test_offset_ms_no_valido(client, taller):
+    resultados = _lote(client, [
+        reporte('T0001', offset_ms=-1),
+        reporte('T0001', offset_ms=MAX_OFFSET_MS + 1),
+        reporte('T0001', offset_ms='100'),
+        reporte('T0002'),
+    ])
+
+    assert [r['estado'] for r in resultados[:3]] == [400, 400, 400]
+    assert 'error' not in resultados[3]
+
+
+def test_tag_o_anchor_desconocido(client, taller):
+    resultados = _lote(client, [reporte('NOEXISTE'), reporte('T0001', anchors=('5BA3', '2219', 'FFFF'))])
+
+    assert [r['estado'] for r in resultados] == [404, 404]
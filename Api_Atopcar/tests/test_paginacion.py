@@ -0,0 +1,86 @@
+from datetime import datetime, timedelta
+from extensions import db
+from models.posicion import Posicion
+from models.tag import Tag
+
+
+def _recorrer(client, url, limite, **filtros):
+    """Pide todas las páginas de un listado y devuelve (ids en orden, número de páginas)."""
+    ids, paginas, cursor = [], 0, None
+    while True:
+        parametros = dict(filtros, limit=limite)
+        if cursor:
+            parametros['cursor'] = cursor
+        respuesta = client.get(url, query_string=parametros)
+        assert respuesta.status_code == 200
+        datos = respuesta.get_json()
+        ids += [item['id'] for item in datos['items']]
+        paginas += 1
+        cursor = datos['next_cursor']
+        if cursor is None:
+            return ids, paginas
+
+
+def test_paginas_por_id(client, taller):
+    for i in range(4, 11):
+        db.session.add(Tag(codigo=f'T{i:04d}', mac=f'00:00:00:00:02:{i:02d}'))
+    db.session.commit()
+
+    ids, paginas = _recorrer(client, '/api/tags/', 3)
+
+    assert ids == list(range(1, 11))
+    assert paginas == 4
+
+
+def test_ultima_pagina_completa_sin_cursor(client, taller):
+    datos = client.get('/api/tags/?limit=3').get_json()
+
+    assert len(datos['items']) == 3
+    assert datos['next_cursor'] is None
+
+
+def test_posiciones_con_timestamp_repetido(client, taller):
+    # Varias posiciones con el mismo timestamp: el id desempata y ninguna se repite ni se pierde
+    base = datetime(2026, 1, 1, 12, 0, 0)
+    for i in range(9):
+        posicion = Posicion(tag_id=1, x=i, y=i, zona_id=1)
+        posicion.timestamp = base + timedelta(seconds=i // 3)
+        db.session.add(posicion)
+    db.session.commit()
+
+    ids, paginas = _recorrer(client, '/api/posiciones/', 2)
+
+    esperados = [p.id for p in Posicion.query.order_by(Posicion.timestamp.desc(), Posicion.id.desc())]
+    assert ids == esperados
+    assert len(set(ids)) == 9
+    assert paginas == 5
+
+
+def test_filtros_se_mantienen_entre_paginas(client, taller):
+    for i in range(6):
+        db.session.add(Posicion(tag_id=1 + i % 2, x=i, y=i, zona_id=1))
+    db.session.commit()
+
+    ids, _ = _recorrer(client, '/api/posiciones/', 2, tag_id=2)
+
+    assert sorted(ids) == [p.id for p in Posicion.query.filter_by(tag_id=2).order_by(Posicion.id)]
+
+
+def test_parametros_no_validos(client, taller):
+    assert client.get('/api/tags/?limit=0').status_code == 400
+    assert client.get('/api/tags/?limit=abc').status_code == 400
+    assert client.get('/api/tags/?cursor=no-es-un-cursor').status_code == 400
+    # Un cursor de un listado con otra clave de ordenación tampoco vale
+    cursor_tags = client.get('/api/tags/?limit=1').get_json()['next_cursor']
+    assert client.get(f'/api/posiciones/?cursor={cursor_tags}').status_code == 400
+
+
+def test_limite_maximo(app, client, taller):
+    app.config['PAGINACION_LIMITE_MAX'] = 2
+    try:
+        datos = client.get('/api/tags/?limit=50').get_json()
+    finally:
+        app.config['PAGINACION_LIMITE_MAX'] = 1000
+
+    assert len(datos['items']) == 2
+    assert datos['next_cursor'] is not None
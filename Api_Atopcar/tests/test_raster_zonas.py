@@ -0,0 +1,81 @@
+from extensions import db
+from models.zona import Zona
+from services import indice_zonas, raster_zonas
+from tests.conftest import POLIGONO
+import os
+import pytest
+
+# Triángulo que se solapa con la zona 1 y rectángulo pequeño dentro de ella (gana en el solape)
+TRIANGULO = [[200, 100], [600, 100], [400, 450]]
+PEQUENA = [[50, 50], [120, 50], [120, 90], [50, 90]]
+
+
+@pytest.fixture
+def raster(app, taller, tmp_path, monkeypatch):
+    monkeypatch.setitem(app.config, 'ZONAS_RASTER', True)
+    monkeypatch.setitem(app.config, 'ZONAS_RASTER_DIR', str(tmp_path))
+    db.session.get(Zona, 1).poligono = POLIGONO
+    db.session.add(Zona(nombre='Triángulo', tipo='trabajo', taller_id=1, poligono=TRIANGULO))
+    db.session.add(Zona(nombre='Pequeña', tipo='lavado', taller_id=1, poligono=PEQUENA))
+    db.session.commit()
+    return tmp_path
+
+
+def _raster(app):
+    return raster_zonas.obtener(1, indice_zonas.indice(1), app.config['ZONAS_RASTER_RESOLUCION_CM'],
+                                app.config['ZONAS_RASTER_DIR'])
+
+
+def test_coincide_con_el_indice_de_poligonos(app, raster):
+    resolucion = app.config['ZONAS_RASTER_RESOLUCION_CM']
+    # Centros de celda: el raster clasifica cada celda por su centro
+    puntos = [(x + resolucion / 2, y + resolucion / 2) for x in range(-40, 700, resolucion)
+              for y in range(-40, 600, resolucion)]
+
+    por_raster = [indice_zonas.zona_de(1, x, y) for x, y in puntos]
+    por_poligono = [indice_zonas.clasificar(1, x, y) for x, y in puntos]
+
+    assert por_raster == por_poligono
+    assert set(por_raster) == {None, 1, 2, 3}
+
+
+def test_se_guarda_en_disco_y_se_reutiliza(app, raster):
+    primero = _raster(app)
+    ficheros = os.listdir(raster)
+    assert len(ficheros) == 1 and ficheros[0].startswith('taller_1_')
+
+    # Otro proceso: sin raster en memoria se abre el fichero existente
+    raster_zonas._rasters.clear()
+    segundo = _raster(app)
+    assert segundo is not primero
+    assert (segundo.celdas == primero.celdas).all()
+    assert os.listdir(raster) == ficheros
+
+
+def test_se_regenera_al_cambiar_la_geometria(client, raster):
+    assert indice_zonas.zona_de(1, 400, 300) == 2
+    anterior = os.listdir(raster)
+
+    respuesta = client.put('/api/zonas/2', json={'poligono': [[300, 0], [700, 0], [700, 200], [300, 200]]})
+    assert respuesta.status_code == 200
+
+    assert indice_zonas.zona_de(1, 400, 300) is None
+    assert indice_zonas.zona_de(1, 650, 150) == 2
+    nuevos = os.listdir(raster)
+    assert len(nuevos) == 1 and nuevos != anterior
+
+
+def test_sin_cambios_se_conserva_el_raster(app, raster):
+    primero = _raster(app)
+
+    # El índice caduca, pero si las zonas son las mismas se reutiliza el mismo objeto
+    indice_zonas._indices[1] = (indice_zonas._indices[1][0], 0.0)
+    assert _raster(app) is primero
+
+
+def test_demasiado_grande_usa_los_poligonos(app, raster, monkeypatch):
+    monkeypatch.setattr(raster_zonas, 'MAX_CELDAS', 10)
+
+    assert _raster(app).celdas is None
+    assert indice_zonas.zona_de(1, 100, 70) == 3
+    assert os.listdir(raster) == []
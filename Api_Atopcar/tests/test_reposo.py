@@ -0,0 +1,67 @@
+from datetime import datetime, timedelta
+from models.posicion import Posicion
+from services import reposo
+from services.ingesta import procesar_lote
+from tests.conftest import reporte
+
+INICIO = datetime(2026, 1, 1, 8, 0, 0)
+
+
+def _en(segundos):
+    return INICIO + timedelta(seconds=segundos)
+
+
+def test_dentro_del_radio_no_se_guarda(app):
+    assert reposo.debe_guardar(1, 100, 100, _en(0), 30, 300)
+    assert not reposo.debe_guardar(1, 120, 110, _en(5), 30, 300)
+    assert not reposo.debe_guardar(1, 100, 130, _en(10), 30, 300)   # justo en el borde
+    assert reposo.debe_guardar(1, 100, 131, _en(15), 30, 300)
+
+
+def test_la_referencia_es_la_ultima_guardada(app):
+    # Una deriva lenta acaba guardándose: la referencia no se mueve con las suprimidas
+    reposo.debe_guardar(1, 0, 0, _en(0), 30, 300)
+    guardadas = [reposo.debe_guardar(1, 10 * i, 0, _en(i), 30, 300) for i in range(1, 7)]
+
+    assert guardadas == [False, False, False, True, False, False]
+
+
+def test_latido(app):
+    assert reposo.debe_guardar(1, 100, 100, _en(0), 30, 300)
+    assert not reposo.debe_guardar(1, 100, 100, _en(299), 30, 300)
+    assert reposo.debe_guardar(1, 100, 100, _en(300), 30, 300)
+    assert not reposo.debe_guardar(1, 100, 100, _en(301), 30, 300)
+
+
+def test_en_reposo_desde(app):
+    reposo.debe_guardar(1, 100, 100, _en(0), 30, 300)
+    reposo.debe_guardar(1, 105, 100, _en(300), 30, 300)       # latido: sigue parado
+    assert reposo.en_reposo_desde(1) == _en(0)
+
+    reposo.debe_guardar(1, 500, 100, _en(310), 30, 300)       # se mueve
+    assert reposo.en_reposo_desde(1) == _en(310)
+    assert reposo.en_reposo_desde(2) is None
+
+
+def test_radio_cero_guarda_todo(app):
+    assert all(reposo.debe_guardar(1, 100, 100, _en(i), 0, 0) for i in range(3))
+
+
+def test_olvidar(app):
+    reposo.debe_guardar(1, 100, 100, _en(0), 30, 300)
+    reposo.olvidar(1)
+
+    assert reposo.debe_guardar(1, 100, 100, _en(1), 30, 300)
+
+
+def test_ingesta_de_un_tag_parado(app, taller):
+    latido = app.config['POSICION_LATIDO_S']
+    # Con 2.1 m la posición se desplaza unos 6 cm, dentro del radio de reposo
+    medidas = [(0, (2.0, 4.0, 4.0)), (10, (2.1, 4.0, 4.0)), (20, (2.0, 4.0, 4.0)),
+               (latido, (2.1, 4.0, 4.0)), (latido + 10, (6.0, 4.0, 4.0))]
+
+    for segundos, distancias in medidas:
+        procesar_lote([reporte('T0001', distancias)], [_en(segundos)])
+
+    guardadas = Posicion.query.filter_by(tag_id=1).order_by(Posicion.timestamp).all()
+    assert [p.timestamp for p in guardadas] == [_en(0), _en(latido), _en(latido + 10)]
@@ -0,0 +1,115 @@
+from services import difusion, sondeo_posiciones
+from tests.conftest import reporte
+import json
+import time
+import pytest
+
+
+@pytest.fixture
+def stream(client, taller, monkeypatch):
+    """Abre GET /api/posiciones/stream y devuelve la respuesta; sin hilo de sondeo y con latidos cortos."""
+    monkeypatch.setitem(client.application.config, 'DIFUSION_SONDEO_S', 0)
+    monkeypatch.setitem(client.application.config, 'SSE_LATIDO_S', 0.05)
+    abiertas = []
+
+    def abrir(consulta=''):
+        respuesta = client.get(f'/api/posiciones/stream{consulta}', buffered=False)
+        abiertas.append(respuesta)
+        return respuesta, iter(respuesta.response)
+
+    yield abrir
+    for respuesta in abiertas:
+        respuesta.close()
+
+
+def _evento(trama):
+    lineas = trama.decode().strip().split('\n')
+    assert lineas[0] == 'event: posicion'
+    return json.loads(lineas[1][len('data: '):])
+
+
+def test_cabeceras_y_primer_mensaje(stream):
+    respuesta, tramas = stream()
+
+    assert respuesta.mimetype == 'text/event-stream'
+    assert respuesta.headers['Cache-Control'] == 'no-cache'
+    assert next(tramas) == b'retry: 3000\n\n'
+
+
+def test_recibe_las_posiciones_ingeridas(stream, client):
+    _, tramas = stream('?taller_id=1')
+    next(tramas)
+
+    client.post('/api/distancias/registrar', json=reporte('T0001'))
+
+    posicion = _evento(next(tramas))
+    assert (posicion['tag_id'], posicion['taller_id']) == (1, 1)
+
+
+def test_filtro_y_latido(stream, client):
+    _, tramas = stream('?tags=2')
+    next(tramas)
+
+    client.post('/api/distancias/registrar', json=reporte('T0001'))
+    assert next(tramas) == b': latido\n\n'
+
+    client.post('/api/distancias/registrar', json=reporte('T0002'))
+    assert _evento(next(tramas))['tag_id'] == 2
+
+
+def test_clientes_con_el_mismo_filtro_comparten_canal(stream):
+    stream('?zona_id=1')
+    stream('?zona_id=1')
+    stream('?zona_id=2')
+
+    assert difusion.estadisticas() == {'canales': 2, 'suscriptores': 3}
+
+
+def test_al_cerrar_se_cancela_la_suscripcion(stream):
+    respuesta, tramas = stream()
+    next(tramas)
+
+    respuesta.close()
+
+    assert not difusion.hay_suscriptores()
+
+
+def test_tags_no_validos(client, taller):
+    assert client.get('/api/posiciones/stream?tags=1,x').status_code == 400
+
+
+def test_sondeo_solo_con_suscriptores(app, monkeypatch):
+    lecturas = []
+    monkeypatch.setattr(sondeo_posiciones, '_sondear', lambda: lecturas.append(time.monotonic()) or [])
+    monkeypatch.setitem(app.config, 'DIFUSION_SONDEO_S', 0.01)
+
+    sondeo_posiciones.iniciar(app)
+    try:
+        time.sleep(0.1)
+        assert lecturas == []
+
+        canal = difusion.suscribir(difusion.filtro())
+        time.sleep(0.1)
+        assert lecturas
+
+        difusion.cancelar(canal)
+        time.sleep(0.05)
+        antes = len(lecturas)
+        time.sleep(0.1)
+        assert len(lecturas) == antes
+    finally:
+        sondeo_posiciones.detener()
+
+
+def test_sondeo_publica_lo_que_cambia(app, taller):
+    client = app.test_client()
+    client.post('/api/distancias/registrar', json=reporte('T0001'))
+
+    # La primera lectura solo toma nota del estado
+    assert sondeo_posiciones._sondear() == []
+
+    client.post('/api/distancias/registrar', json=reporte('T0002'))
+    client.post('/api/distancias/registrar', json=reporte('T0001', (2.0, 4.0, 4.0)))
+
+    assert [posicion['tag_id'] for posicion in sondeo_posiciones._sondear()] == [2]
+    assert sondeo_posiciones._sondear() == []
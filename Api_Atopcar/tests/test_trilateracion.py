@@ -0,0 +1,73 @@
+from services.trilateracion import multilaterar
+from tests.conftest import reporte
+import math
+import pytest
+
+ANCHORS = [(0, 0), (500, 0), (0, 500), (500, 500), (250, 800)]
+
+
+def _distancias(punto, anchors=ANCHORS):
+    return [math.dist(punto, anchor) for anchor in anchors]
+
+
+@pytest.mark.parametrize('n', [3, 4, 5])
+def test_distancias_exactas(n):
+    x, y, residuo = multilaterar(ANCHORS[:n], _distancias((120, 340), ANCHORS[:n]))
+
+    assert (x, y) == (120, 340)
+    assert residuo == pytest.approx(0, abs=0.01)
+
+
+def test_mas_anchors_reducen_el_error():
+    # Mismo error en la distancia al segundo anchor: con más anchors pesa menos
+    errores = []
+    for n in (3, 5):
+        distancias = _distancias((200, 150), ANCHORS[:n])
+        distancias[1] += 30
+        x, y, _ = multilaterar(ANCHORS[:n], distancias)
+        errores.append(math.dist((x, y), (200, 150)))
+
+    assert errores[1] < errores[0]
+
+
+def test_residuo_es_el_error_cuadratico_medio():
+    distancias = _distancias((200, 150), ANCHORS[:4])
+    distancias[2] += 40
+
+    x, y, residuo = multilaterar(ANCHORS[:4], distancias)
+
+    esperado = math.sqrt(sum((math.dist((x, y), anchor) - d) ** 2
+                             for anchor, d in zip(ANCHORS[:4], distancias)) / 4)
+    assert residuo > 0
+    # (x, y) se redondean a enteros después de calcular el residuo
+    assert residuo == pytest.approx(esperado, abs=1.5)
+
+
+def test_anchors_alineados_usan_la_media_ponderada():
+    alineados = [(0, 0), (100, 0), (300, 0)]
+
+    x, y, _ = multilaterar(alineados, [100, 50, 200])
+
+    # Pesos 1/d: 1/100, 1/50, 1/200
+    pesos = [1 / 100, 1 / 50, 1 / 200]
+    assert x == round(sum(p * a[0] for p, a in zip(pesos, alineados)) / sum(pesos))
+    assert y == 0
+
+
+def test_distancia_nula_no_divide_por_cero():
+    x, y, residuo = multilaterar(ANCHORS[:3], [0, 500, 500])
+
+    assert math.isfinite(residuo)
+    assert math.dist((x, y), (0, 0)) < 5
+
+
+def test_ingesta_guarda_el_residuo_con_4_anchors(client, taller):
+    distancias = [d / 100 for d in _distancias((100, 100), [(0, 0), (500, 0), (0, 500), (500, 500)])]
+    distancias[3] += 0.5
+
+    respuesta = client.post('/api/distancias/registrar',
+                            json=reporte('T0001', distancias, ('5BA3', '2219', '234B', 'AAAA')))
+
+    posicion = respuesta.get_json()['posicion']
+    assert posicion['residuo'] > 0
+    assert math.dist((posicion['x'], posicion['y']), (100, 100)) < 50
@@ -0,0 +1,51 @@
+from extensions import db
+from models.anchor import Anchor
+from services import ingesta
+from services.ingesta import LOTE_MINIMO_VECTORIZADO
+from services.trilateracion import multilaterar, trilaterar_lote
+import numpy as np
+import pytest
+
+
+def _filas(n, semilla=7):
+    generador = np.random.default_rng(semilla)
+    coordenadas = generador.uniform(0, 2000, size=(n, 3, 2))
+    puntos = generador.uniform(0, 2000, size=(n, 2))
+    distancias = np.linalg.norm(coordenadas - puntos[:, None, :], axis=2) + generador.normal(0, 20, size=(n, 3))
+    return coordenadas, np.abs(distancias)
+
+
+def test_coincide_con_multilaterar():
+    coordenadas, distancias = _filas(200)
+
+    posiciones, residuos = trilaterar_lote(coordenadas, distancias)
+
+    for fila in range(200):
+        x, y, residuo = multilaterar(coordenadas[fila], distancias[fila])
+        assert posiciones[fila] == pytest.approx((x, y), abs=0.5)
+        assert round(float(residuos[fila]), 2) == pytest.approx(residuo, abs=0.6)
+
+
+def test_filas_alineadas_usan_el_metodo_alternativo():
+    coordenadas, distancias = _filas(5)
+    coordenadas[2] = [(0, 0), (100, 100), (300, 300)]
+    distancias[2] = [100, 50, 200]
+
+    posiciones, residuos = trilaterar_lote(coordenadas, distancias)
+
+    x, y, _ = multilaterar(coordenadas[2], distancias[2])
+    assert posiciones[2] == pytest.approx((x, y), abs=0.5)
+    assert np.isfinite(posiciones).all() and np.isfinite(residuos).all()
+    # Las demás filas no se ven afectadas
+    assert posiciones[0] == pytest.approx(multilaterar(coordenadas[0], distancias[0])[:2], abs=0.5)
+
+
+def test_ingesta_da_lo_mismo_por_encima_y_por_debajo_del_umbral(app, taller):
+    anchors = [db.session.get(Anchor, anchor_id) for anchor_id in (1, 2, 3)]
+    pendientes = [list(zip(anchors, (200 + i * 5, 400, 400 - i * 5))) for i in range(LOTE_MINIMO_VECTORIZADO)]
+
+    vectorizadas = ingesta._calcular_posiciones(pendientes)
+    una_a_una = [ingesta._calcular_posiciones([situados])[0] for situados in pendientes]
+
+    assert [s[:2] for s in vectorizadas] == [s[:2] for s in una_a_una]
+    assert [s[2] for s in vectorizadas] == pytest.approx([s[2] for s in una_a_una], abs=0.01)
@@ -0,0 +1,95 @@
+from datetime import datetime, timedelta
+from extensions import db
+from flask_migrate import stamp, upgrade
+from models.posicion import Posicion
+from models.posicion_ultima import PosicionUltima
+from services import ultimas_posiciones
+from tests.conftest import reporte
+import pytest
+
+INICIO = datetime(2026, 1, 1, 12, 0, 0)
+
+
+@pytest.fixture
+def historico(taller):
+    """Posiciones de los tags 1 y 2 escritas antes de existir posiciones_ultimas (sin filas)."""
+    for tag_id, x, segundos in [(1, 10, 0), (1, 20, 10), (1, 15, 5), (2, 30, 0)]:
+        posicion = Posicion(tag_id=tag_id, x=x, y=x, zona_id=1)
+        posicion.timestamp = INICIO + timedelta(seconds=segundos)
+        db.session.add(posicion)
+    db.session.commit()
+
+
+def test_rellena_desde_el_historico(client, historico):
+    ultimas_posiciones.rellenar()
+    respuesta = client.get('/api/posiciones/tag/1/ultima')
+
+    assert respuesta.status_code == 200
+    assert respuesta.get_json()['x'] == 20
+    assert {fila.tag_id: fila.x for fila in PosicionUltima.query} == {1: 20, 2: 30}
+    assert sorted(p['x'] for p in client.get('/api/posiciones/ultimas?taller_id=1').get_json()) == [20, 30]
+
+
+def test_las_consultas_no_rellenan(client, historico):
+    # El relleno se hace al arrancar o en la migración, nunca al consultar
+    assert client.get('/api/posiciones/tag/1/ultima').status_code == 404
+    assert client.get('/api/posiciones/ultimas').get_json() == []
+    assert PosicionUltima.query.count() == 0
+
+
+def test_tag_sin_posiciones(client, historico):
+    ultimas_posiciones.rellenar()
+    assert client.get('/api/posiciones/tag/3/ultima').status_code == 404
+    assert client.get('/api/posiciones/tag/99/ultima').status_code == 404
+
+
+def test_relleno_no_sustituye_filas_existentes(client, historico):
+    db.session.add(PosicionUltima(tag_id=1, x=99, y=99, zona_id=1, taller_id=1, timestamp=INICIO))
+    db.session.commit()
+    ultimas_posiciones.rellenar()
+
+    assert client.get('/api/posiciones/tag/1/ultima').get_json()['x'] == 99
+    assert client.get('/api/posiciones/tag/2/ultima').get_json()['x'] == 30
+
+
+def test_ingesta_actualiza_la_ultima(client, taller):
+    client.post('/api/distancias/registrar', json=reporte('T0001'))
+    primera = client.get('/api/posiciones/tag/1/ultima').get_json()
+
+    client.post('/api/distancias/registrar', json=reporte('T0001', (4.0, 2.0, 5.0)))
+    segunda = client.get('/api/posiciones/tag/1/ultima').get_json()
+
+    assert segunda['id'] != primera['id']
+    assert segunda['id'] == Posicion.query.order_by(Posicion.id.desc()).first().id
+    assert db.session.get(PosicionUltima, 1).posicion_id == segunda['id']
+
+
+def test_borrar_la_ultima_recalcula(client, historico):
+    ultimas_posiciones.rellenar()
+    ultima = Posicion.query.filter_by(tag_id=1, x=20).one()
+
+    assert client.delete(f'/api/posiciones/{ultima.id}').status_code == 204
+
+    # La anterior es más antigua que la fila borrada: se sustituye forzando
+    assert client.get('/api/posiciones/tag/1/ultima').get_json()['x'] == 15
+    db.session.expire_all()
+    assert db.session.get(PosicionUltima, 1).x == 15
+
+
+def test_memoria_no_retrocede(app, historico):
+    ultimas_posiciones.rellenar()
+    ultimas_posiciones.obtener(1)
+    antigua = PosicionUltima(tag_id=1, x=1, y=1, timestamp=INICIO - timedelta(hours=1)).to_dict()
+
+    ultimas_posiciones.actualizar([antigua])
+
+    assert ultimas_posiciones.obtener(1)['x'] == 20
+
+
+def test_migracion_rellena_la_tabla(app, historico):
+    # Base con todo el esquema salvo el relleno de posiciones_ultimas
+    stamp(revision='8b27e5c0d913')
+    upgrade(revision='9e4d1a6b3f05')
+
+    assert {fila.tag_id: (fila.x, fila.posicion_id is not None) for fila in PosicionUltima.query} == \
+        {1: (20, True), 2: (30, True)}
@@ -0,0 +1,159 @@
+from datetime import datetime, timedelta
+from extensions import db
+from models.distancia import Distancia
+from models.posicion_ultima import PosicionUltima
+from services import upsert
+from sqlalchemy.dialects import mysql, postgresql
+from types import SimpleNamespace
+import pytest
+import re
+
+INSTANTE = datetime(2026, 1, 1, 12, 0, 0)
+
+
+def _distancia(tag_id, dist):
+    return {'tag_id': tag_id, 'anchor1_id': 1, 'anchor1_dist': dist, 'anchor2_id': 2, 'anchor2_dist': dist,
+            'anchor3_id': 3, 'anchor3_dist': dist}
+
+
+def _fila(tag_id, x, instante):
+    return {'tag_id': tag_id, 'posicion_id': None, 'x': x, 'y': x, 'zona_id': 1, 'taller_id': 1,
+            'residuo': None, 'vx': None, 'vy': None, 'timestamp': instante}
+
+
+@pytest.fixture
+def sentencias(monkeypatch):
+    """Simula otro motor: get_bind devuelve su nombre y execute guarda las sentencias sin ejecutarlas."""
+    capturadas = []
+
+    def simular(dialecto, rowcount=1):
+        monkeypatch.setattr(db.session, 'get_bind', lambda: SimpleNamespace(dialect=SimpleNamespace(name=dialecto)))
+
+        def ejecutar(sentencia):
+            capturadas.append(sentencia)
+            return SimpleNamespace(lastrowid=7, rowcount=rowcount)
+
+        monkeypatch.setattr(db.session, 'execute', ejecutar)
+        return capturadas
+
+    return simular
+
+
+def test_distancias_una_fila_por_tag(taller):
+    ids = upsert.upsert_distancias([_distancia(1, 1.0), _distancia(2, 2.0)])
+    ids_segunda = upsert.upsert_distancias([_distancia(1, 3.0), _distancia(1, 4.0)])
+    db.session.commit()
+
+    assert ids_segunda == {1: ids[1]}
+    assert Distancia.query.count() == 2
+    assert Distancia.query.filter_by(tag_id=1).one().anchor1_dist == 4.0
+
+
+def test_solo_se_actualizan_las_columnas_indicadas(taller):
+    upsert.upsert_distancias([_distancia(1, 1.0)])
+    upsert.upsert_distancias([_distancia(1, 9.0)], ('anchor2_dist',))
+    db.session.commit()
+
+    distancia = Distancia.query.one()
+    assert (distancia.anchor1_dist, distancia.anchor2_dist) == (1.0, 9.0)
+
+
+def test_otros_motores_con_el_orm(taller, monkeypatch):
+    monkeypatch.setattr(db.session, 'get_bind', lambda: SimpleNamespace(dialect=SimpleNamespace(name='oracle')))
+
+    ids = upsert.upsert_distancias([_distancia(1, 1.0)])
+    assert upsert.upsert_distancias([_distancia(1, 2.0)]) == ids
+    assert upsert.upsert_distancia(_distancia(2, 1.0)) is True
+    assert upsert.upsert_distancia(_distancia(2, 2.0)) is False
+    db.session.commit()
+
+    assert Distancia.query.filter_by(tag_id=1).one().anchor1_dist == 2.0
+
+
+def test_mysql_distancias_devuelve_id(app, sentencias):
+    capturadas = sentencias('mysql')
+    assert upsert.upsert_distancias([_distancia(1, 1.0)]) == {1: 7}
+
+    sql = str(capturadas[0].compile(dialect=mysql.dialect()))
+    assert 'ON DUPLICATE KEY UPDATE' in sql
+    assert 'id = last_insert_id(distancias.id)' in sql
+
+
+@pytest.mark.parametrize('filas_afectadas, creada', [(1, True), (2, False)])
+def test_mysql_creada_segun_filas_afectadas(app, sentencias, filas_afectadas, creada):
+    sentencias('mysql', rowcount=filas_afectadas)
+
+    assert upsert.upsert_distancia(_distancia(1, 1.0)) is creada
+
+
+def test_post_crea_con_201_y_actualiza_con_200(client, taller):
+    cuerpo = {'tag_id': 1, 'anchor1_id': 1, 'anchor1_dist': 200}
+
+    creada = client.post('/api/distancias/', json=cuerpo)
+    actualizada = client.post('/api/distancias/', json=dict(cuerpo, anchor1_dist=300))
+
+    assert creada.status_code == 201
+    assert actualizada.status_code == 200
+    assert actualizada.get_json()['id'] == creada.get_json()['id']
+    assert actualizada.get_json()['anchor1_dist'] == 300
+
+
+def test_posicion_mas_antigua_no_sustituye(taller):
+    upsert.upsert_posiciones_ultimas([_fila(1, 10, INSTANTE)])
+    upsert.upsert_posiciones_ultimas([_fila(1, 20, INSTANTE - timedelta(seconds=5))])
+    db.session.commit()
+    assert db.session.get(PosicionUltima, 1).x == 10
+
+    upsert.upsert_posiciones_ultimas([_fila(1, 30, INSTANTE + timedelta(seconds=5))])
+    db.session.commit()
+    db.session.expire_all()
+    assert db.session.get(PosicionUltima, 1).x == 30
+
+
+def test_forzar_sustituye_aunque_sea_mas_antigua(taller):
+    upsert.upsert_posiciones_ultimas([_fila(1, 10, INSTANTE)])
+    upsert.upsert_posiciones_ultimas([_fila(1, 20, INSTANTE - timedelta(hours=1))], forzar=True)
+    db.session.commit()
+
+    assert db.session.get(PosicionUltima, 1).x == 20
+
+
+def test_posiciones_ultimas_con_el_orm(taller, monkeypatch):
+    monkeypatch.setattr(db.session, 'get_bind', lambda: SimpleNamespace(dialect=SimpleNamespace(name='oracle')))
+
+    upsert.upsert_posiciones_ultimas([_fila(1, 10, INSTANTE)])
+    upsert.upsert_posiciones_ultimas([_fila(1, 20, INSTANTE - timedelta(seconds=5))])
+    db.session.commit()
+
+    assert db.session.get(PosicionUltima, 1).x == 10
+
+
+def test_mysql_on_duplicate_key_con_guarda(app, sentencias):
+    capturadas = sentencias('mysql')
+    upsert.upsert_posiciones_ultimas([_fila(1, 10, INSTANTE)])
+
+    sql = str(capturadas[0].compile(dialect=mysql.dialect()))
+    asignadas = re.findall(r'(\w+) = if\(', sql.split('ON DUPLICATE KEY UPDATE')[1])
+    # timestamp se asigna el último: las asignaciones anteriores comparan con el valor previo
+    assert asignadas == list(upsert.COLUMNAS_POSICION_ULTIMA)
+    assert asignadas[-1] == 'timestamp'
+
+
+def test_mysql_forzar_sin_guarda(app, sentencias):
+    capturadas = sentencias('mysql')
+    upsert.upsert_posiciones_ultimas([_fila(1, 10, INSTANTE)], forzar=True)
+
+    sql = str(capturadas[0].compile(dialect=mysql.dialect()))
+    assert 'ON DUPLICATE KEY UPDATE' in sql
+    assert 'if(' not in sql
+
+
+def test_postgresql_on_conflict_con_guarda(app, sentencias):
+    capturadas = sentencias('postgresql')
+    upsert.upsert_posiciones_ultimas([_fila(1, 10, INSTANTE)])
+    upsert.upsert_posiciones_ultimas([_fila(1, 10, INSTANTE)], forzar=True)
+
+    guardada, forzada = (str(s.compile(dialect=postgresql.dialect())) for s in capturadas)
+    assert 'ON CONFLICT (tag_id) DO UPDATE' in guardada
+    assert 'WHERE posiciones_ultimas.timestamp IS NULL OR excluded.timestamp >= posiciones_ultimas.timestamp' in guardada
+    assert 'WHERE' not in forzada.split('DO UPDATE')[1]
@@ -0,0 +1,186 @@
+import asyncio
+import json
+import threading
+import pytest
+
+# El servidor WebSocket depende del paquete opcional websockets
+websockets = pytest.importorskip('websockets')
+import ws_server
+
+# Frames rápidos para que las pruebas no esperen
+FPS = 50
+
+
+class WebSocketFalso:
+    def __init__(self):
+        self.enviados = []
+
+    async def send(self, mensaje):
+        self.enviados.append(json.loads(mensaje))
+
+    def deltas(self):
+        return [m['posiciones'] for m in self.enviados if m['tipo'] == 'delta']
+
+
+def _posicion(tag_id, x, y=0, zona_id=1, taller_id=1, id=None):
+    return {'id': id or x, 'tag_id': tag_id, 'x': x, 'y': y, 'zona_id': zona_id, 'taller_id': taller_id}
+
+
+def _ejecutar(prueba):
+    """Ejecuta prueba(difusor, conectar) en un bucle asyncio nuevo."""
+    async def principal():
+        difusor = ws_server.Difusor(asyncio.get_running_loop(), FPS, 100)
+
+        def conectar(**suscripcion):
+            websocket = WebSocketFalso()
+            cliente = ws_server.Cliente(websocket, difusor)
+            difusor.clientes.add(cliente)
+            if suscripcion:
+                difusor.procesar(cliente, json.dumps(dict(suscripcion, accion='suscribir')))
+            return cliente, websocket
+
+        return await prueba(difusor, conectar)
+
+    return asyncio.run(principal())
+
+
+async def _frames(n=3):
+    await asyncio.sleep(n / FPS)
+
+
+def test_respuestas_a_los_mensajes():
+    async def prueba(difusor, conectar):
+        cliente, _ = conectar()
+        respuestas = [difusor.procesar(cliente, json.dumps(mensaje)) for mensaje in (
+            {'accion': 'suscribir', 'tags': [1, 2], 'zonas': [3]},
+            {'accion': 'cancelar', 'tags': [2]},
+            {'accion': 'frecuencia', 'fps': 5},
+        )]
+        errores = [difusor.procesar(cliente, mensaje) for mensaje in (
+            'no es json', '[1]', json.dumps({'accion': 'otra'}), json.dumps({'accion': 'suscribir', 'tags': ['1']}),
+            json.dumps({'accion': 'frecuencia', 'fps': 1000}),
+        )]
+        return respuestas, errores
+
+    respuestas, errores = _ejecutar(prueba)
+
+    assert respuestas[0] == {'tipo': 'suscripcion', 'tags': [1, 2], 'zonas': [3], 'talleres': [], 'fps': FPS}
+    assert respuestas[1]['tags'] == [1]
+    assert respuestas[2]['fps'] == 5
+    assert all(error['tipo'] == 'error' for error in errores)
+
+
+def test_delta_con_la_ultima_posicion_de_cada_tag():
+    async def prueba(difusor, conectar):
+        _, websocket = conectar(tags=[1, 2])
+        await _frames()
+
+        difusor.recibir([_posicion(1, 100), _posicion(2, 200), _posicion(1, 110), _posicion(3, 300)])
+        difusor.recibir([_posicion(1, 120)])
+        await _frames()
+        return websocket.deltas()
+
+    deltas = _ejecutar(prueba)
+
+    assert len(deltas) == 1
+    assert sorted((p['tag_id'], p['x']) for p in deltas[0]) == [(1, 120), (2, 200)]
+
+
+def test_solo_se_envia_lo_que_cambia():
+    async def prueba(difusor, conectar):
+        _, websocket = conectar(tags=[1, 2])
+        difusor.recibir([_posicion(1, 100), _posicion(2, 200)])
+        await _frames()
+        # Misma posición con otro id (latido de reposo): no es un cambio para el cliente
+        difusor.recibir([_posicion(1, 100, id=999), _posicion(2, 250)])
+        await _frames()
+        return websocket.deltas()
+
+    deltas = _ejecutar(prueba)
+
+    assert [[(p['tag_id'], p['x']) for p in delta] for delta in deltas] == [[(1, 100), (2, 200)], [(2, 250)]]
+
+
+def test_suscripcion_por_zona_y_taller():
+    async def prueba(difusor, conectar):
+        _, por_zona = conectar(zonas=[5])
+        _, por_taller = conectar(talleres=[2])
+        difusor.recibir([_posicion(1, 100, zona_id=5), _posicion(2, 200, taller_id=2), _posicion(3, 300)])
+        await _frames()
+        return por_zona.deltas(), por_taller.deltas()
+
+    por_zona, por_taller = _ejecutar(prueba)
+
+    assert [p['tag_id'] for p in por_zona[0]] == [1]
+    assert [p['tag_id'] for p in por_taller[0]] == [2]
+
+
+def test_al_suscribirse_recibe_la_ultima_posicion_conocida():
+    async def prueba(difusor, conectar):
+        difusor.recibir([_posicion(1, 100), _posicion(2, 200)])
+        _, websocket = conectar(tags=[2])
+        await _frames()
+        return websocket.deltas()
+
+    assert [[p['tag_id'] for p in delta] for delta in _ejecutar(prueba)] == [[2]]
+
+
+def test_frecuencia_maxima():
+    async def prueba(difusor, conectar):
+        cliente, websocket = conectar(tags=[1])
+        difusor.procesar(cliente, json.dumps({'accion': 'frecuencia', 'fps': 10}))
+        for i in range(10):
+            difusor.recibir([_posicion(1, i + 1)])
+            await asyncio.sleep(0.02)
+        await asyncio.sleep(0.15)
+        return websocket.deltas()
+
+    deltas = _ejecutar(prueba)
+
+    # 0.35 s a 10 fps: como mucho 4 frames, y el último con la posición final
+    assert 2 <= len(deltas) <= 4
+    assert deltas[-1][0]['x'] == 10
+
+
+def test_retirar_limpia_los_indices():
+    async def prueba(difusor, conectar):
+        cliente, websocket = conectar(tags=[1], zonas=[1])
+        difusor.retirar(cliente)
+        difusor.recibir([_posicion(1, 100)])
+        await _frames()
+        return difusor, websocket
+
+    difusor, websocket = _ejecutar(prueba)
+
+    assert difusor.indices == {'tags': {}, 'zonas': {}, 'talleres': {}}
+    assert difusor.clientes == set()
+    assert websocket.deltas() == []
+
+
+def test_oyente_desde_otro_hilo():
+    async def prueba(difusor, conectar):
+        _, websocket = conectar(tags=[1])
+        hilo = threading.Thread(target=difusor.oyente, args=([_posicion(1, 100)],))
+        hilo.start()
+        hilo.join()
+        await _frames()
+        return websocket.deltas()
+
+    assert _ejecutar(prueba) == [[_posicion(1, 100)]]
+
+
+def test_por_la_red():
+    async def prueba(difusor, _):
+        async with websockets.serve(difusor.atender, '127.0.0.1', 0) as servidor:
+            puerto = servidor.sockets[0].getsockname()[1]
+            async with websockets.connect(f'ws://127.0.0.1:{puerto}') as websocket:
+                await websocket.send(json.dumps({'accion': 'suscribir', 'tags': [1]}))
+                suscripcion = json.loads(await websocket.recv())
+                difusor.recibir([_posicion(1, 100)])
+                delta = json.loads(await asyncio.wait_for(websocket.recv(), 2))
+        return suscripcion, delta
+
+    suscripcion, delta = _ejecutar(prueba)
+
+    assert suscripcion['tags'] == [1]
+    assert delta == {'tipo': 'delta', 'posiciones': [_posicion(1, 100)]}
@@ -0,0 +1,142 @@
+"""
+Servidor UDP de ingesta de distancias.
+
+Recibe los reportes de los tags como datagramas JSON con el mismo formato que
+/api/distancias/registrar ({"tag", "links": [{"A", "R"}]} o {"tag", "anchors": [...]}),
+o una lista de reportes en un mismo datagrama. También admite el formato binario
+compacto de services/formato_binario.py (una o varias tramas por datagrama). Cada datagrama se valida contra las
+cachés en memoria y se encola; el hilo de services/cola_ingesta.py lo escribe en lotes
+con el mismo pipeline que la API HTTP (procesar_lote). La validación se hace en un pool de
+hilos aparte, porque un fallo de caché consulta la base de datos y no debe bloquear el bucle
+de asyncio que recibe los datagramas.
+
+Uso:
+    python udp_server.py [--host 0.0.0.0] [--port 5005]
+"""
+from app import app
+from services import cola_ingesta, formato_binario
+from services.ingesta import comprobar_reporte
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+import argparse
+import asyncio
+import json
+import socket
+
+# Buffer de recepción del socket para absorber ráfagas mientras el hilo de escritura trabaja
+TAMANO_BUFFER_RECEPCION = 4 * 1024 * 1024
+
+# Segundos entre cada resumen de actividad impreso por consola
+INTERVALO_RESUMEN = 10
+
+# Hilos que validan los reportes (cada uno puede ocupar una conexión del pool de SQLAlchemy)
+HILOS_VALIDACION = 4
+
+
+def _comprobar(reportes):
+    """Valida los reportes de un datagrama. Se ejecuta en el pool de validación, con su propio contexto de aplicación."""
+    with app.app_context():
+        return [comprobar_reporte(reporte) for reporte in reportes]
+
+
+class ProtocoloIngesta(asyncio.DatagramProtocol):
+
+    def __init__(self, validador):
+        self.validador = validador
+        self.pendientes = set()
+        self.recibidos = 0
+        self.aceptados = 0
+        self.invalidos = 0
+        self.descartados = 0
+
+    def connection_made(self, transport):
+        sock = transport.get_extra_info('socket')
+        if sock is not None:
+            try:
+                sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, TAMANO_BUFFER_RECEPCION)
+            except OSError:
+                pass
+
+    def datagram_received(self, data, addr):
+        self.recibidos += 1
+        recibido = datetime.utcnow()
+        try:
+            if formato_binario.es_binario(data):
+                reportes = formato_binario.decodificar_varios(data)
+            else:
+                contenido = json.loads(data)
+                reportes = contenido if isinstance(contenido, list) else [contenido]
+        except ValueError:
+            self.invalidos += 1
+            return
+
+        tarea = asyncio.ensure_future(self._validar_y_encolar(reportes, recibido))
+        self.pendientes.add(tarea)
+        tarea.add_done_callback(self.pendientes.discard)
+
+    async def _validar_y_encolar(self, reportes, recibido):
+        loop = asyncio.get_running_loop()
+        try:
+            errores = await loop.run_in_executor(self.validador, _comprobar, reportes)
+        except Exception as e:
+            print(f"Error al validar un datagrama UDP: {e}")
+            self.invalidos += len(reportes)
+            return
+
+        for reporte, error in zip(reportes, errores):
+            if error:
+                self.invalidos += 1
+            elif cola_ingesta.encolar(reporte, recibido):
+                self.aceptados += 1
+            else:
+                self.descartados += 1
+
+    def error_received(self, exc):
+        print(f"Error en el socket UDP: {exc}")
+
+
+async def _resumen_periodico(protocolo):
+    while True:
+        await asyncio.sleep(INTERVALO_RESUMEN)
+        cola = cola_ingesta.estadisticas()
+        print(f"UDP: {protocolo.recibidos} datagramas, {protocolo.aceptados} aceptados, "
+              f"{protocolo.invalidos} inválidos, {protocolo.descartados} descartados | "
+              f"cola: {cola['profundidad']} pendientes, {cola['escritos']} escritos, "
+              f"flush medio {cola['flush_medio_ms']} ms")
+
+
+async def servir(host, port):
+    loop = asyncio.get_running_loop()
+    validador = ThreadPoolExecutor(max_workers=HILOS_VALIDACION, thread_name_prefix='validacion-udp')
+    transport, protocolo = await loop.create_datagram_endpoint(
+        lambda: ProtocoloIngesta(validador), local_addr=(host, port))
+    print(f"Escuchando reportes UDP en {host}:{port}")
+    try:
+        await _resumen_periodico(protocolo)
+    finally:
+        transport.close()
+        # Los datagramas que se estaban validando se encolan antes de parar la cola
+        if protocolo.pendientes:
+            await asyncio.gather(*protocolo.pendientes, return_exceptions=True)
+        validador.shutdown()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Servidor UDP de ingesta de distancias UWB')
+    parser.add_argument('--host', default=app.config.get('INGESTA_UDP_HOST', '0.0.0.0'))
+    parser.add_argument('--port', type=int, default=app.config.get('INGESTA_UDP_PUERTO', 5005))
+    args = parser.parse_args()
+
+    # Las cachés de tags y anchors consultan la base de datos en los fallos de caché
+    with app.app_context():
+        cola_ingesta.iniciar(app)
+        try:
+            asyncio.run(servir(args.host, args.port))
+        except KeyboardInterrupt:
+            pass
+        finally:
+            cola_ingesta.detener()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,271 @@
+"""
+Servidor WebSocket de posiciones en directo.
+
+Cada cliente se suscribe en tiempo de ejecución a tags, zonas o talleres y recibe las
+posiciones nuevas que publica la ingesta (services/difusion.py) de cualquiera de ellos. Las
+posiciones se agrupan por tag y se envían como frames "delta" a la frecuencia máxima que
+elige el cliente: en cada frame va solo la última posición de cada tag que ha cambiado
+desde el frame anterior. Un cliente lento no acumula frames; sus posiciones pendientes se
+siguen fusionando hasta que puede recibir el siguiente.
+
+Las posiciones que ingiere el proceso Flask o udp_server.py llegan leyendo la tabla
+posiciones_ultimas cada DIFUSION_SONDEO_S segundos (services/sondeo_posiciones.py). Con --udp
+este proceso atiende también la ingesta UDP en el mismo bucle asyncio y esas posiciones se
+difunden sin esperar al sondeo.
+
+Mensajes del cliente (JSON):
+    {"accion": "suscribir", "tags": [1, 2], "zonas": [3], "talleres": [1]}
+    {"accion": "cancelar", "tags": [2]}
+    {"accion": "frecuencia", "fps": 5}
+Mensajes del servidor:
+    {"tipo": "suscripcion", "tags": [...], "zonas": [...], "talleres": [...], "fps": 2}
+    {"tipo": "delta", "posiciones": [{...Posicion, "taller_id"}, ...]}
+    {"tipo": "error", "error": "..."}
+
+Al suscribirse se envía un primer delta con la última posición conocida de lo suscrito.
+
+Requiere el paquete opcional websockets (pip install websockets).
+
+Uso:
+    python ws_server.py [--host 0.0.0.0] [--port 5006] [--udp]
+"""
+from app import app
+from models.posicion_ultima import PosicionUltima
+from services import cola_ingesta, difusion, sondeo_posiciones
+import argparse
+import asyncio
+import json
+import sys
+
+try:
+    import websockets
+except ImportError:
+    websockets = None
+
+# Tamaño máximo de un mensaje del cliente (bytes)
+MAX_MENSAJE = 64 * 1024
+
+# Campos de suscripción y la clave de la posición con la que se comparan
+CAMPOS = {'tags': 'tag_id', 'zonas': 'zona_id', 'talleres': 'taller_id'}
+
+
+class Cliente:
+
+    def __init__(self, websocket, difusor):
+        self.websocket = websocket
+        self.difusor = difusor
+        self.suscripciones = {campo: set() for campo in CAMPOS}
+        self.intervalo = 1.0 / difusor.fps_defecto
+        self.pendientes = {}    # tag_id -> posición aún no enviada
+        self.enviadas = {}      # tag_id -> (x, y, zona_id) del último frame enviado
+        self.ultimo_envio = 0.0
+        self.programado = None
+        self.enviando = False
+
+    def encolar(self, posicion):
+        tag_id = posicion['tag_id']
+        if tag_id not in self.pendientes and self.enviadas.get(tag_id) == _huella(posicion):
+            return
+        self.pendientes[tag_id] = posicion
+        self._programar()
+
+    def _programar(self):
+        if self.programado is None:
+            loop = self.difusor.loop
+            espera = max(0.0, self.ultimo_envio + self.intervalo - loop.time())
+            self.programado = loop.call_later(espera, self._enviar_frame)
+
+    def _enviar_frame(self):
+        self.programado = None
+        if not self.pendientes:
+            return
+        if self.enviando:
+            # El frame anterior aún no ha salido: se sigue fusionando hasta el siguiente
+            self.ultimo_envio = self.difusor.loop.time()
+            self._programar()
+            return
+
+        posiciones = list(self.pendientes.values())
+        self.pendientes.clear()
+        for posicion in posiciones:
+            self.enviadas[posicion['tag_id']] = _huella(posicion)
+        self.ultimo_envio = self.difusor.loop.time()
+        self.enviando = True
+        asyncio.ensure_future(self._enviar({'tipo': 'delta', 'posiciones': posiciones}))
+
+    async def _enviar(self, mensaje):
+        try:
+            await self.websocket.send(json.dumps(mensaje))
+        except websockets.ConnectionClosed:
+            pass
+        finally:
+            self.enviando = False
+
+    def cerrar(self):
+        if self.programado is not None:
+            self.programado.cancel()
+            self.programado = None
+
+
+def _huella(posicion):
+    return posicion.get('x'), posicion.get('y'), posicion.get('zona_id')
+
+
+def _ids(valor):
+    if valor is None:
+        return []
+    if not isinstance(valor, list) or not all(isinstance(v, int) and not isinstance(v, bool) for v in valor):
+        raise ValueError("Las suscripciones deben ser listas de IDs enteros")
+    return valor
+
+
+class Difusor:
+    """Índices de suscripción por tag, zona y taller; vive en el bucle asyncio."""
+
+    def __init__(self, loop, fps_defecto, fps_max):
+        self.loop = loop
+        self.fps_defecto = fps_defecto
+        self.fps_max = fps_max
+        self.indices = {campo: {} for campo in CAMPOS}   # campo -> valor -> set(Cliente)
+        self.ultimas = {}                                # tag_id -> última posición publicada
+        self.clientes = set()
+
+    def oyente(self, posiciones):
+        # Se llama desde el hilo de la ingesta
+        try:
+            self.loop.call_soon_threadsafe(self.recibir, posiciones)
+        except RuntimeError:
+            # Bucle cerrado al apagar el servidor
+            pass
+
+    def recibir(self, posiciones):
+        for posicion in posiciones:
+            self.ultimas[posicion['tag_id']] = posicion
+            destinatarios = set()
+            for campo, clave in CAMPOS.items():
+                destinatarios |= self.indices[campo].get(posicion.get(clave), set())
+            for cliente in destinatarios:
+                cliente.encolar(posicion)
+
+    def procesar(self, cliente, mensaje):
+        """Aplica un mensaje del cliente y devuelve la respuesta."""
+        try:
+            try:
+                datos = json.loads(mensaje)
+            except ValueError:
+                raise ValueError("Mensaje JSON no válido")
+            if not isinstance(datos, dict):
+                raise ValueError("El mensaje debe ser un objeto JSON")
+            accion = datos.get('accion')
+
+            if accion == 'suscribir':
+                nuevos = {campo: set(_ids(datos.get(campo))) for campo in CAMPOS}
+                for campo, valores in nuevos.items():
+                    for valor in valores - cliente.suscripciones[campo]:
+                        self.indices[campo].setdefault(valor, set()).add(cliente)
+                    cliente.suscripciones[campo] |= valores
+                # Última posición conocida de lo que se acaba de suscribir
+                for posicion in self.ultimas.values():
+                    if any(posicion.get(clave) in nuevos[campo] for campo, clave in CAMPOS.items()):
+                        cliente.encolar(posicion)
+
+            elif accion == 'cancelar':
+                for campo in CAMPOS:
+                    for valor in _ids(datos.get(campo)):
+                        self._quitar(cliente, campo, valor)
+
+            elif accion == 'frecuencia':
+                fps = datos.get('fps')
+                if isinstance(fps, bool) or not isinstance(fps, (int, float)) or not 0 < fps <= self.fps_max:
+                    raise ValueError(f"fps debe ser un número mayor que 0 y como máximo {self.fps_max}")
+                cliente.intervalo = 1.0 / fps
+
+            else:
+                raise ValueError("Acción no válida (suscribir, cancelar o frecuencia)")
+
+        except ValueError as e:
+            return {'tipo': 'error', 'error': str(e)}
+
+        respuesta = {'tipo': 'suscripcion'}
+        respuesta.update({campo: sorted(valores) for campo, valores in cliente.suscripciones.items()})
+        respuesta['fps'] = round(1.0 / cliente.intervalo, 2)
+        return respuesta
+
+    def _quitar(self, cliente, campo, valor):
+        cliente.suscripciones[campo].discard(valor)
+        suscritos = self.indices[campo].get(valor)
+        if suscritos is not None:
+            suscritos.discard(cliente)
+            if not suscritos:
+                del self.indices[campo][valor]
+
+    def retirar(self, cliente):
+        for campo in CAMPOS:
+            for valor in list(cliente.suscripciones[campo]):
+                self._quitar(cliente, campo, valor)
+        cliente.cerrar()
+        self.clientes.discard(cliente)
+
+    async def atender(self, websocket, *_):
+        cliente = Cliente(websocket, self)
+        self.clientes.add(cliente)
+        try:
+            async for mensaje in websocket:
+                await websocket.send(json.dumps(self.procesar(cliente, mensaje)))
+        except websockets.ConnectionClosed:
+            pass
+        finally:
+            self.retirar(cliente)
+
+
+async def servir(host, port, udp=None):
+    loop = asyncio.get_running_loop()
+    difusor = Difusor(loop, app.config.get('WS_FPS_DEFECTO', 2), app.config.get('WS_FPS_MAX', 30))
+    # Última posición de cada tag para el primer delta de las suscripciones
+    difusor.ultimas = {fila.tag_id: fila.to_dict() for fila in PosicionUltima.query}
+    difusion.escuchar(difusor.oyente)
+    try:
+        async with websockets.serve(difusor.atender, host, port, max_size=MAX_MENSAJE):
+            print(f"Escuchando clientes WebSocket en {host}:{port}")
+            if udp is not None:
+                import udp_server
+                await udp_server.servir(*udp)
+            else:
+                await asyncio.Future()
+    finally:
+        difusion.dejar_de_escuchar(difusor.oyente)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Servidor WebSocket de posiciones en directo')
+    parser.add_argument('--host', default=app.config.get('WS_HOST', '0.0.0.0'))
+    parser.add_argument('--port', type=int, default=app.config.get('WS_PUERTO', 5006))
+    parser.add_argument('--udp', action='store_true',
+                        help='Atender también la ingesta UDP en este proceso (INGESTA_UDP_HOST/PUERTO)')
+    args = parser.parse_args()
+
+    if websockets is None:
+        print("El servidor WebSocket necesita el paquete websockets: pip install websockets")
+        sys.exit(1)
+
+    udp = None
+    if args.udp:
+        udp = (app.config.get('INGESTA_UDP_HOST', '0.0.0.0'), app.config.get('INGESTA_UDP_PUERTO', 5005))
+
+    # Las cachés de tags y anchors de la ingesta UDP consultan la base de datos en los fallos de caché
+    with app.app_context():
+        if udp is not None:
+            cola_ingesta.iniciar(app)
+        sondeo_posiciones.iniciar(app)
+        try:
+            asyncio.run(servir(args.host, args.port, udp))
+        except KeyboardInterrupt:
+            pass
+        finally:
+            sondeo_posiciones.detener()
+            if udp is not None:
+                cola_ingesta.detener()
+
+
+if __name__ == '__main__':
+    main()
@@ -26,7 +26,8 @@ CREATE TABLE zonas (
   nombre VARCHAR(50) NOT NULL,
   tipo VARCHAR(20) CHECK (tipo IN ('entrada', 'lavado', 'espera', 'salida', 'elevador', 'otros')),
   color_hex VARCHAR(7),
-  taller_id INT REFERENCES talleres(id)
+  taller_id INT REFERENCES talleres(id),
+  poligono JSON  -- vértices [[x, y], ...] en cm, coordenadas del taller
 );
 
 -- Tabla de anchors (anclas fijas)
@@ -60,7 +61,8 @@ CREATE TABLE vehiculos (
   bastidor VARCHAR(50) UNIQUE,
   referencia VARCHAR(100),
   tag_id INT REFERENCES tags(id),
-  estado VARCHAR(20) CHECK (estado IN ('activo', 'entregado', 'baja')) DEFAULT 'activo'
+  estado VARCHAR(20) CHECK (estado IN ('activo', 'entregado', 'baja')) DEFAULT 'activo',
+  zonas_permitidas JSON
 );
 
 -- Tabla de posiciones (histórico de ubicaciones)
@@ -70,9 +72,26 @@ CREATE TABLE posiciones (
   x INT NOT NULL,
   y INT NOT NULL,
   zona_id INT REFERENCES zonas(id),
+  residuo FLOAT,
+  vx FLOAT,
+  vy FLOAT,
   timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP
 );
 
+-- Última posición de cada tag (copia de la fila más reciente de posiciones)
+CREATE TABLE posiciones_ultimas (
+  tag_id INT PRIMARY KEY REFERENCES tags(id),
+  posicion_id INT,
+  x INT NOT NULL,
+  y INT NOT NULL,
+  zona_id INT REFERENCES zonas(id),
+  taller_id INT REFERENCES talleres(id),
+  residuo FLOAT,
+  vx FLOAT,
+  vy FLOAT,
+  timestamp TIMESTAMP
+);
+
 -- Tabla de distancias desde un tag a 3 anchors (última medida)
 CREATE TABLE distancias (
   id SERIAL PRIMARY KEY,
@@ -95,3 +114,13 @@ CREATE TABLE alertas (
   timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
   leido BOOLEAN DEFAULT FALSE
 );
+
+-- Índices para las consultas de histórico, alertas no leídas y última comunicación
+CREATE INDEX ix_posiciones_tag_timestamp ON posiciones (tag_id, timestamp);
+CREATE INDEX ix_posiciones_zona_timestamp ON posiciones (zona_id, timestamp);
+CREATE INDEX ix_alertas_leido_timestamp ON alertas (leido, timestamp);
+CREATE INDEX ix_tags_ultima_comunicacion ON tags (ultima_comunicacion);
+
+-- Índices para la paginación por (timestamp, id) de los listados de posiciones y alertas
+CREATE INDEX ix_posiciones_timestamp_id ON posiciones (timestamp, id);
+CREATE INDEX ix_alertas_timestamp_id ON alertas (timestamp, id);
@@ -169,6 +169,44 @@ void make_link_json(struct MyLink *p, String *s, String tagID)
     *s += "]}";
 }
 
+// Trama binaria compacta (ver Api_Atopcar/services/formato_binario.py), little-endian:
+// versión (1) | nº anchors (1) | secuencia (2) | código del tag (10) | N x (dirección (2), distancia mm (2))
+// Devuelve 0 (no hay trama que enviar) si el código del tag no cabe en 10 bytes
+size_t make_link_bin(struct MyLink *p, uint8_t *buf, size_t max_len, String tagID, uint16_t seq)
+{
+    if (max_len < 14) return 0;
+
+    if (tagID.length() > 10)
+    {
+        // Truncado se confundiría con otro tag en el servidor
+        Serial.printf("make_link_bin: el código de tag \"%s\" supera los 10 bytes\n", tagID.c_str());
+        return 0;
+    }
+
+    buf[0] = 1;
+    buf[1] = 0;
+    buf[2] = seq & 0xFF;
+    buf[3] = seq >> 8;
+    memset(buf + 4, 0, 10);
+    memcpy(buf + 4, tagID.c_str(), tagID.length());
+
+    size_t len = 14;
+    struct MyLink *temp = p;
+    while (temp->next != NULL && len + 4 <= max_len)
+    {
+        temp = temp->next;
+        float mm = temp->range[0] * 1000.0;
+        uint16_t distancia = mm <= 0 ? 0 : (mm >= 65535.0 ? 65535 : (uint16_t)(mm + 0.5));
+
+        buf[len++] = temp->anchor_addr & 0xFF;
+        buf[len++] = temp->anchor_addr >> 8;
+        buf[len++] = distancia & 0xFF;
+        buf[len++] = distancia >> 8;
+        buf[1]++;
+    }
+    return len;
+}
+
 int contarAnchors(struct MyLink *p)
 {
     int count = 0;
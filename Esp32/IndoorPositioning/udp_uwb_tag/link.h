@@ -15,4 +15,5 @@ void fresh_link(struct MyLink *p, uint16_t addr, float range, float dbm);
 void print_link(struct MyLink *p);
 void delete_link(struct MyLink *p, uint16_t addr);
 void make_link_json(struct MyLink *p, String *s, String tagID);
+size_t make_link_bin(struct MyLink *p, uint8_t *buf, size_t max_len, String tagID, uint16_t seq);
 int contarAnchors(struct MyLink *p);
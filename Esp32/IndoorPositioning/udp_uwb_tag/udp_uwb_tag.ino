@@ -20,7 +20,10 @@ const char *password = "12345678";
 String tagID = "T0002";
 
 struct MyLink *uwb_data;
-String all_json = "";
+
+// Trama binaria del reporte (formato en Api_Atopcar/services/formato_binario.py): 14 bytes de cabecera + 4 por anchor
+uint8_t trama[14 + 4 * 32];
+uint16_t secuencia = 0;
 
 // Añadimos un estado FINALIZANDO para dar tiempo entre enviar y detener UWB
 enum EstadoTag { REPOSO, ESPERA_ALEATORIA, LECTURA, FINALIZANDO };
@@ -29,7 +32,10 @@ EstadoTag estado = REPOSO;
 static unsigned long tiempo3Anchors = 0;
 unsigned long tiempoInicio = 0;
 unsigned long tiempoInicioLectura = 0;  // Para controlar timeout de búsqueda
-unsigned long esperaFija = 6000;
+unsigned long esperaFija = 6000;        // Se ajusta con el next_report_ms que devuelve el servidor
+const unsigned long esperaMinima = 1000;
+const unsigned long esperaMaxima = 60000;
+const unsigned long esperaFinalizando = 1000;
 unsigned long esperaAleatoria = 0;
 unsigned long timeoutLectura = 8000 + esperaFija;    // 8 segundos máximo buscando anchors
 bool uwbActivo = false;                 // Controla si UWB está activo
@@ -200,16 +206,21 @@ void loop()
                 }
 
                 if (millis() - tiempo3Anchors >= 800) {
-                    make_link_json(uwb_data, &all_json, tagID);
-                    Serial.println("======= JSON generado =======");
-                    Serial.println(all_json);
+                    size_t longitud = make_link_bin(uwb_data, trama, sizeof(trama), tagID, secuencia++);
+                    if (longitud == 0) {
+                        Serial.println("-> ERROR: no se pudo generar la trama, no se envía");
+                        estado = FINALIZANDO;
+                        tiempoInicio = millis();
+                        break;
+                    }
+                    Serial.printf("======= Trama generada (%u bytes) =======\n", (unsigned)longitud);
                     
                     // Cambiamos a estado FINALIZANDO antes de enviar
                     estado = FINALIZANDO;
                     tiempoInicio = millis();
                     
                     // Enviamos los datos
-                    send_post(&all_json);
+                    send_post(trama, longitud);
                 }
             }
             break;
@@ -222,7 +233,7 @@ void loop()
             }
             
             // Esperar el tiempo configurado antes de cambiar a REPOSO
-            if (millis() - tiempoInicio >= 1000) {
+            if (millis() - tiempoInicio >= esperaFinalizando) {
                 Serial.println("-> Cambiando a REPOSO");
                 estado = REPOSO;
                 tiempoInicio = millis();
@@ -273,7 +284,7 @@ void inactiveDevice(DW1000Device *device)
 }
 
 // Función mejorada para enviar datos HTTP
-void send_post(String *msg_json)
+void send_post(uint8_t *datos, size_t longitud)
 {
     Serial.println("Enviando datos a servidor...");
     
@@ -285,9 +296,9 @@ void send_post(String *msg_json)
         
         // Ajustar server según tu configuración
         http.begin("http://192.168.0.100:5000/api/distancias/registrar");
-        http.addHeader("Content-Type", "application/json");
+        http.addHeader("Content-Type", "application/vnd.atopcar.uwb");
 
-        int httpResponseCode = http.POST(*msg_json);
+        int httpResponseCode = http.POST(datos, longitud);
         
         Serial.print("POST status: ");
         Serial.println(httpResponseCode);
@@ -302,6 +313,15 @@ void send_post(String *msg_json)
             Serial.println(respuesta);
         }
         
+        // El servidor indica cuánto esperar hasta el siguiente reporte (más si el vehículo está parado)
+        long siguiente = leerSiguienteReporte(respuesta);
+        if (siguiente > 0) {
+            // El estado FINALIZANDO ya consume parte de la espera
+            long espera = siguiente - (long)esperaFinalizando;
+            esperaFija = constrain(espera, (long)esperaMinima, (long)esperaMaxima);
+            Serial.printf("-> Próximo reporte en %lu ms\n", esperaFija + esperaFinalizando);
+        }
+        
         // Cerrar explícitamente la conexión
         http.end();
         Serial.println("======= Enviado ==========");
@@ -312,6 +332,18 @@ void send_post(String *msg_json)
     }
 }
 
+// Extrae el valor de "next_report_ms" de la respuesta JSON, o -1 si no viene
+long leerSiguienteReporte(const String &respuesta)
+{
+    int pos = respuesta.indexOf("\"next_report_ms\"");
+    if (pos < 0) return -1;
+
+    pos = respuesta.indexOf(':', pos);
+    if (pos < 0) return -1;
+
+    return respuesta.substring(pos + 1).toInt();
+}
+
 float calibrateRange(float raw, uint16_t anchorAddr) {
     float gain = 0.520;  // Valor por defecto
     float offset = 0.0; // Valor por defecto